@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+事件预处理微基准: 对比缺少 anonymous 字段的群消息在 "验证失败后修补" 与 "验证前修补" 两种方式下的吞吐。
+
+用法: python bench/bench_event_normalize.py [--events 20000]
+"""
+import argparse
+import asyncio
+import copy
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from melobot.protocols.onebot.v11 import Adapter  # noqa: E402
+from melobot.protocols.onebot.v11.io.packet import InPacket  # noqa: E402
+
+from plugins.ob11adaptor_patches import install_normalizer, normalizer, patch_event_validate_error  # noqa: E402
+
+GROUP_MESSAGE = {
+    "time": 1718000000, "self_id": 10001, "post_type": "message", "message_type": "group",
+    "sub_type": "normal", "message_id": 1, "group_id": 20002, "user_id": 30003,
+    "message": [{"type": "text", "data": {"text": ".timerlist"}}], "raw_message": ".timerlist", "font": 0,
+    "sender": {"user_id": 30003, "nickname": "bench", "card": "", "role": "member"},
+}
+
+
+async def measure(adapter: Adapter, events: int) -> float:
+    factory = adapter._event_factory
+    packets = [InPacket(data=copy.deepcopy(GROUP_MESSAGE)) for _ in range(events)]
+    start = time.perf_counter()
+    for packet in packets:
+        await factory.create(packet)
+    return time.perf_counter() - start
+
+
+async def run(events: int) -> None:
+    exception_path = Adapter()
+    exception_path.when_validate_error(validate_type="event")(patch_event_validate_error)
+    normalized = Adapter()
+    install_normalizer(normalized)
+    normalized.when_validate_error(validate_type="event")(patch_event_validate_error)
+
+    await measure(exception_path, 200)
+    await measure(normalized, 200)
+    for name, adapter in (("验证失败后修补", exception_path), ("验证前修补", normalized)):
+        normalizer.counts.clear()
+        normalizer.events = normalizer.fallbacks = 0
+        cost = await measure(adapter, events)
+        print(f"  {name:<10} {events / cost:10.0f} 事件/秒  {cost / events * 1e6:7.1f} us/事件")
+    # 预期: 验证前修补时不再走验证失败的兜底
+    print(normalizer.status())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(run(args.events))
+
+
+if __name__ == "__main__":
+    main()
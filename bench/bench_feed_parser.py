@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+RSS 解析基准: 对比 feedparser 与 Mikan 流式解析器的耗时和峰值内存。
+
+用法: python bench/bench_feed_parser.py [录制的 feed.xml ...] [--entries 2000] [--stop-after 5]
+不提供文件时使用按 Mikan 格式生成的合成 feed。
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.bangumi_feed import FeedparserFeed, StreamingFeed  # noqa: E402
+
+ITEM = """<item>
+<guid isPermaLink="false">{title}</guid>
+<link>https://mikanani.me/Home/Episode/{hash}</link>
+<title>{title}</title>
+<link>https://mikanani.me/Home/Episode/{hash}</link>
+<description>{title}[{size}]</description>
+<torrent xmlns="https://mikanani.me/0.1/">
+<link>https://mikanani.me/Home/Episode/{hash}</link>
+<contentLength>{length}</contentLength>
+<pubDate>2024-04-{day:02d}T{hour:02d}:31:38.263</pubDate>
+</torrent>
+<enclosure type="application/x-bittorrent" length="{length}" url="https://mikanani.me/Download/20240406/{hash}.torrent" />
+</item>
+"""
+
+
+def synthetic_feed(entries: int) -> bytes:
+    items = []
+    for i in range(entries):
+        title = f"[LoliHouse] 合成番剧 Season {i % 4 + 1} - {i % 24 + 1:02d} [WebRip 1080p HEVC-10bit AAC][简繁内封字幕]"
+        items.append(ITEM.format(
+            title=title, hash=f"{i:040x}", size="1.2GB", length=1288490188 + i,
+            day=i % 28 + 1, hour=i % 24,
+        ))
+    return (
+        '<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+        "<title>Mikan Project - 合成番剧</title><link>http://mikanani.me/RSS/Bangumi?bangumiId=0</link>"
+        "<description>Mikan Project - 合成番剧</description>" + "".join(items) + "</channel></rss>"
+    ).encode("utf8")
+
+
+def measure(fn, repeat: int) -> tuple[float, int]:
+    """返回 (最短耗时, 峰值内存), 峰值内存单独测一次以免 tracemalloc 影响计时"""
+    best = min(_timed(fn) for _ in range(repeat))
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("feeds", nargs="*", type=Path, help="录制的 RSS 文件")
+    parser.add_argument("--entries", type=int, default=2000, help="合成 feed 的条目数")
+    parser.add_argument("--stop-after", type=int, default=5, help="模拟遇到已处理条目时提前停止的位置")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = [(p.name, p.read_bytes()) for p in args.feeds] or [
+        (f"合成 feed ({args.entries} 条)", synthetic_feed(args.entries))
+    ]
+    for name, content in samples:
+        count = sum(1 for _ in StreamingFeed(content))
+        print(f"{name}: {len(content) / 1024:.0f} KiB, {count} 个条目")
+        cases = [
+            ("流式解析 (完整)", lambda: list(StreamingFeed(content))),
+            (f"流式解析 (前 {args.stop_after} 条)", lambda: [e for _, e in zip(range(args.stop_after), StreamingFeed(content))]),
+        ]
+        try:
+            import feedparser  # noqa: F401
+            cases.insert(0, ("feedparser", lambda: list(FeedparserFeed(content))))
+        except ImportError:
+            print("  未安装 feedparser, 跳过对比")
+        for label, fn in cases:
+            elapsed, peak = measure(fn, args.repeat)
+            print(f"  {label:<16} {elapsed * 1000:9.1f} ms  峰值内存 {peak / 1024:9.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+图片发送微基准: 对比每次读取并编码图片与经 MediaCache 缓存后构造 ImageSegment 的耗时与单条消息体积。
+
+用法: python bench/bench_media.py [--image image.png] [--sends 2000]
+"""
+import argparse
+import base64
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from melobot.protocols.onebot.v11 import ImageSegment  # noqa: E402
+
+from utils.image import MediaCache, image_file  # noqa: E402
+
+
+def encode_every_time(path: str) -> str:
+    with open(path, "rb") as f:
+        return "base64://" + base64.b64encode(f.read()).decode("utf-8")
+
+
+def measure(name: str, make_file, sends: int) -> None:
+    start = time.perf_counter()
+    for _ in range(sends):
+        segment = ImageSegment(file=make_file())
+    cost = (time.perf_counter() - start) / sends
+    payload = len(json.dumps(segment.to_dict(), ensure_ascii=False).encode("utf8"))
+    print(f"  {name:<14} {cost * 1e6:9.1f} us/次   消息段 {payload / 1024:8.1f} KiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--image", default=str(ROOT / "image.png"))
+    parser.add_argument("--sends", type=int, default=2000)
+    args = parser.parse_args()
+
+    cache = MediaCache()
+    print(f"{args.image}, {args.sends} 次")
+    measure("每次编码", lambda: encode_every_time(args.image), args.sends)
+    measure("缓存 base64", lambda: cache.get(args.image), args.sends)
+    measure("file:// 路径", lambda: image_file(args.image, mode="file"), args.sends)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+# -*- coding: utf-8 -*-
+"""
+OneBot 压测: 启动本地的 OneBot v11 正向 WebSocket 服务端, 让 main.py 连接后按指定速率回放事件。
+
+- 事件来自合成的 trace (私聊对话、群聊对话、命令、倒计时) 或 --trace 指定的 JSONL 文件
+- 记录 bot 发出的每个 API 调用及其时间 (--actions)
+- bot 在子进程中运行, LLM、搜索与百度网盘替换为本地桩, RSS 订阅指向本地合成的 Mikan 站点
+
+报告持续吞吐、处理延迟分位数、没有得到回复的事件数与 bot 进程的内存增长, 以 JSON 输出。
+
+用法:
+    python bench/bench_onebot_load.py --rate 20 --duration 30 --llm-latency 0.2-0.8 --output load.json
+    python bench/bench_onebot_load.py --save-trace trace.jsonl --duration 60   # 只生成 trace
+    python bench/bench_onebot_load.py --trace trace.jsonl --speed 2             # 以两倍速回放
+    python bench/bench_onebot_load.py --accounts 3    # 多账号: 三个服务端, 事件轮流从各账号推送
+
+多账号时每个账号有自己的服务端; 私聊事件轮流从各账号推送, 群事件模拟所有账号都在同一个群里,
+每个账号都收到同一条群消息, 只应由第一个账号回复。回复只在应当回复的服务端上匹配,
+从其他账号发出的回复 (发错账号或重复回复) 计入 misrouted。
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import AsyncExitStack
+from pathlib import Path
+
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_pipeline import git_revision, parse_range, serve as serve_feeds  # noqa: E402
+
+SELF_ID = 10000
+OWNER = 10001
+GROUP = 20001
+USERS = list(range(30001, 30021))
+
+# 子进程入口: 替换外部后端后运行 main.py
+LAUNCHER = r"""
+import json, os, random, runpy, sys, time
+from pathlib import Path
+from types import SimpleNamespace
+
+root, workdir = Path(sys.argv[1]), Path(sys.argv[2])
+stub = json.loads(os.environ["LOADTEST_STUB"])
+sys.path.insert(0, str(root))
+
+
+class FakeCompletions:
+    def create(self, model=None, messages=(), **kwargs):
+        time.sleep(random.uniform(*stub["llm_latency"]))
+        if "need_search" in json.dumps(messages, ensure_ascii=False):
+            content = json.dumps({"need_search": random.random() < stub["search_rate"], "search_query": "bench"})
+        else:
+            content = "好的喵~ 这是压测用的回复。"
+        message = SimpleNamespace(content=content, tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeDDGS:
+    def text(self, query, max_results=5):
+        time.sleep(random.uniform(*stub["search_latency"]))
+        return [{"title": f"结果 {i}", "href": f"https://example.com/{i}", "body": "压测用的搜索结果"}
+                for i in range(max_results)]
+
+
+# utils 包在导入时会加载 chat_memory 等模块, 已经按名字导入了 get_client 的模块也要替换
+import utils
+chat_llm, web_search, chat_memory = (sys.modules[f"utils.{n}"] for n in ("chat_llm", "web_search", "chat_memory"))
+fake_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+original = chat_llm.get_client
+for module in list(sys.modules.values()):
+    if getattr(module, "get_client", None) is original:
+        module.get_client = lambda: fake_client
+web_search.get_ddgs = lambda: FakeDDGS()
+chat_memory.MEMORY_DIR = workdir / "chat_memory"
+chat_memory.MEMORY_DIR.mkdir(parents=True, exist_ok=True)
+
+import plugins.rss
+from utils.bangumi_sync import IncrementalSync, LocalUploader, UploadManifest
+plugins.rss._baidu_sync = IncrementalSync(
+    LocalUploader(workdir / "remote"), UploadManifest(workdir / "manifest.db"), local_dir=workdir / "torrents"
+)
+
+runpy.run_path(str(root / "main.py"), run_name="__main__")
+"""
+
+
+def message_event(message_id: int, text: str, user_id: int, group_id: int | None = None,
+                  at_self: bool = False) -> dict:
+    segments = [{"type": "at", "data": {"qq": str(SELF_ID)}}] if at_self else []
+    segments.append({"type": "text", "data": {"text": text}})
+    event = {
+        "time": int(time.time()), "self_id": SELF_ID, "post_type": "message", "message_id": message_id,
+        "user_id": user_id, "message": segments, "raw_message": text, "font": 0,
+        "sender": {"user_id": user_id, "nickname": f"user{user_id}", "sex": "unknown", "age": 0},
+    }
+    if group_id is None:
+        event.update(message_type="private", sub_type="friend")
+    else:
+        event.update(message_type="group", sub_type="normal", group_id=group_id, anonymous=None)
+        event["sender"].update(card="", role="member")
+    return event
+
+
+# (权重, 是否期待回复, 生成函数)
+# 私聊对话的 PrivateMsgChecker 没有传入 owner, 目前不会回复, 只计入负载
+def synthetic_kinds() -> list[tuple[float, bool, callable]]:
+    return [
+        (3, False, lambda i, rnd: message_event(i, rnd.choice(["今天吃什么", "讲个笑话", "最近有什么新番"]), OWNER)),
+        (3, True, lambda i, rnd: message_event(i, "小叶 " + rnd.choice(["早上好", "你在干嘛", "晚安"]),
+                                         rnd.choice(USERS), GROUP)),
+        (2, True, lambda i, rnd: message_event(i, f".roll {rnd.randint(2, 100)}", rnd.choice(USERS), GROUP)),
+        (2, True, lambda i, rnd: message_event(i, ".timerlist", rnd.choice(USERS), GROUP)),
+        (2, True, lambda i, rnd: message_event(i, f".timer 00:00:{rnd.randint(2, 9):02d} bench", rnd.choice(USERS), GROUP)),
+        (1, True, lambda i, rnd: message_event(i, rnd.choice(["..rssstatus", "..rsslist -r 5", "..outbox"]), OWNER)),
+    ]
+
+
+def synthetic_trace(rate: float, duration: float, seed: int) -> list[dict]:
+    rnd = random.Random(seed)
+    kinds = synthetic_kinds()
+    weights = [w for w, _, _ in kinds]
+    trace = []
+    for n in range(int(rate * duration)):
+        _, expect_reply, make = rnd.choices(kinds, weights)[0]
+        trace.append({"at": round(n / rate, 4), "event": make(100000 + n, rnd), "expect_reply": expect_reply})
+    return trace
+
+
+def event_target(event: dict) -> tuple[str, int]:
+    if event.get("message_type") == "group":
+        return "group", event["group_id"]
+    return "private", event["user_id"]
+
+
+def action_target(params: dict) -> tuple[str, int] | None:
+    if params.get("group_id") is not None:
+        return "group", int(params["group_id"])
+    if params.get("user_id") is not None:
+        return "private", int(params["user_id"])
+    return None
+
+
+def reply_id(params: dict) -> int | None:
+    message = params.get("message") or params.get("messages")
+    if isinstance(message, list):
+        for seg in message:
+            if isinstance(seg, dict) and seg.get("type") == "reply":
+                try:
+                    return int(seg["data"]["id"])
+                except (KeyError, TypeError, ValueError):
+                    return None
+    return None
+
+
+def rss_kib(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+
+def for_account(event: dict, index: int, self_id: int) -> dict:
+    """把 trace 中的事件改为由第 index 个账号收到; 消息中 @ 的仍是第一个账号"""
+    if index == 0:
+        return event
+    return dict(event, self_id=self_id)
+
+
+class FakeOneBot:
+    """OneBot v11 正向 WebSocket 服务端: 推送事件, 记录并应答 bot 发出的 API 调用"""
+
+    def __init__(self, self_id: int = SELF_ID) -> None:
+        self.self_id = self_id
+        self.targets: set[tuple[str, int]] = set()
+        self.misrouted = 0
+        self.connected = asyncio.Event()
+        self.ws = None
+        self.actions: list[dict] = []
+        self.sent: dict[int, tuple[float, tuple[str, int]]] = {}  # message_id -> (发送时间, 目标)
+        self.pending: dict[tuple[str, int], list[int]] = {}  # 目标 -> 未回复的 message_id
+        self.latency: dict[int, float] = {}
+        self.guessed: dict[int, float] = {}  # 按顺序猜测匹配的 message_id -> 回复时间
+        self.expected = 0
+        self._message_ids = itertools.count(1)
+
+    async def handler(self, ws) -> None:
+        self.ws = ws
+        self.connected.set()
+        try:
+            await self.receive(ws)
+        except ConnectionClosed:
+            pass
+
+    async def receive(self, ws) -> None:
+        async for raw in ws:
+            now = time.perf_counter()
+            data = json.loads(raw)
+            params = data.get("params") or {}
+            self.actions.append({"t": now, "self_id": self.self_id, "action": data.get("action"), "params": params})
+            target = action_target(params)
+            if target is not None and target not in self.targets:
+                self.misrouted += 1
+            self.match_reply(now, params)
+            if data.get("echo") is not None:
+                await ws.send(json.dumps({
+                    "status": "ok", "retcode": 0, "echo": data["echo"], "data": self.echo_data(data.get("action")),
+                }))
+
+    def echo_data(self, action: str | None) -> dict | None:
+        if action == "get_version_info":
+            return {"app_name": "fake-onebot", "app_version": "0.0.0", "protocol_version": "v11"}
+        if action == "get_login_info":
+            return {"user_id": self.self_id, "nickname": "leafbot"}
+        if action and action.startswith("send_"):
+            return {"message_id": next(self._message_ids)}
+        return None
+
+    def match_reply(self, now: float, params: dict) -> None:
+        """
+        引用了原消息的回复按 message_id 匹配, 否则匹配同一目标最早的未回复事件。
+
+        按顺序猜测的匹配之后又收到了引用该事件的回复时, 说明猜错了, 把猜测的回复改记给同一目标下一个未回复的事件。
+        """
+        message_id = reply_id(params)
+        quoted = message_id is not None and message_id in self.sent
+        if not quoted:
+            target = action_target(params)
+            queue = self.pending.get(target) if target else None
+            message_id = queue[0] if queue else None
+        if message_id is None:
+            return
+        if message_id in self.latency:
+            if quoted and message_id in self.guessed:
+                replied_at = self.guessed.pop(message_id)
+                self.latency[message_id] = now - self.sent[message_id][0]
+                queue = self.pending.get(self.sent[message_id][1])
+                if queue and self.sent[queue[0]][0] <= replied_at:
+                    self._record(queue[0], replied_at, guessed=True)
+            return
+        self._record(message_id, now, guessed=not quoted)
+
+    def _record(self, message_id: int, replied_at: float, guessed: bool) -> None:
+        sent_at, target = self.sent[message_id]
+        self.latency[message_id] = replied_at - sent_at
+        if guessed:
+            self.guessed[message_id] = replied_at
+        if message_id in self.pending.get(target, ()):
+            self.pending[target].remove(message_id)
+
+    async def push(self, event: dict, expect_reply: bool = True) -> None:
+        target = event_target(event)
+        self.sent[event["message_id"]] = (time.perf_counter(), target)
+        if expect_reply:
+            self.targets.add(target)
+            self.expected += 1
+            self.pending.setdefault(target, []).append(event["message_id"])
+        await self.ws.send(json.dumps(event, ensure_ascii=False))
+
+
+async def replay(bots: list[FakeOneBot], trace: list[dict], speed: float, pid: int) -> dict:
+    memory = [rss_kib(pid)]
+    start = time.perf_counter()
+    for n, item in enumerate(trace):
+        delay = start + item["at"] / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        event, expect_reply = item["event"], item.get("expect_reply", True)
+        if event.get("message_type") == "group":
+            for index, bot in enumerate(bots):
+                await bot.push(for_account(event, index, bot.self_id), expect_reply and index == 0)
+        else:
+            index = n % len(bots)
+            await bots[index].push(for_account(event, index, bots[index].self_id), expect_reply)
+        if (n + 1) % 50 == 0:
+            memory.append(rss_kib(pid))
+    return {"start": start, "end": time.perf_counter(), "memory": memory}
+
+
+async def run(args, trace: list[dict], workdir: Path, feed_base: str) -> dict:
+    bots = [FakeOneBot(SELF_ID + index * 1000) for index in range(args.accounts)]
+    async with AsyncExitStack() as stack:
+        servers = [await stack.enter_async_context(serve(bot.handler, "127.0.0.1", 0, max_size=None)) for bot in bots]
+        urls = [f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}" for server in servers]
+        env = dict(
+            os.environ,
+            SOCKET_URL=urls[0], SOCKET_URLS=",".join(urls) if len(urls) > 1 else "", SOCKET_TOKEN="",
+            OWNER=str(OWNER), TEST_GROUP=str(GROUP),
+            API_KEY="stub", MTA_AUTO_POLL="0", MTA_CONFIGPATH=str(workdir / "config.json"),
+            MTA_HISTORY_FILE=str(workdir / "history.txt"), MTA_TORRENTS_DIR=str(workdir / "torrents"),
+            MTA_UPLOAD_MANIFEST=str(workdir / "manifest.db"), MTA_SYNC_DIR=str(workdir / "torrents"),
+            ONEMORE_URL=f"{feed_base}/img/", NO_PROXY="127.0.0.1",
+            LOADTEST_STUB=json.dumps({
+                "llm_latency": args.llm_latency, "search_latency": args.search_latency,
+                "search_rate": args.search_rate,
+            }),
+        )
+        if args.outbox_rate:
+            env["OUTBOX_RATE"] = str(args.outbox_rate)
+        log = open(workdir / "bot.log", "w", encoding="utf8")
+        proc = subprocess.Popen(
+            [sys.executable, "-c", LAUNCHER, str(ROOT), str(workdir)], cwd=workdir, env=env,
+            stdout=log, stderr=subprocess.STDOUT,
+        )
+        try:
+            await asyncio.wait_for(asyncio.gather(*(bot.connected.wait() for bot in bots)), args.connect_timeout)
+            await asyncio.sleep(args.settle)
+            idle_memory = rss_kib(proc.pid)
+            result = await replay(bots, trace, args.speed, proc.pid)
+            # 等待尚未回复的事件, 直到超时或全部回复
+            deadline = time.perf_counter() + args.drain
+            while time.perf_counter() < deadline and any(any(bot.pending.values()) for bot in bots):
+                await asyncio.sleep(0.1)
+            result["memory"].append(rss_kib(proc.pid))
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            log.close()
+
+    latencies = [lat for bot in bots for lat in bot.latency.values()]
+    replied_at = [bot.sent[m][0] + lat for bot in bots for m, lat in bot.latency.items()]
+    span = (max(replied_at) - result["start"]) if replied_at else 0.0
+    memory = [m for m in result["memory"] if m is not None]
+    actions = sorted((a for bot in bots for a in bot.actions), key=lambda a: a["t"])
+    sent = sum(len(bot.sent) for bot in bots)
+    return {
+        "accounts": len(bots),
+        "events_sent": sent,
+        "events_replied": len(latencies),
+        "events_expecting_reply": sum(bot.expected for bot in bots),
+        "dropped": sum(len(ids) for bot in bots for ids in bot.pending.values()),
+        "misrouted": sum(bot.misrouted for bot in bots),
+        "offered_rate": round(sent / max(result["end"] - result["start"], 1e-9), 2),
+        "sustained_throughput": round(len(latencies) / span, 2) if span else None,
+        "latency": {q: percentile(latencies, v) for q, v in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))}
+        | {"max": round(max(latencies), 4) if latencies else None},
+        "actions": len(actions),
+        "actions_by_type": dict(sorted(
+            {a: sum(1 for x in actions if x["action"] == a) for a in {x["action"] for x in actions}}.items()
+        )),
+        "memory_kib": {
+            "idle": idle_memory, "end": memory[-1] if memory else None, "peak": max(memory, default=None),
+            "growth": (memory[-1] - idle_memory) if memory and idle_memory else None,
+        },
+        "_actions": actions,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=10, help="合成 trace 的事件速率 (个/秒)")
+    parser.add_argument("--duration", type=float, default=20, help="合成 trace 的时长 (秒)")
+    parser.add_argument("--trace", type=Path,
+                        help="回放的 trace 文件 (JSONL, 每行 {\"at\": 秒, \"event\": {...}, \"expect_reply\": true})")
+    parser.add_argument("--save-trace", type=Path, help="把合成的 trace 写入文件后退出")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度倍数")
+    parser.add_argument("--llm-latency", type=parse_range, default=(0.1, 0.5), help="LLM 桩的延迟, 如 0.2-0.8")
+    parser.add_argument("--search-latency", type=parse_range, default=(0.1, 0.3))
+    parser.add_argument("--search-rate", type=float, default=0.2, help="LLM 桩判断需要搜索的比例")
+    parser.add_argument("--accounts", type=int, default=1, help="账号数, 每个账号一个服务端, 经 SOCKET_URLS 连接")
+    parser.add_argument("--outbox-rate", type=float, help="覆盖 OUTBOX_RATE, 测量时可调高以排除限速")
+    parser.add_argument("--feeds", type=int, default=20, help="本地 Mikan 站点的订阅数")
+    parser.add_argument("--connect-timeout", type=float, default=60)
+    parser.add_argument("--settle", type=float, default=2.0, help="连接后开始回放前的等待秒数")
+    parser.add_argument("--drain", type=float, default=30.0, help="回放结束后等待回复的最长秒数")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--actions", type=Path, help="把记录的 API 调用写入 JSONL 文件")
+    parser.add_argument("--output", type=Path, help="把结果写入 JSON 文件, 默认输出到标准输出")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录 (含 bot 日志)")
+    args = parser.parse_args()
+
+    if args.trace:
+        with open(args.trace, encoding="utf8") as f:
+            trace = [json.loads(line) for line in f if line.strip()]
+    else:
+        trace = synthetic_trace(args.rate, args.duration, args.seed)
+    if args.save_trace:
+        with open(args.save_trace, "w", encoding="utf8") as f:
+            f.writelines(json.dumps(item, ensure_ascii=False) + "\n" for item in trace)
+        print(f"已写入 {len(trace)} 个事件到 {args.save_trace}")
+        return
+
+    port_queue = multiprocessing.Queue()
+    site_args = dict(feeds=args.feeds, entries=10, torrent_pieces=8, seed=args.seed)
+    feeds = multiprocessing.Process(target=serve_feeds, args=(site_args, (0.0, 0.01), 0.0, port_queue), daemon=True)
+    feeds.start()
+    feed_base = f"http://127.0.0.1:{port_queue.get(timeout=60)}"
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-onebot-"))
+    (workdir / "config.json").write_text(json.dumps({"mikan": [
+        {"url": f"{feed_base}/RSS/Bangumi?bangumiId={i}", "title": f"合成番剧{i}", "enable": True,
+         "savedir": f"合成番剧{i}", "rule": ""}
+        for i in range(args.feeds)
+    ]}, ensure_ascii=False), encoding="utf8")
+
+    try:
+        stats = asyncio.run(run(args, trace, workdir, feed_base))
+    finally:
+        feeds.terminate()
+        if args.keep:
+            print(f"临时目录: {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    actions = stats.pop("_actions")
+    if args.actions:
+        with open(args.actions, "w", encoding="utf8") as f:
+            f.writelines(json.dumps(a, ensure_ascii=False) + "\n" for a in actions)
+
+    result = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {
+            "trace": str(args.trace) if args.trace else f"synthetic rate={args.rate} duration={args.duration}",
+            "events": len(trace), "speed": args.speed, "llm_latency": list(args.llm_latency),
+            "search_latency": list(args.search_latency), "outbox_rate": args.outbox_rate,
+            "accounts": args.accounts,
+        },
+        **stats,
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+.onemore 预取池基准: 用本地 HTTP 服务器模拟随机图片接口 (可设延迟与失败率),
+对比直接请求上游与从预取池取图的延迟。
+
+用法: python bench/bench_onemore.py [--requests 30] [--interval 0.2] [--latency 0.5-2] [--fail-rate 0.2]
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import requests  # noqa: E402
+
+from utils.image_pool import ImagePool  # noqa: E402
+
+
+def start_server(latency: tuple[float, float], fail_rate: float, size: int) -> str:
+    rnd = random.Random(0)
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            time.sleep(rnd.uniform(*latency))
+            if rnd.random() < fail_rate:
+                self.send_error(502)
+                return
+            body = os.urandom(size)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/img/"
+
+
+def describe(name: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+    print(f"  {name:<10} p50 {statistics.median(samples) * 1000:8.1f} ms  p95 {p95 * 1000:8.1f} ms  "
+          f"最大 {samples[-1] * 1000:8.1f} ms")
+
+
+def parse_range(text: str) -> tuple[float, float]:
+    low, _, high = text.partition("-")
+    return float(low), float(high or low)
+
+
+async def bench_pool(url: str, args, directory: Path) -> None:
+    pool = ImagePool(url, directory, size=args.pool_size, max_age=3600)
+    pool.start()
+    await asyncio.sleep(args.warmup)
+    samples = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        path = await pool.take()
+        if path is None:
+            # 与插件一样退回直接请求上游
+            await asyncio.to_thread(requests.get, url, timeout=30)
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(args.interval)
+    describe("预取池", samples)
+    print(f"  {pool.status()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--interval", type=float, default=0.2, help="两次 .onemore 之间的间隔秒数")
+    parser.add_argument("--latency", type=parse_range, default=(0.5, 2.0), help="上游延迟, 如 0.5-2")
+    parser.add_argument("--fail-rate", type=float, default=0.2)
+    parser.add_argument("--size", type=int, default=200 * 1024, help="图片字节数")
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--warmup", type=float, default=5.0, help="开始取图前等待预取的秒数")
+    args = parser.parse_args()
+
+    url = start_server(args.latency, args.fail_rate, args.size)
+    print(f"{args.requests} 次, 间隔 {args.interval} 秒, 上游延迟 {args.latency}, 失败率 {args.fail_rate}")
+
+    direct = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        try:
+            requests.get(url, timeout=30).raise_for_status()
+        except requests.exceptions.RequestException:
+            pass
+        direct.append(time.perf_counter() - start)
+    describe("直接请求", direct)
+
+    directory = Path(tempfile.mkdtemp(prefix="bench-onemore-"))
+    try:
+        asyncio.run(bench_pool(url, args, directory))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+RSS 更新流程基准: 启动本地 HTTP 服务器提供合成的 Mikan 订阅与种子文件, 完整运行 utils.bangumi.run。
+
+依次测量两轮: 首轮 (空历史, 抓取、解析、过滤、下载并写入历史) 与次轮 (订阅未变化, 走条件请求)。
+第 0 个订阅拆成两个共用同一 url 但规则不同的订阅, 首轮后检查两者各自只保存了符合自己规则的条目。
+结果以 JSON 输出, 便于在不同提交之间对比。
+
+用法:
+    python bench/bench_pipeline.py --feeds 50 --entries 30 --latency 0.02-0.1 --fail-rate 0.05 --output result.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+GROUPS = ["LoliHouse", "喵萌奶茶屋", "北宇治字幕组", "ANi"]
+# 共用第 0 个订阅 url 的两个订阅: 保存目录后缀 -> (过滤规则, 判断标题是否应被该订阅保存)
+SHARED_URL_RULES = {
+    "LoliHouse": (r"^\[LoliHouse\]", lambda title: title.startswith("[LoliHouse]")),
+    "其他": (r"^(?!\[LoliHouse\])", lambda title: not title.startswith("[LoliHouse]")),
+}
+
+
+def bencode(value) -> bytes:
+    if isinstance(value, int):
+        return b"i%de" % value
+    if isinstance(value, str):
+        value = value.encode("utf8")
+    if isinstance(value, bytes):
+        return b"%d:%s" % (len(value), value)
+    if isinstance(value, list):
+        return b"l" + b"".join(bencode(v) for v in value) + b"e"
+    if isinstance(value, dict):
+        items = sorted((k.encode("utf8") if isinstance(k, str) else k, v) for k, v in value.items())
+        return b"d" + b"".join(bencode(k) + bencode(v) for k, v in items) + b"e"
+    raise TypeError(type(value))
+
+
+def make_torrent(name: str, pieces: int) -> tuple[str, bytes]:
+    """生成合成种子, 返回 (infohash, 内容)"""
+    info = {
+        "name": name,
+        "piece length": 1 << 20,
+        "length": pieces << 20,
+        "pieces": b"".join(hashlib.sha1(f"{name}{i}".encode()).digest() for i in range(pieces)),
+    }
+    data = bencode({"announce": "http://127.0.0.1/announce", "info": info})
+    return hashlib.sha1(bencode(info)).hexdigest(), data
+
+
+class FeedSite:
+    """合成的 Mikan 站点内容"""
+
+    def __init__(self, feeds: int, entries: int, torrent_pieces: int, seed: int) -> None:
+        rnd = random.Random(seed)
+        self.feeds: dict[str, bytes] = {}
+        self.torrents: dict[str, bytes] = {}
+        self._plan = []
+        for feed_id in range(feeds):
+            items = []
+            for n in range(entries, 0, -1):
+                group = rnd.choice(GROUPS)
+                title = f"[{group}] 合成番剧{feed_id} - {n:02d} [WebRip 1080p HEVC AAC][简繁内封]"
+                torrent_hash, data = make_torrent(title, torrent_pieces)
+                self.torrents[torrent_hash] = data
+                items.append((title, torrent_hash, n))
+            self._plan.append((feed_id, items))
+
+    def render(self, base: str) -> None:
+        for feed_id, items in self._plan:
+            body = "".join(
+                f"<item><guid isPermaLink=\"false\">{title}</guid><title>{title}</title>"
+                f"<torrent xmlns=\"https://mikanani.me/0.1/\"><pubDate>2024-01-{n % 28 + 1:02d}T20:00:00</pubDate></torrent>"
+                f"<enclosure type=\"application/x-bittorrent\" length=\"{len(self.torrents[h])}\" "
+                f"url=\"{base}/Download/{h}.torrent\" /></item>"
+                for title, h, n in items
+            )
+            self.feeds[str(feed_id)] = (
+                f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+                f"<title>Mikan Project - 合成番剧{feed_id}</title>{body}</channel></rss>"
+            ).encode("utf8")
+
+
+def serve(site_args: dict, latency: tuple[float, float], fail_rate: float, port_queue) -> None:
+    """在子进程中运行的站点服务器, 避免服务器的内存与 CPU 计入流程"""
+    site = FeedSite(**site_args)
+    rnd = random.Random(0)
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            time.sleep(rnd.uniform(*latency))
+            if rnd.random() < fail_rate:
+                self.send_error(503)
+                return
+            parts = urlsplit(self.path)
+            if parts.path == "/RSS/Bangumi":
+                body = site.feeds.get(parse_qs(parts.query).get("bangumiId", [""])[0])
+                content_type = "application/xml"
+            elif parts.path.startswith("/Download/"):
+                body = site.torrents.get(parts.path.rsplit("/", 1)[-1].removesuffix(".torrent"))
+                content_type = "application/x-bittorrent"
+            else:
+                body = None
+            if body is None:
+                self.send_error(404)
+                return
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    site.render(f"http://127.0.0.1:{server.server_address[1]}")
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def parse_range(text: str) -> tuple[float, float]:
+    low, _, high = text.partition("-")
+    return float(low), float(high or low)
+
+
+def make_config(base: str, feeds: int) -> dict:
+    mikan = [
+        {"url": f"{base}/RSS/Bangumi?bangumiId=0", "title": f"合成番剧0 ({suffix})", "enable": True,
+         "savedir": f"合成番剧0-{suffix}", "rule": rule}
+        for suffix, (rule, _) in SHARED_URL_RULES.items()
+    ]
+    mikan += [
+        {"url": f"{base}/RSS/Bangumi?bangumiId={i}", "title": f"合成番剧{i}", "enable": True,
+         "savedir": f"合成番剧{i}", "rule": ""}
+        for i in range(1, feeds)
+    ]
+    return {"mikan": mikan}
+
+
+def check_shared_url(torrents_dir: Path, entries: int) -> dict:
+    """检查共用 url 的订阅: 每个订阅只保存符合自己规则的条目, 合起来覆盖该 url 的全部条目"""
+    saved, mismatched = {}, []
+    for suffix, (_, wanted) in SHARED_URL_RULES.items():
+        names = [p.name.removesuffix(".torrent") for p in (torrents_dir / f"合成番剧0-{suffix}").glob("*.torrent")]
+        saved[suffix] = len(names)
+        mismatched += [name for name in names if not wanted(name)]
+    return {"saved": saved, "mismatched": mismatched, "ok": not mismatched and sum(saved.values()) == entries}
+
+
+def run_update(bangumi, use_pool: bool):
+    """use_pool 时与 bot 中一样: 更新在工作线程中运行, 解析与校验经事件循环交给进程池"""
+    if not use_pool:
+        return bangumi.run()
+    from utils.workers import workers
+
+    async def update():
+        workers.start()
+        return await asyncio.to_thread(bangumi.run)
+
+    return asyncio.run(update())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--feeds", type=int, default=50, help="订阅数")
+    parser.add_argument("--entries", type=int, default=30, help="每个订阅的条目数")
+    parser.add_argument("--pieces", type=int, default=64, help="每个种子的分片数, 决定种子文件大小")
+    parser.add_argument("--latency", type=parse_range, default=(0.01, 0.05), help="每个请求的延迟秒数, 如 0.02-0.1")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="请求返回 503 的概率")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="把结果写入 JSON 文件, 默认输出到标准输出")
+    parser.add_argument("--workers", type=int, default=-1,
+                        help="在事件循环中运行更新并把解析与校验交给 N 个工作进程 (0 为线程模式), 默认直接在当前线程运行")
+    parser.add_argument("--verbose", action="store_true", help="输出更新流程的 INFO 日志")
+    args = parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    site_args = dict(feeds=args.feeds, entries=args.entries, torrent_pieces=args.pieces, seed=args.seed)
+    server = multiprocessing.Process(
+        target=serve, args=(site_args, args.latency, args.fail_rate, port_queue), daemon=True
+    )
+    server.start()
+    base = f"http://127.0.0.1:{port_queue.get(timeout=60)}"
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-rss-"))
+    config_path = workdir / "config.json"
+    config_path.write_text(json.dumps(make_config(base, args.feeds), ensure_ascii=False), encoding="utf8")
+    # utils.bangumi 在导入时读取这些环境变量
+    os.environ.update(
+        MTA_CONFIGPATH=str(config_path),
+        MTA_HISTORY_FILE=str(workdir / "state" / "history.txt"),
+        MTA_TORRENTS_DIR=str(workdir / "torrents"),
+        MTA_DOWNLOAD_RETRY_BASE=os.getenv("MTA_DOWNLOAD_RETRY_BASE", "0.05"),
+        MTA_BACKOFF_BASE=os.getenv("MTA_BACKOFF_BASE", "0"),
+        NO_PROXY="127.0.0.1",
+    )
+    if args.workers >= 0:
+        os.environ["WORKER_PROCESSES"] = str(args.workers)
+    for name in ("HTTP_PROXY", "HTTPS_PROXY", "http_proxy", "https_proxy"):
+        os.environ.pop(name, None)
+    sys.path.insert(0, str(ROOT))
+
+    from loguru import logger
+    if not args.verbose:
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+
+    start = time.perf_counter()
+    from utils import bangumi  # noqa: E402
+    import_time = time.perf_counter() - start
+
+    rounds = []
+    shared_url = None
+    for name in ("cold", "warm"):
+        written_before = dir_size(workdir)
+        start = time.perf_counter()
+        saved = run_update(bangumi, args.workers >= 0)
+        wall = time.perf_counter() - start
+        rounds.append({
+            "round": name,
+            "wall_time": round(wall, 4),
+            "feeds_per_second": round(args.feeds / wall, 2) if wall else None,
+            "torrents_saved": len(saved or []),
+            "failed": saved is None,
+            "bytes_written": dir_size(workdir) - written_before,
+            "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        })
+        if shared_url is None:
+            shared_url = check_shared_url(workdir / "torrents", args.entries)
+    server.terminate()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {
+            "feeds": args.feeds, "entries": args.entries, "pieces": args.pieces,
+            "latency": list(args.latency), "fail_rate": args.fail_rate, "seed": args.seed,
+            "workers": args.workers,
+        },
+        "import_time": round(import_time, 4),
+        "rounds": rounds,
+        "shared_url_check": shared_url,
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf8")
+    print(text)
+    # 失败率不为 0 时部分条目可能未下载, 此时只要求没有保存不符合规则的条目
+    if shared_url["mismatched"] or (not args.fail_rate and not shared_url["ok"]):
+        sys.exit("共用 url 的订阅检查未通过")
+
+
+if __name__ == "__main__":
+    main()
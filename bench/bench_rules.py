@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+过滤规则微基准: 对比逐条 re.search 原始规则字符串与预编译合并规则的耗时。
+
+用法: python bench/bench_rules.py [--entries 5000] [--feeds 40] [--repeat 5]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.bangumi_rules import FeedRule, RuleSet  # noqa: E402
+
+GROUPS = ["LoliHouse", "喵萌奶茶屋", "北宇治字幕组", "ANi", "桜都字幕组", "Lilith-Raws", "SweetSub"]
+LANGS = ["简体内嵌", "繁体内嵌", "简日双语", "简繁内封", "CHT", "CHS"]
+RESOLUTIONS = ["1080p", "720p", "2160p", "1920x1080", "1280x720"]
+
+
+def synthetic_feed(n: int, series: list[str], rnd: random.Random) -> list[str]:
+    titles = []
+    for _ in range(n):
+        group = rnd.choice(GROUPS)
+        name = rnd.choice(series)
+        titles.append(
+            f"[{group}] {name} - {rnd.randint(1, 24):02d} [WebRip {rnd.choice(RESOLUTIONS)} HEVC AAC][{rnd.choice(LANGS)}]"
+        )
+    return titles
+
+
+def synthetic_config(series: list[str], rnd: random.Random) -> list[dict]:
+    items = []
+    for i, name in enumerate(series):
+        items.append({
+            "url": f"https://mikanani.me/RSS/Bangumi?bangumiId={i}",
+            "title": name,
+            "rule": rf"{re.escape(name)}.*(简体|CHS|简日)",
+            "exclude": ["繁体", "CHT"],
+            "resolution": ["1080p"],
+            "group": [rnd.choice(GROUPS)],
+        })
+    return items
+
+
+def naive_match(item: dict, title: str) -> bool:
+    """旧实现的等价写法: 每个条目都从原始字符串查找正则"""
+    if not re.search(item["rule"], title):
+        return False
+    if any(re.search(p, title) for p in item["exclude"]):
+        return False
+    group = re.search(r"^\s*[\[【]([^\]】]+)[\]】]", title)
+    if not group or item["group"][0].lower() not in group.group(1).lower():
+        return False
+    return re.search(r"1080[pP]|1920[xX]1080", title) is not None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=5000, help="每个订阅的条目数")
+    parser.add_argument("--feeds", type=int, default=40, help="订阅数")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    series = [f"番剧{i} Season {i % 3 + 1}" for i in range(args.feeds)]
+    items = synthetic_config(series, rnd)
+    titles = synthetic_feed(args.entries, series, rnd)
+    total = args.entries * args.feeds
+
+    start = time.perf_counter()
+    rules = RuleSet()
+    rules.refresh({"mikan": items}, version=1)
+    compile_cost = time.perf_counter() - start
+
+    def run_naive() -> int:
+        re.purge()  # 模拟配置中规则数超过 re 模块缓存时的情况
+        return sum(naive_match(item, t) for item in items for t in titles)
+
+    def run_compiled() -> int:
+        compiled = [rules.get(index) for index in range(len(items))]
+        return sum(rule.match(t) for rule in compiled for t in titles)
+
+    assert run_naive() == run_compiled(), "两种实现的匹配结果不一致"
+    print(f"{args.feeds} 个订阅 x {args.entries} 个条目 = {total} 次匹配, 规则编译耗时 {compile_cost * 1000:.2f} ms")
+    for name, fn in (("逐条 re.search", run_naive), ("预编译合并规则", run_compiled)):
+        best = min(_timed(fn) for _ in range(args.repeat))
+        print(f"{name:<12} {best * 1000:9.1f} ms  {best / total * 1e6:7.3f} us/次")
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    main()
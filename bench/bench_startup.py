@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+启动耗时测量: 在全新的解释器中按 main.PLUGINS 的顺序导入并加载全部插件, 报告各插件耗时。
+
+用法: python bench/bench_startup.py [--repeat 5] [--budget 1.5] [--json]
+设置 --budget 时, 插件启动总耗时 (取多次中最短的一次) 超过预算则以非零状态退出, 可用于检查启动是否变慢。
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 在子进程中执行: 不连接 OneBot 实现, 只导入并加载插件
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from melobot.bot.base import Bot
+from melobot.protocols.onebot.v11 import Adapter
+from plugins.ob11adaptor_patches import patch_all
+from utils.startup import load_plugins
+import main
+framework = time.perf_counter() - start
+bot = Bot("bench").add_adapter(patch_all(Adapter()))
+timings = load_plugins(bot, main.PLUGINS)
+print(json.dumps({
+    "framework": framework,
+    "plugins": [t.__dict__ for t in timings],
+}))
+"""
+
+
+def run_once() -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, help="插件启动总耗时上限 (秒)")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.repeat)]
+
+    def total(run: dict) -> float:
+        return sum(p["import_time"] + p["load_time"] for p in run["plugins"])
+
+    best = min(runs, key=total)
+    failed = [p for p in best["plugins"] if p["error"]]
+    if args.json:
+        print(json.dumps({"best": best, "totals": [total(r) for r in runs]}, ensure_ascii=False, indent=2))
+    else:
+        print(f"框架导入 {best['framework'] * 1000:.0f} ms, 插件启动 {total(best) * 1000:.0f} ms (最短 / {args.repeat} 次)")
+        for p in sorted(best["plugins"], key=lambda p: p["import_time"] + p["load_time"], reverse=True):
+            status = f"  已禁用 ({p['error']})" if p["error"] else ""
+            print(f"  {p['name']:<22} 导入 {p['import_time'] * 1000:7.1f} ms  加载 {p['load_time'] * 1000:6.1f} ms{status}")
+
+    if failed:
+        print(f"{len(failed)} 个插件启动失败", file=sys.stderr)
+    if args.budget is not None and total(best) > args.budget:
+        print(f"插件启动耗时 {total(best):.3f} 秒, 超过预算 {args.budget} 秒", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
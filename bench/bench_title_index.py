@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+番剧名匹配微基准: 对比逐条子串查找与 n-gram 模糊索引在大量订阅下的查询耗时。
+
+用法: python bench/bench_title_index.py [--titles 500] [--queries 2000] [--repeat 5]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.bangumi_nl import TitleIndex, build_index, parse_command, resolve_title  # noqa: E402
+
+WORDS = ["葬送", "芙莉莲", "药屋", "少女", "呢喃", "迷宫", "饭", "孤独", "摇滚", "物语", "之旅", "勇者",
+         "魔法", "学园", "Dream", "MyGO", "Frontier", "Season", "第二季", "剧场版"]
+PHRASES = ["bangumi 列表", "禁用 {}", "删除 {}", "查询 {}", "把 {} 启用", "删掉第 3 个"]
+
+
+def synthetic_titles(n: int, rnd: random.Random) -> list[str]:
+    return [" ".join(rnd.sample(WORDS, rnd.randint(2, 4))) + f" {i}" for i in range(n)]
+
+
+def substring_find(query: str, titles: list[str]) -> int | None:
+    for i, title in enumerate(titles):
+        if query in title:
+            return i
+    return None
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--titles", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    titles = synthetic_titles(args.titles, rnd)
+    queries = [" ".join(rnd.choice(titles).split()[:2]) for _ in range(args.queries)]
+    phrases = [rnd.choice(PHRASES).format(q) for q in queries]
+
+    build = timed(lambda: TitleIndex(titles), args.repeat)
+    build_index(tuple(titles))
+    substring = timed(lambda: [substring_find(q, titles) for q in queries], args.repeat)
+    fuzzy = timed(lambda: [resolve_title(q, titles) for q in queries], args.repeat)
+    grammar = timed(lambda: [parse_command(p) for p in phrases], args.repeat)
+
+    per = 1e6 / args.queries
+    print(f"{args.titles} 个订阅, {args.queries} 次查询 (最短 / {args.repeat} 次)")
+    print(f"  建立索引        {build * 1000:8.2f} ms")
+    print(f"  逐条子串查找    {substring * per:8.2f} us/次")
+    print(f"  模糊索引查找    {fuzzy * per:8.2f} us/次")
+    print(f"  本地语法解析    {grammar * per:8.2f} us/次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+进程池基准: 在事件循环旁执行 CPU 密集的订阅解析, 对比线程与工作进程下事件循环的延迟和总吞吐。
+
+事件循环中的心跳任务每 10 ms 醒来一次, 记录实际醒来时间比预期晚了多少, 相当于事件分发要等待的时间。
+
+用法: python bench/bench_workers.py [--jobs 64] [--entries 1000] [--processes 4]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_feed_parser import synthetic_feed  # noqa: E402
+from utils.bangumi_feed import parse_feed  # noqa: E402
+from utils.workers import WorkerPool  # noqa: E402
+
+TICK = 0.01
+
+
+async def heartbeat(lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        expected = time.perf_counter() + TICK
+        await asyncio.sleep(TICK)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run_case(pool: WorkerPool, content: bytes, jobs: int) -> dict:
+    # 先跑一个任务, 不把启动工作进程的时间计入结果
+    await pool.run("feed", parse_feed, content)
+    lags: list[float] = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(pool.submit("feed", parse_feed, content) for _ in range(jobs)))
+    wall = time.perf_counter() - start
+    stop.set()
+    await beat
+    lags.sort()
+    return {
+        "wall": wall,
+        "jobs_per_second": jobs / wall,
+        "lag_p50": statistics.median(lags) if lags else 0.0,
+        "lag_p99": lags[int(len(lags) * 0.99)] if lags else 0.0,
+        "lag_max": lags[-1] if lags else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=64, help="解析任务数")
+    parser.add_argument("--entries", type=int, default=1000, help="每个订阅的条目数")
+    parser.add_argument("--processes", type=int, default=4, help="工作进程数, 同时作为并发上限")
+    args = parser.parse_args()
+
+    content = synthetic_feed(args.entries)
+    print(f"{args.jobs} 个解析任务, 每个订阅 {args.entries} 条 ({len(content) / 1024:.0f} KiB)")
+    for name, processes in (("线程", 0), (f"{args.processes} 个工作进程", args.processes)):
+        pool = WorkerPool(processes, limits={"feed": args.processes})
+        result = asyncio.run(run_case(pool, content, args.jobs))
+        pool.shutdown()
+        print(
+            f"  {name:<12} {result['wall']:6.2f} 秒, {result['jobs_per_second']:6.1f} 个/秒, "
+            f"事件循环延迟 p50 {result['lag_p50'] * 1000:6.1f} ms, p99 {result['lag_p99'] * 1000:6.1f} ms, "
+            f"最大 {result['lag_max'] * 1000:6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,53 @@
 import os
 
 from dotenv import load_dotenv
-from melobot.bot.base import Bot
+from melobot.bot.base import Bot, BotLifeSpan
 from melobot.protocols.onebot.v11 import Adapter, ForwardWebSocketIO
 
-from plugins.chat import ChatPlugin
-from plugins.hello import HelloPlugin
 from plugins.ob11adaptor_patches import patch_all
-from plugins.OneMore import OneMorePlugin
-from plugins.roll import RollPlugin
-from plugins.rss import RssPlugin
-from plugins.timer import TimerPlugin
-from plugins.natural_timer import NaturalTimerPlugin
-from plugins.bangumi_config_manager import BangumiConfigPlugin
+from utils.accounts import accounts
+from utils.startup import format_report, load_plugins
+from utils.watchdog import watchdog
+from utils.workers import workers
 
 load_dotenv()
 SOCKET_URL = os.getenv("SOCKET_URL", "ws://localhost:8080")
 SOCKET_TOKEN = os.getenv("SOCKET_TOKEN", "")
+# 多账号: 逗号分隔的多个 OneBot 正向 WebSocket 地址, 设置后不再使用 SOCKET_URL;
+# SOCKET_TOKENS 按相同顺序给出各连接的令牌, 留空的使用 SOCKET_TOKEN
+SOCKET_URLS = [url.strip() for url in os.getenv("SOCKET_URLS", "").split(",") if url.strip()] or [SOCKET_URL]
+SOCKET_TOKENS = [token.strip() for token in os.getenv("SOCKET_TOKENS", "").split(",")]
+
+# (模块名, PluginPlanner 变量名); 某个插件导入或加载失败时只禁用该插件
+PLUGINS = [
+    ("plugins.hello", "HelloPlugin"),
+    ("plugins.chat", "ChatPlugin"),
+    ("plugins.roll", "RollPlugin"),
+    ("plugins.OneMore", "OneMorePlugin"),
+    ("plugins.rss", "RssPlugin"),
+    ("plugins.timer", "TimerPlugin"),
+    ("plugins.natural_timer", "NaturalTimerPlugin"),
+    ("plugins.bangumi_config_manager", "BangumiConfigPlugin"),
+    ("plugins.admin", "AdminPlugin"),
+]
 
 if __name__ == "__main__":
-    bot = (
-        Bot("leafbot")
-        .add_adapter(patch_all(Adapter()))
-        .add_io(ForwardWebSocketIO(url=SOCKET_URL, access_token=SOCKET_TOKEN))
-    )
-    bot.load_plugin(HelloPlugin)
-    bot.load_plugin(ChatPlugin)
-    bot.load_plugin(RollPlugin)
-    bot.load_plugin(OneMorePlugin)
-    bot.load_plugin(RssPlugin)
-    bot.load_plugin(TimerPlugin)
-    bot.load_plugin(NaturalTimerPlugin)
-    bot.load_plugin(BangumiConfigPlugin)
+    # 所有账号共用一个适配器与同一套插件, LLM 客户端、搜索缓存、聊天记忆与提醒队列只有一份
+    adapter = patch_all(Adapter())
+    accounts.install(adapter)
+    bot = Bot("leafbot").add_adapter(adapter)
+    for i, url in enumerate(SOCKET_URLS):
+        token = SOCKET_TOKENS[i] if i < len(SOCKET_TOKENS) and SOCKET_TOKENS[i] else SOCKET_TOKEN
+        bot.add_io(accounts.add_io(ForwardWebSocketIO(url=url, access_token=token)))
+    print(format_report(load_plugins(bot, PLUGINS)))
+
+    @bot.on(BotLifeSpan.STARTED)
+    async def start_watchdog() -> None:
+        watchdog.start()
+        workers.start()
+
+    @bot.on(BotLifeSpan.STOPPED)
+    async def stop_workers() -> None:
+        workers.shutdown()
+
     bot.run()
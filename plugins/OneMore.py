@@ -1,10 +1,36 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
 from melobot.protocols.onebot.v11 import ImageSegment, MessageEvent, Adapter
 
 from melobot import on_start_match, PluginPlanner
+from melobot.plugin import PluginLifeSpan
+
+from utils.image import image_file
+from utils.image_pool import ImagePool
+
+load_dotenv()
+ONEMORE_URL = os.getenv("ONEMORE_URL", "https://api.anosu.top/img/")
+# 预取池大小与图片最长保留时间 (秒)
+ONEMORE_POOL_SIZE = int(os.getenv("ONEMORE_POOL_SIZE", "5"))
+ONEMORE_MAX_AGE = float(os.getenv("ONEMORE_MAX_AGE", "3600"))
+
+pool = ImagePool(ONEMORE_URL, ".cache/onemore", size=ONEMORE_POOL_SIZE, max_age=ONEMORE_MAX_AGE)
 
 @on_start_match(".onemore")
 async def onemore(event: MessageEvent, adaptor: Adapter) -> None:
-    img = ImageSegment(file="https://api.anosu.top/img/")
+    path = await pool.take()
+    if path is None:
+        # 预取池为空时退回由 OneBot 实现直接拉取
+        img = ImageSegment(file=ONEMORE_URL)
+    else:
+        img = ImageSegment(file=await asyncio.to_thread(image_file, str(path), cache=False))
     await adaptor.send([img])
-                       
-OneMorePlugin = PluginPlanner(version="0.0.1", flows=[onemore])
\ No newline at end of file
+
+OneMorePlugin = PluginPlanner(version="0.0.1", flows=[onemore])
+
+@OneMorePlugin.on(PluginLifeSpan.INITED)
+async def start_prefetch() -> None:
+    """插件加载后启动图片预取"""
+    pool.start()
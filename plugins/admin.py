@@ -0,0 +1,112 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+from melobot.plugin.base import PluginPlanner
+from melobot.protocols.onebot.v11 import Adapter, LevelRole, MessageEvent, MsgChecker
+from melobot.protocols.onebot.v11.handle import on_message
+from melobot.utils.parse.cmd import CmdArgs, CmdParser
+
+from plugins.ob11adaptor_patches import normalizer
+from utils.accounts import accounts
+from utils.outbox import outbox
+from utils.profiler import profiler
+from utils.watchdog import watchdog
+from utils.workers import workers
+
+load_dotenv()
+OWNER = int(os.getenv("OWNER") or "0")
+# ..profile 的最长采样秒数
+MAX_PROFILE_SECONDS = 300
+
+
+@on_message(
+    parser=CmdParser(cmd_start="..", cmd_sep=" ", targets="outbox"),
+    checker=MsgChecker(role=LevelRole.OWNER, owner=OWNER),
+)
+async def outbox_status(event: MessageEvent, adaptor: Adapter) -> None:
+    """处理 ..outbox 命令，查看发送队列的积压与发送延迟"""
+    await adaptor.send_reply("发送队列：\n" + outbox.status())
+
+
+@on_message(
+    parser=CmdParser(cmd_start="..", cmd_sep=" ", targets="events"),
+    checker=MsgChecker(role=LevelRole.OWNER, owner=OWNER),
+)
+async def event_fixups(event: MessageEvent, adaptor: Adapter) -> None:
+    """处理 ..events 命令，查看原始事件修补的生效次数"""
+    await adaptor.send_reply("事件预处理：\n" + normalizer.status())
+
+
+@on_message(
+    parser=CmdParser(cmd_start="..", cmd_sep=" ", targets="profile"),
+    checker=MsgChecker(role=LevelRole.OWNER, owner=OWNER),
+)
+async def profile(event: MessageEvent, args: CmdArgs, adaptor: Adapter) -> None:
+    """处理 ..profile 命令，对运行中的 bot 采样若干秒并返回耗时最多的函数"""
+    if args.vals and args.vals[0] == "help":
+        await adaptor.send_reply(f"对运行中的 bot 采样分析。\n格式：\n..profile [秒数]\n默认 30 秒，最长 {MAX_PROFILE_SECONDS} 秒。")
+        return
+    try:
+        seconds = float(args.vals[0]) if args.vals else 30.0
+    except ValueError:
+        await adaptor.send_reply("请输入有效的秒数。")
+        return
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        await adaptor.send_reply(f"采样时间需要在 0 到 {MAX_PROFILE_SECONDS} 秒之间。")
+        return
+    if profiler.running:
+        await adaptor.send_reply("已有采样正在进行，请稍后再试。")
+        return
+
+    await adaptor.send_reply(f"开始采样 {seconds:g} 秒。")
+    try:
+        result = await asyncio.to_thread(profiler.run, seconds)
+    except RuntimeError as e:
+        await adaptor.send_reply(f"采样失败: {e}")
+        return
+    path = await asyncio.to_thread(result.save)
+    await outbox.reply(event, result.summary() + f"\n\n火焰图数据已保存至 {path}")
+
+
+@on_message(
+    parser=CmdParser(cmd_start="..", cmd_sep=" ", targets="stalls"),
+    checker=MsgChecker(role=LevelRole.OWNER, owner=OWNER),
+)
+async def stalls(event: MessageEvent, adaptor: Adapter) -> None:
+    """处理 ..stalls 命令，查看事件循环卡顿最严重的调用位置"""
+    await outbox.reply(event, "事件循环卡顿：\n" + watchdog.summary())
+
+
+@on_message(
+    parser=CmdParser(cmd_start="..", cmd_sep=" ", targets="workers"),
+    checker=MsgChecker(role=LevelRole.OWNER, owner=OWNER),
+)
+async def worker_status(event: MessageEvent, args: CmdArgs, adaptor: Adapter) -> None:
+    """处理 ..workers 命令，查看进程池中各类任务的状态，或取消某类任务"""
+    if not args.vals:
+        await adaptor.send_reply("进程池：\n" + workers.status())
+        return
+    if args.vals[0] != "cancel" or len(args.vals) < 2:
+        await adaptor.send_reply("查看或取消进程池中的任务。\n格式：\n..workers\n..workers cancel <类型|all>")
+        return
+    kind = None if args.vals[1] == "all" else args.vals[1]
+    count = workers.cancel(kind)
+    await adaptor.send_reply(
+        f"已取消 {count} 个任务。已在工作进程中运行的任务 (如网盘完整对账 syncup) 无法中断，"
+        "会继续运行到结束后才释放名额。"
+    )
+
+
+@on_message(
+    parser=CmdParser(cmd_start="..", cmd_sep=" ", targets="accounts"),
+    checker=MsgChecker(role=LevelRole.OWNER, owner=OWNER),
+)
+async def account_status(event: MessageEvent, adaptor: Adapter) -> None:
+    """处理 ..accounts 命令，查看各 OneBot 连接的账号与收到的事件数"""
+    await adaptor.send_reply("OneBot 连接：\n" + accounts.status())
+
+
+AdminPlugin = PluginPlanner(
+    version="0.0.1", flows=[outbox_status, event_fixups, profile, stalls, worker_status, account_status]
+)
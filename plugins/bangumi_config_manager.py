@@ -1,8 +1,7 @@
+import asyncio
 import json
 import os
 import re
-from pathlib import Path
-from openai import OpenAI
 from melobot import PluginPlanner
 from melobot.protocols.onebot.v11 import (
     MessageEvent, on_message, Adapter,
@@ -11,43 +10,18 @@ from melobot.protocols.onebot.v11 import (
 )
 from dotenv import load_dotenv
 
-load_dotenv()
-
-# 获取配置文件路径
-workspace = Path(__file__).resolve().parent.parent
-CONFIG_PATH = os.getenv("MTA_CONFIGPATH", workspace / ".cache" / "bangumi_config" / "config.json")
-
-# OpenAI 客户端初始化
-API_KEY = os.getenv("API_KEY")
-client = OpenAI(api_key=API_KEY, base_url="https://api.siliconflow.cn/v1")
-MODEL_NAME = "deepseek-ai/DeepSeek-V3"
-
+from utils.bangumi_config import ConfigError, config_store
+from utils.chat_llm import MODEL_NAME, get_client
+from utils.bangumi_rules import FeedRule, RuleError
+from utils.bangumi_nl import DESTRUCTIVE_SCORE, MIN_SCORE, parse_command, resolve_title
 
-def load_config() -> dict:
-    """加载配置文件"""
-    config_path = Path(CONFIG_PATH)
-    if config_path.exists() and config_path.is_file():
-        with open(config_path, encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
-
-def save_config(config: dict) -> bool:
-    """保存配置文件"""
-    try:
-        config_path = Path(CONFIG_PATH)
-        config_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(config_path, encoding="utf-8", mode="w") as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"保存配置失败: {e}")
-        return False
+load_dotenv()
 
 
 def parse_config_intent(user_message: str) -> dict:
     """
     使用 LLM 解析用户的配置修改意图（不传递完整配置，节约 token）
+    只有本地语法 parse_command 无法识别的请求才会走到这里
     返回: {"action": "add|remove|update|list|query", "details": {...}, "response": "..."}
     """
     prompt = f"""你是配置文件解析助手。用户想要修改 bangumi 番剧订阅配置。
@@ -61,7 +35,7 @@ def parse_config_intent(user_message: str) -> dict:
     "action": "add" | "remove" | "update" | "list" | "query" | "unknown",
     "details": {{
         // add: {{"url": "...", "title": "...", "savedir": "..."}}
-        // remove: {{"title": "..."}} 或 {{"index": 0}}
+        // remove: {{"title": "..."}} 或 {{"index": 1}}
         // update: {{"title": "...", "field": "enable|savedir|rule", "value": "..."}}
         // list: {{}}
         // query: {{"title": "..."}}
@@ -73,16 +47,18 @@ def parse_config_intent(user_message: str) -> dict:
 1. 如果用户只是想查看当前配置列表，action 为 "list"
 2. 如果用户询问某个番剧的详情，action 为 "query"
 3. 如果用户想添加新的订阅，action 为 "add"，需要从用户消息中提取 url, title, savedir
-4. 如果用户想删除订阅，action 为 "remove"，需要从用户消息中提取 title 或 index
+4. 如果用户想删除订阅，action 为 "remove"，需要从用户消息中提取 title 或 index（订阅列表中的编号，从 1 开始）
 5. 如果用户想修改某个字段（如启用/禁用），action 为 "update"
 6. 如果无法理解用户意图，action 为 "unknown"
 
 输出:"""
 
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model=MODEL_NAME,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=300,
+            temperature=0.2,
         )
         result_text = response.choices[0].message.content.strip()
 
@@ -96,9 +72,69 @@ def parse_config_intent(user_message: str) -> dict:
     return {"action": "unknown", "details": {}, "response": "抱歉，我没能理解你的意图呢。请告诉我你想对 bangumi 配置做什么操作？"}
 
 
-def execute_config_action(action: str, details: dict, config: dict) -> tuple[bool, str]:
-    """执行配置修改操作"""
-    mikan_list = config.get("mikan", [])
+async def resolve_intent(request: str) -> dict:
+    """先用本地语法解析, 无法识别时才调用 LLM (在线程中执行, 不阻塞事件循环)"""
+    titles = [item.get("title", "") for item in config_store.get().get("mikan", [])]
+    return parse_command(request, titles) or await asyncio.to_thread(parse_config_intent, request)
+
+
+def parse_switch(value) -> bool:
+    """把 LLM 给出的启用状态转为布尔值, "false" / "禁用" 之类的字符串视为 False"""
+    if isinstance(value, str):
+        return value.strip().lower() not in ("", "0", "false", "no", "off", "否", "禁用", "关闭", "停用")
+    return bool(value)
+
+
+def locate_item(details: dict, mikan_list: list[dict], destructive: bool = False) -> tuple[int | None, str]:
+    """
+    按编号 (从 1 开始) 或名称模糊匹配定位番剧, 返回 (下标, 错误提示)。
+
+    名称有多个相近的候选时不做任何修改, 而是列出候选让用户用编号指定;
+    destructive 为 True (删除、禁用) 时名称只是大致相近也要求用编号确认。
+    """
+    index = details.get("index")
+    if index is not None:
+        try:
+            index = int(index)
+        except (TypeError, ValueError):
+            return None, f"编号 '{index}' 不正确哦"
+        if 1 <= index <= len(mikan_list):
+            return index - 1, ""
+        return None, f"没有编号为 {index} 的番剧, 当前共有 {len(mikan_list)} 个订阅"
+
+    title = str(details.get("title") or "").strip()
+    if not title:
+        return None, "请告诉我番剧的名称或编号"
+    definite = DESTRUCTIVE_SCORE if destructive else MIN_SCORE
+    found, candidates = resolve_title(title, [item.get("title", "") for item in mikan_list], definite)
+    if found is not None:
+        return found, ""
+    if not candidates:
+        return None, f"没有找到名为 '{title}' 的番剧订阅"
+    if len(candidates) == 1:
+        msg = f"没有和 '{title}' 完全对应的番剧, 是指下面这个吗? 确认的话请用编号指定:\n"
+    else:
+        msg = f"有多个番剧和 '{title}' 相近, 请用编号指定:\n"
+    msg += "\n".join(f"{i + 1}. {mikan_list[i].get('title', '未命名')}" for i in candidates)
+    return None, msg
+
+
+def execute_config_action(action: str, details: dict) -> tuple[bool, str]:
+    """执行配置修改操作, 修改在同一次编辑中完成, 有变化时原子写回配置文件"""
+    try:
+        with config_store.edit() as config:
+            return _apply_config_action(action, details, config)
+    except OSError as e:
+        print(f"保存配置失败: {e}")
+        return False, "保存配置失败了orz..."
+    except ConfigError as e:
+        print(f"读取配置失败: {e}")
+        return False, "配置文件格式有误, 需要先手动修复 config.json 才能修改订阅orz..."
+
+
+def _apply_config_action(action: str, details: dict, config: dict) -> tuple[bool, str]:
+    """在配置副本上执行操作"""
+    mikan_list = config["mikan"]
 
     if action == "list":
         if not mikan_list:
@@ -112,16 +148,16 @@ def execute_config_action(action: str, details: dict, config: dict) -> tuple[boo
         return True, msg
 
     elif action == "query":
-        title = details.get("title", "")
-        for item in mikan_list:
-            if title in item.get("title", ""):
-                msg = f"番剧 '{item.get('title')}' 的详细信息:\n"
-                msg += f"- URL: {item.get('url')}\n"
-                msg += f"- 保存目录: {item.get('savedir')}\n"
-                msg += f"- 启用状态: {'是' if item.get('enable', True) else '否'}\n"
-                msg += f"- 匹配规则: {item.get('rule', '无')}"
-                return True, msg
-        return False, f"没有找到名为 '{title}' 的番剧订阅"
+        found, error = locate_item(details, mikan_list)
+        if found is None:
+            return False, error
+        item = mikan_list[found]
+        msg = f"番剧 '{item.get('title')}' 的详细信息:\n"
+        msg += f"- URL: {item.get('url')}\n"
+        msg += f"- 保存目录: {item.get('savedir')}\n"
+        msg += f"- 启用状态: {'是' if item.get('enable', True) else '否'}\n"
+        msg += f"- 匹配规则: {item.get('rule', '无')}"
+        return True, msg
 
     elif action == "add":
         url = details.get("url", "")
@@ -139,20 +175,14 @@ def execute_config_action(action: str, details: dict, config: dict) -> tuple[boo
                 old_title = item.get("title")
                 item["title"] = title
                 item["savedir"] = savedir
-                config["mikan"] = mikan_list
-                if save_config(config):
-                    return True, f"已更新番剧 '{old_title}' 的配置（URL 已存在）\n新标题: {title}, 保存目录: {savedir}"
-                return False, "保存配置失败了orz..."
+                return True, f"已更新番剧 '{old_title}' 的配置（URL 已存在）\n新标题: {title}, 保存目录: {savedir}"
 
             if item.get("title") == title:
                 # title 相同，更新 URL 和 savedir
                 old_url = item.get("url")
                 item["url"] = url
                 item["savedir"] = savedir
-                config["mikan"] = mikan_list
-                if save_config(config):
-                    return True, f"已更新番剧 '{title}' 的配置（标题已存在）\n新URL: {url}, 保存目录: {savedir}"
-                return False, "保存配置失败了orz..."
+                return True, f"已更新番剧 '{title}' 的配置（标题已存在）\n新URL: {url}, 保存目录: {savedir}"
 
         # 不存在，新增配置
         new_item = {
@@ -163,61 +193,45 @@ def execute_config_action(action: str, details: dict, config: dict) -> tuple[boo
             "savedir": savedir
         }
         mikan_list.append(new_item)
-        config["mikan"] = mikan_list
-
-        if save_config(config):
-            return True, f"已成功添加番剧 '{title}' 到订阅列表！\n保存目录: {savedir}"
-        return False, "保存配置失败了orz..."
+        return True, f"已成功添加番剧 '{title}' 到订阅列表！\n保存目录: {savedir}"
 
     elif action == "remove":
-        title = details.get("title")
-        index = details.get("index")
-
-        if index is not None and 0 <= index < len(mikan_list):
-            removed = mikan_list.pop(index)
-            config["mikan"] = mikan_list
-            if save_config(config):
-                return True, f"已删除番剧 '{removed.get('title')}'"
-            return False, "保存配置失败了orz..."
-
-        if title:
-            for i, item in enumerate(mikan_list):
-                if title in item.get("title", ""):
-                    removed = mikan_list.pop(i)
-                    config["mikan"] = mikan_list
-                    if save_config(config):
-                        return True, f"已删除番剧 '{removed.get('title')}'"
-                    return False, "保存配置失败了orz..."
-            return False, f"没有找到名为 '{title}' 的番剧"
-
-        return False, "请告诉我你要删除的番剧名称或编号"
+        if details.get("index") is None and not details.get("title"):
+            return False, "请告诉我你要删除的番剧名称或编号"
+        found, error = locate_item(details, mikan_list, destructive=True)
+        if found is None:
+            return False, error
+        removed = mikan_list.pop(found)
+        return True, f"已删除番剧 '{removed.get('title')}'"
 
     elif action == "update":
-        title = details.get("title")
         field = details.get("field")
         value = details.get("value")
 
-        if not title or not field:
+        if (details.get("index") is None and not details.get("title")) or not field:
             return False, "更新配置需要提供番剧名称、字段和值"
 
-        for item in mikan_list:
-            if title in item.get("title", ""):
-                if field == "enable":
-                    item["enable"] = bool(value)
-                elif field == "savedir":
-                    item["savedir"] = str(value)
-                elif field == "rule":
-                    item["rule"] = str(value)
-                else:
-                    return False, f"不支持的字段 '{field}'"
-
-                config["mikan"] = mikan_list
-                if save_config(config):
-                    new_status = "启用" if item.get("enable", True) else "禁用"
-                    return True, f"已更新 '{item.get('title')}' 的 {field} 为 {value}"
-                return False, "保存配置失败了orz..."
-
-        return False, f"没有找到名为 '{title}' 的番剧"
+        # 禁用与删除一样需要确定的匹配
+        disabling = field == "enable" and not parse_switch(value)
+        found, error = locate_item(details, mikan_list, destructive=disabling)
+        if found is None:
+            return False, error
+        item = mikan_list[found]
+        if field == "enable":
+            item["enable"] = parse_switch(value)
+            return True, f"已{'启用' if item['enable'] else '禁用'} '{item.get('title')}'"
+        elif field == "savedir":
+            item["savedir"] = str(value)
+        elif field == "rule":
+            try:
+                FeedRule.from_item({**item, "rule": str(value)})
+            except RuleError as e:
+                return False, f"这个匹配规则有问题哦: {e}"
+            item["rule"] = str(value)
+        else:
+            return False, f"不支持的字段 '{field}'"
+
+        return True, f"已更新 '{item.get('title')}' 的 {field} 为 {value}"
 
     return False, "未知的操作"
 
@@ -247,18 +261,15 @@ async def handle_config_private(e: MessageEvent, adaptor: Adapter) -> None:
                                   "请说出你想做什么吧~")
         return
 
-    # 加载配置
-    config = load_config()
-
     # 解析用户意图
-    result = parse_config_intent(request)
+    result = await resolve_intent(request)
 
     if result.get("action") == "unknown":
         await adaptor.send_reply(result.get("response", "抱歉，我没能理解你的意图呢"))
         return
 
     # 执行操作
-    success, response = execute_config_action(result["action"], result.get("details", {}), config)
+    success, response = execute_config_action(result["action"], result.get("details", {}))
     await adaptor.send_reply(response)
 
 
@@ -286,18 +297,15 @@ async def handle_config_group(e: GroupMessageEvent, adaptor: Adapter) -> None:
                                   "- 禁用/启用某个番剧")
         return
 
-    # 加载配置
-    config = load_config()
-
     # 解析用户意图
-    result = parse_config_intent(request)
+    result = await resolve_intent(request)
 
     if result.get("action") == "unknown":
         await adaptor.send_reply(result.get("response", "抱歉，我没能理解你的意图呢"))
         return
 
     # 执行操作
-    success, response = execute_config_action(result["action"], result.get("details", {}), config)
+    success, response = execute_config_action(result["action"], result.get("details", {}))
     await adaptor.send_reply(response)
 
 
@@ -4,7 +4,7 @@ from melobot.protocols.onebot.v11 import NodeSegment, ImageSegment, TextSegment,
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
-from utils.image import img_to_b64
+from utils.image import image_file
 
 import os
 from dotenv import load_dotenv
@@ -23,7 +23,7 @@ async def echo_hi(e: MessageEvent) -> None:
 @on_full_match("meow")
 async def meow(e: MessageEvent, adaptor: Adapter) -> None:
     node1 = NodeSegment(content=[TextSegment("我是猫娘喵")], name="卡拉彼丘量产型猫娘", uin=e.user_id, use_std=True)
-    node2 = NodeSegment(content=[ImageSegment(file=img_to_b64("image.png"))],
+    node2 = NodeSegment(content=[ImageSegment(file=image_file("image.png"))],
                         name="卡拉彼丘量产型猫娘", uin=e.user_id, use_std=True)
     # await adaptor.send_forward_custom([node1, node2], group_id=662805726)
     await adaptor.send_forward_custom([node1, node2], user_id=e.user_id)
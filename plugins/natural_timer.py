@@ -11,15 +11,11 @@ import os
 import re
 import json
 from datetime import datetime, timedelta, date
-from openai import OpenAI
 from dotenv import load_dotenv
 
-load_dotenv()
+from utils.chat_llm import MODEL_NAME, get_client
 
-# 初始化 LLM 客户端
-API_KEY = os.getenv("API_KEY")
-client = OpenAI(api_key=API_KEY, base_url="https://api.siliconflow.cn/v1")
-MODEL_NAME = "deepseek-ai/DeepSeek-V3"
+load_dotenv()
 
 OWNER = os.getenv("OWNER")
 
@@ -63,7 +59,7 @@ def call_llm_intent(text: str) -> dict:
 输出（只输出JSON，不要其他内容）："""
 
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model=MODEL_NAME,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.3,
@@ -1,15 +1,176 @@
+import asyncio
+import os
+import re
+from collections import Counter
+from copy import deepcopy
+from dataclasses import dataclass, field
 from typing import Any
+
+from melobot.adapter import AdapterLifeSpan
 from melobot.protocols.onebot.v11 import Adapter
 
 _RawData = dict[str, Any]
 
-async def patch_event_anonymous_missing(raw_dict: _RawData, _: Exception):
+# 手动指定 OneBot 实现与版本, 如 "NapCat 4.9.8"; 为空时连接后通过 get_version_info 获取
+OB11_IMPL = os.getenv("OB11_IMPL", "")
+
+
+def _version(text: str) -> tuple[int, ...]:
+    return tuple(int(n) for n in re.findall(r"\d+", text))
+
+
+@dataclass
+class Fixup:
     """
-    使用NapCat v4.9.8 时接收群消息时会返回KeyError: 'anonymous'
+    对原始事件的声明式修补: 原始数据包含 when 中的全部键值时, 为缺失的字段补上 defaults。
+
+    impl 为实现名称 (不区分大小写, 前缀匹配), versions 为 [最低, 最高] 版本, None 表示不限。
     """
-    if raw_dict.get("message_type") == "group" and "anonymous" not in raw_dict:
-        raw_dict["anonymous"] = None
+    name: str
+    when: dict[str, Any]
+    defaults: dict[str, Any]
+    impl: str | None = None
+    versions: tuple[str | None, str | None] = (None, None)
+    doc: str = ""
+    _mutable: bool = field(init=False, default=False)
+
+    def __post_init__(self) -> None:
+        self._mutable = any(isinstance(v, (dict, list)) for v in self.defaults.values())
+
+    def applies_to(self, impl: str, version: str) -> bool:
+        if self.impl and not impl.lower().startswith(self.impl.lower()):
+            return False
+        low, high = self.versions
+        current = _version(version)
+        if low and current < _version(low):
+            return False
+        if high and current > _version(high):
+            return False
+        return True
+
+    def apply(self, raw_dict: _RawData) -> bool:
+        """修补原始数据, 返回是否有改动"""
+        for key, value in self.when.items():
+            if raw_dict.get(key) != value:
+                return False
+        changed = False
+        for key, value in self.defaults.items():
+            if key not in raw_dict:
+                raw_dict[key] = deepcopy(value) if self._mutable else value
+                changed = True
+        return changed
+
+
+FIXUPS: list[Fixup] = [
+    Fixup(
+        "group-anonymous-missing",
+        when={"post_type": "message", "message_type": "group"},
+        defaults={"anonymous": None},
+        impl="napcat",
+        doc="使用NapCat v4.9.8 时接收群消息时会返回KeyError: 'anonymous'",
+    ),
+]
+
+
+class EventNormalizer:
+    """
+    在验证之前修补原始事件。
+
+    按 post_type 预先分组, 每个事件只检查可能相关的修补; 实现未知时启用全部修补,
+    识别出实现与版本后只保留适用的修补。counts 记录每个修补生效的次数。
+    """
+
+    def __init__(self, fixups: list[Fixup]) -> None:
+        self.fixups = fixups
+        self.impl = ""
+        self.version = ""
+        self.counts: Counter[str] = Counter()
+        self.events = 0
+        self.fallbacks = 0
+        self._by_type: dict[Any, list[Fixup]] = {}
+        self.select("", "")
+
+    def select(self, impl: str, version: str) -> None:
+        self.impl, self.version = impl, version
+        active = [f for f in self.fixups if not impl or f.applies_to(impl, version)]
+        by_type: dict[Any, list[Fixup]] = {}
+        for fixup in active:
+            by_type.setdefault(fixup.when.get("post_type"), []).append(fixup)
+        self._by_type = by_type
+
+    def __call__(self, raw_dict: _RawData) -> None:
+        self.events += 1
+        fixups = self._by_type.get(raw_dict.get("post_type"))
+        if fixups:
+            for fixup in fixups:
+                if fixup.apply(raw_dict):
+                    self.counts[fixup.name] += 1
+        if None in self._by_type:
+            for fixup in self._by_type[None]:
+                if fixup.apply(raw_dict):
+                    self.counts[fixup.name] += 1
+
+    def status(self) -> str:
+        impl = f"{self.impl} {self.version}".strip() or "未知 (启用全部修补)"
+        active = sum(len(v) for v in self._by_type.values())
+        lines = [
+            f"OneBot 实现: {impl}",
+            f"已处理 {self.events} 个事件, 启用 {active}/{len(self.fixups)} 个修补, 验证失败后修补 {self.fallbacks} 次",
+        ]
+        lines.extend(f"  {f.name}: {self.counts[f.name]} 次" for f in self.fixups)
+        return "\n".join(lines)
+
+
+normalizer = EventNormalizer(FIXUPS)
+
+
+async def patch_event_validate_error(raw_dict: _RawData, _: Exception):
+    """
+    兜底: 验证失败时再尝试一次全部修补, 用于实现识别有误或出现新字段问题的情况
+    """
+    for fixup in FIXUPS:
+        if fixup.apply(raw_dict):
+            normalizer.counts[fixup.name] += 1
+            normalizer.fallbacks += 1
+
+
+def install_normalizer(adapter: Adapter) -> None:
+    """在事件工厂验证原始数据之前调用 normalizer"""
+    factory = adapter._event_factory
+    create = factory.create
+
+    async def create_normalized(packet):
+        normalizer(packet.data)
+        return await create(packet)
+
+    factory.create = create_normalized
+
+
+async def detect_impl(adapter: Adapter) -> None:
+    """获取 OneBot 实现的名称与版本, 据此选择适用的修补"""
+    if OB11_IMPL:
+        impl, _, version = OB11_IMPL.partition(" ")
+        normalizer.select(impl, version)
+        return
+    try:
+        echo = await asyncio.wait_for((await adapter.get_version_info()).unwrap(0), 30)
+        data = echo.data or {}
+        normalizer.select(data.get("app_name", ""), data.get("app_version", ""))
+        print(f"OneBot 实现: {normalizer.impl} {normalizer.version}")
+    except Exception as e:
+        print(f"获取 OneBot 实现版本失败, 启用全部事件修补: {e}")
+
+
+_detect_task: asyncio.Task | None = None
+
 
 def patch_all(adapter: Adapter):
-    adapter.when_validate_error(validate_type="event")(patch_event_anonymous_missing)
-    return adapter
\ No newline at end of file
+    install_normalizer(adapter)
+    adapter.when_validate_error(validate_type="event")(patch_event_validate_error)
+
+    @adapter.on(AdapterLifeSpan.STARTED)
+    async def start_detect_impl() -> None:
+        global _detect_task
+        _detect_task = asyncio.create_task(detect_impl(adapter))
+
+    return adapter
@@ -1,20 +1,78 @@
-import json
+import asyncio
 import os
-from pathlib import Path
+from concurrent.futures import CancelledError
 
-from bypy import ByPy
 from dotenv import load_dotenv
 from melobot.handle.register import on_start_match
-from melobot.plugin.base import PluginPlanner
-from melobot.protocols.onebot.v11 import Adapter, LevelRole, MessageEvent, MsgChecker
+from melobot.plugin.base import PluginLifeSpan, PluginPlanner
+from melobot.protocols.onebot.v11 import Adapter, GroupMessageEvent, LevelRole, MessageEvent, MsgChecker
 from melobot.protocols.onebot.v11.handle import on_message
 from melobot.utils.parse.cmd import CmdArgs, CmdParser
 
-from utils.bangumi import run as bangumi_update
+from utils.bangumi_config import config_store
+from utils.bangumi_rules import LIST_FIELDS, RULE_FIELDS, FeedRule, RuleError
+from utils.bangumi_sync import ByPyUploader, IncrementalSync, UploadManifest
+from utils.outbox import outbox
+from utils.rss_jobs import RssJobQueue
 
 load_dotenv()
 OWNER = int(os.getenv("OWNER") or "0")
-BaiduPan = ByPy()
+# 是否启用自动轮询, 以及调度循环检查到期订阅的间隔 (秒)
+AUTO_POLL = os.getenv("MTA_AUTO_POLL", "1") == "1"
+POLL_TICK = float(os.getenv("MTA_POLL_TICK", "60"))
+# 百度网盘增量同步, 只上传上传清单中新增或变化的文件; 第一次同步时才打开上传清单
+_baidu_sync: IncrementalSync | None = None
+
+
+def get_baidu_sync() -> IncrementalSync:
+    global _baidu_sync
+    if _baidu_sync is None:
+        _baidu_sync = IncrementalSync(ByPyUploader(), UploadManifest())
+    return _baidu_sync
+
+
+def update_and_sync(progress, feeds: set[str] | None = None) -> list[str] | None:
+    """在工作线程中执行: 更新 RSS 订阅并把新文件同步至百度网盘"""
+    # 更新流程依赖较多, 第一次更新时才导入
+    from utils.bangumi import run as bangumi_update
+
+    result = bangumi_update(progress=progress, only=feeds)
+    if result is None:
+        return None
+    if not result and feeds is not None:
+        return result  # 自动轮询没有新种子时不必同步
+    report = get_baidu_sync().sync(progress)
+    progress("百度网盘同步完成: " + report.describe())
+    return result
+
+
+def full_sync(progress, feeds: set[str] | None = None) -> list[str]:
+    """在工作线程中执行: 与百度网盘完整对账"""
+    try:
+        return [get_baidu_sync().full_sync().describe()]
+    except CancelledError:
+        raise RuntimeError("完整对账已取消 (已开始的对账会在工作进程中继续运行到结束)") from None
+
+
+def sync_summary(result: list[str]) -> tuple[str, str]:
+    return result[0], "百度网盘完整同步完成: " + result[0]
+
+
+rss_jobs = RssJobQueue(update_and_sync)
+sync_jobs = RssJobQueue(full_sync, summarize=sync_summary)
+
+
+def make_reporter(event: MessageEvent, adaptor: Adapter):
+    """构造向命令来源发送进度消息的回调, 经发送队列限速, 新种子较多时折叠为合并转发"""
+    if isinstance(event, GroupMessageEvent):
+        group_id = event.group_id
+        async def report(text: str) -> None:
+            await outbox.send(text, group_id=group_id, node_uin=event.self_id, self_id=event.self_id)
+    else:
+        user_id = event.user_id
+        async def report(text: str) -> None:
+            await outbox.send(text, user_id=user_id, node_uin=event.self_id, self_id=event.self_id)
+    return report
 
 
 @on_message(
@@ -22,17 +80,34 @@ BaiduPan = ByPy()
     checker=MsgChecker(role=LevelRole.OWNER, owner=OWNER)
 )
 async def rss_update(event: MessageEvent, adaptor: Adapter) -> None:
-    """处理 ..rssupdate 命令，更新 RSS 订阅"""
-    await adaptor.send("正在为主人更新 RSS 订阅...")
-    try:
-        result = bangumi_update()
-        text1 = f"本次已更新 {len(result)} 条 RSS 订阅:\n"
-        text2 = "\n".join(result)
-        await adaptor.send_reply(text1 + text2)
-    except Exception as e:
-        await adaptor.send_reply(f"更新失败: {e}")
-    BaiduPan.syncup(localdir=str(Path.home() / "bangumi"))
-    await adaptor.send("已将BT种子同步至百度网盘。")
+    """处理 ..rssupdate 命令，将 RSS 更新加入后台任务队列"""
+    job, merged = rss_jobs.submit(make_reporter(event, adaptor))
+    if merged:
+        await adaptor.send_reply(f"已有更新任务 #{job.job_id} 正在进行，完成后会一并通知主人。")
+    else:
+        await adaptor.send_reply(f"已为主人创建 RSS 更新任务 #{job.job_id}，进度会陆续发送。")
+
+
+@on_message(
+    parser=CmdParser(cmd_start="..", cmd_sep=" ", targets="rssstatus"),
+    checker=MsgChecker(role=LevelRole.OWNER, owner=OWNER),
+)
+async def rss_status(event: MessageEvent, adaptor: Adapter) -> None:
+    """处理 ..rssstatus 命令，查看 RSS 更新与网盘同步任务状态"""
+    await adaptor.send_reply("RSS 更新任务：\n" + rss_jobs.status() + "\n\n网盘同步任务：\n" + sync_jobs.status())
+
+
+@on_message(
+    parser=CmdParser(cmd_start="..", cmd_sep=" ", targets="rsssync"),
+    checker=MsgChecker(role=LevelRole.OWNER, owner=OWNER),
+)
+async def rss_sync(event: MessageEvent, adaptor: Adapter) -> None:
+    """处理 ..rsssync 命令，与百度网盘完整对账"""
+    job, merged = sync_jobs.submit(make_reporter(event, adaptor))
+    if merged:
+        await adaptor.send_reply(f"已有完整同步任务 #{job.job_id} 正在进行，完成后会一并通知主人。")
+    else:
+        await adaptor.send_reply(f"已创建完整同步任务 #{job.job_id}。")
 
 
 @on_message(
@@ -61,18 +136,15 @@ async def rss_link(event: MessageEvent, args: CmdArgs, adaptor: Adapter) -> None
         "savedir": args.vals[3],
         "rule": args.vals[4] if len(args.vals) > 4 else "",
     }
+    try:
+        FeedRule.from_item(add_link)
+    except RuleError as e:
+        await adaptor.send_reply(f"过滤规则无效，未添加: {e}")
+        return
 
-    if env_config_path := os.getenv("MTA_CONFIGPATH"):
-        config_path = Path(env_config_path)
-    else:
-        config_path = Path(".cache/bangumi_config/config.json")
-    config_path.parent.mkdir(parents=True, exist_ok=True)
     try:
-        with open(config_path, "r", encoding="utf8") as f:
-            config = json.load(f)
-        config.get("mikan").append(add_link)
-        with open(config_path, "w", encoding="utf8") as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
+        with config_store.edit() as config:
+            config["mikan"].append(add_link)
         await adaptor.send_reply("添加链接成功！")
     except Exception as e:
         await adaptor.send_reply(f"添加链接失败: {e}")
@@ -89,16 +161,8 @@ async def rss_list(event: MessageEvent, args: CmdArgs, adaptor: Adapter) -> None
         await adaptor.send_reply("列出所有RSS订阅链接。\n格式：\n..rsslist [-r <counts>]")
         return
 
-    if env_config_path := os.getenv("MTA_CONFIGPATH"):
-        config_path = Path(env_config_path)
-    else:
-        config_path = Path(".cache/bangumi_config/config.json")
-
     try:
-        with open(config_path, "r", encoding="utf8") as f:
-            config = json.load(f)
-
-        mikan_list = config.get("mikan", [])
+        mikan_list = config_store.get().get("mikan", [])
         start_index = 0
         if not mikan_list:
             await adaptor.send_reply("当前没有RSS订阅链接。")
@@ -119,13 +183,16 @@ async def rss_list(event: MessageEvent, args: CmdArgs, adaptor: Adapter) -> None
         response = "当前RSS订阅链接：\n"
         for i, item in enumerate(mikan_list, start=start_index):
             status = "启用" if item.get("enable", True) else "禁用"
-            rule = item.get("rule", "") or "无过滤规则"
+            try:
+                rule = FeedRule.from_item(item).describe()
+            except RuleError as e:
+                rule = f"规则无效 ({e})"
             response += f"[{i}] {item.get('title', '未知标题')} ({status})\n"
             response += f"    目录: {item.get('savedir', '未知目录')}\n"
             response += f"    规则: {rule}\n"
             response += f"    链接: {item.get('url', '未知链接')}\n\n"
 
-        await adaptor.send_reply(response.strip())
+        await outbox.reply(event, response.strip())
     except Exception as e:
         await adaptor.send_reply(f"获取RSS列表失败: {e}")
     return
@@ -140,8 +207,10 @@ async def rss_modify(event: MessageEvent, args: CmdArgs, adaptor: Adapter) -> No
     if len(args.vals) < 1 or args.vals[0] == "help":
         await adaptor.send_reply(
             "修改RSS订阅链接。\n格式：\n..rssmodify <索引> <字段> <新值>\n"
-            + "字段可选: url, title, enable, savedir, rule\n"
-            + "示例: ..rssmodify 0 title 新标题"
+            + "字段可选: url, title, enable, savedir, rule, include, exclude, resolution, group\n"
+            + "include/exclude/resolution/group 可用 ; 分隔多个值, 值为 - 时清空\n"
+            + "示例: ..rssmodify 0 title 新标题\n"
+            + "示例: ..rssmodify 0 exclude 繁体;BIG5"
         )
         return
 
@@ -158,51 +227,46 @@ async def rss_modify(event: MessageEvent, args: CmdArgs, adaptor: Adapter) -> No
         await adaptor.send_reply("索引必须是数字。请使用 ..rsslist 查看当前索引。")
         return
 
-    if field not in ["url", "title", "enable", "savedir", "rule"]:
-        await adaptor.send_reply(
-            "字段名错误。可选字段: url, title, enable, savedir, rule"
-        )
+    fields = ["url", "title", "enable", "savedir", *RULE_FIELDS]
+    if field not in fields:
+        await adaptor.send_reply("字段名错误。可选字段: " + ", ".join(fields))
         return
-
-    if env_config_path := os.getenv("MTA_CONFIGPATH"):
-        config_path = Path(env_config_path)
-    else:
-        config_path = Path(".cache/bangumi_config/config.json")
-
-    try:
-        with open(config_path, "r", encoding="utf8") as f:
-            config = json.load(f)
-
-        mikan_list = config.get("mikan", [])
-        if index < 0 or index >= len(mikan_list):
+    if field in RULE_FIELDS and new_value == "-":
+        new_value = ""
+    elif field in LIST_FIELDS:
+        new_value = [v.strip() for v in new_value.replace("；", ";").split(";") if v.strip()]
+
+    if field == "enable":
+        if new_value.lower() in ["true", "1", "yes", "on", "启用"]:
+            new_value = True
+        elif new_value.lower() in ["false", "0", "no", "off", "禁用"]:
+            new_value = False
+        else:
             await adaptor.send_reply(
-                f"索引 {index} 不存在。当前共有 {len(mikan_list)} 个RSS订阅。"
+                "enable字段只能设置为: true/false, 1/0, yes/no, on/off, 启用/禁用"
             )
             return
 
-        old_value = mikan_list[index].get(field, "")
-
-        if field == "enable":
-            if new_value.lower() in ["true", "1", "yes", "on", "启用"]:
-                new_value = True
-            elif new_value.lower() in ["false", "0", "no", "off", "禁用"]:
-                new_value = False
+    try:
+        # 编辑期间持有配置锁, 不能在其中 await
+        with config_store.edit() as config:
+            mikan_list = config["mikan"]
+            if index < 0 or index >= len(mikan_list):
+                reply = f"索引 {index} 不存在。当前共有 {len(mikan_list)} 个RSS订阅。"
             else:
-                await adaptor.send_reply(
-                    "enable字段只能设置为: true/false, 1/0, yes/no, on/off, 启用/禁用"
+                old_value = mikan_list[index].get(field, "")
+                mikan_list[index][field] = new_value
+                if field in RULE_FIELDS:
+                    # 规则无效时抛出 RuleError, 不会写回配置
+                    FeedRule.from_item(mikan_list[index])
+                reply = (
+                    "修改成功！\n"
+                    + f"RSS订阅 [{index}] {mikan_list[index].get('title', '未知标题')}\n"
+                    + f"字段 {field}: {old_value} -> {new_value}"
                 )
-                return
-
-        mikan_list[index][field] = new_value
-
-        with open(config_path, "w", encoding="utf8") as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
-
-        await adaptor.send_reply(
-            "修改成功！\n"
-            + f"RSS订阅 [{index}] {mikan_list[index].get('title', '未知标题')}\n"
-            + f"字段 {field}: {old_value} -> {new_value}"
-        )
+        await adaptor.send_reply(reply)
+    except RuleError as e:
+        await adaptor.send_reply(f"过滤规则无效，未修改: {e}")
     except Exception as e:
         await adaptor.send_reply(f"修改RSS链接失败: {e}")
     return
@@ -226,35 +290,55 @@ async def rss_delete(event: MessageEvent, args: CmdArgs, adaptor: Adapter) -> No
         await adaptor.send_reply("索引必须是数字。请使用 ..rsslist 查看当前索引。")
         return
 
-    if env_config_path := os.getenv("MTA_CONFIGPATH"):
-        config_path = Path(env_config_path)
-    else:
-        config_path = Path(".cache/bangumi_config/config.json")
-
     try:
-        with open(config_path, "r", encoding="utf8") as f:
-            config = json.load(f)
-
-        mikan_list = config.get("mikan", [])
-        if index < 0 or index >= len(mikan_list):
-            await adaptor.send_reply(
-                f"索引 {index} 不存在。当前共有 {len(mikan_list)} 个RSS订阅。"
-            )
-            return
-
-        deleted_item = mikan_list.pop(index)
-
-        with open(config_path, "w", encoding="utf8") as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
-
-        await adaptor.send_reply(
-            f"删除成功！\n已删除RSS订阅: {deleted_item.get('title', '未知标题')}"
-        )
+        with config_store.edit() as config:
+            mikan_list = config["mikan"]
+            if index < 0 or index >= len(mikan_list):
+                reply = f"索引 {index} 不存在。当前共有 {len(mikan_list)} 个RSS订阅。"
+            else:
+                deleted_item = mikan_list.pop(index)
+                reply = f"删除成功！\n已删除RSS订阅: {deleted_item.get('title', '未知标题')}"
+        await adaptor.send_reply(reply)
     except Exception as e:
         await adaptor.send_reply(f"删除RSS链接失败: {e}")
     return
 
 
 RssPlugin = PluginPlanner(
-    version="0.0.1", flows=[rss_update, rss_link, rss_list, rss_modify, rss_delete]
+    version="0.0.1", flows=[rss_update, rss_status, rss_sync, rss_link, rss_list, rss_modify, rss_delete]
 )
+
+
+async def report_to_owner(text: str) -> None:
+    await outbox.send(text, user_id=OWNER)
+
+
+def check_due_feeds() -> set[str]:
+    """在工作线程中执行: 导入更新模块并返回到了轮询时间的订阅"""
+    from utils.bangumi import due_feeds
+    return due_feeds()
+
+
+async def poll_loop() -> None:
+    """自动轮询: 定期把到了轮询时间的订阅加入更新队列, 有新种子时私聊通知主人"""
+    while True:
+        await asyncio.sleep(POLL_TICK)
+        if rss_jobs.busy:
+            continue
+        try:
+            feeds = await asyncio.to_thread(check_due_feeds)
+        except Exception as e:
+            print(f"检查待轮询订阅失败: {e}")
+            continue
+        if feeds:
+            rss_jobs.submit(report_to_owner, feeds=feeds, verbose=False)
+
+
+_poll_task: asyncio.Task | None = None
+
+
+@RssPlugin.on(PluginLifeSpan.INITED)
+async def start_poll_loop() -> None:
+    global _poll_task
+    if AUTO_POLL and _poll_task is None:
+        _poll_task = asyncio.create_task(poll_loop())
@@ -1,12 +1,17 @@
 from melobot import PluginPlanner, on_start_match, send_text
-from melobot.protocols.onebot.v11 import MessageEvent, Adapter, ReplySegment, on_message
+from melobot.plugin import PluginLifeSpan
+from melobot.protocols.onebot.v11 import (
+    MessageEvent, GroupMessageEvent, Adapter, ReplySegment, AtSegment, TextSegment, on_message
+)
 from melobot.utils.parse import CmdParser, CmdArgs
 
 import asyncio
 from datetime import datetime, timedelta, date
 import os
 
-from plugins.chat import conversation_dict
+from utils.timer_summary import load_records, get_summary, daily_summary_loop
+from utils.reminder import CalendarQueue, RuleError, parse_reminder
+from utils.outbox import outbox
 
 from dotenv import load_dotenv
 _ = load_dotenv()
@@ -14,6 +19,10 @@ OWNER = os.getenv("OWNER")
 
 active_timer: dict[str, dict[str, asyncio.Event | datetime | int | bool | asyncio.Task | timedelta | str]] = {}
 
+# 周期/定点提醒队列及唤醒调度循环的事件, 队列在插件初始化时从磁盘恢复
+reminders = CalendarQueue()
+_reminder_wakeup = asyncio.Event()
+
 async def timer(event: MessageEvent, adaptor: Adapter, time_str: str, delay: int, msg_id: str) -> None:
     """倒计时核心逻辑"""
     try:
@@ -25,7 +34,7 @@ async def timer(event: MessageEvent, adaptor: Adapter, time_str: str, delay: int
             await asyncio.sleep(1)
             delay -= 1
             active_timer[str(event.message_id)]["remain_time"] = timedelta(seconds=delay)
-        await adaptor.send_reply(f"时间到！倒计时 {time_str} 结束！")
+        await outbox.reply(event, f"时间到！倒计时 {time_str} 结束！")
         os.makedirs(".cache/timer",exist_ok=True)
         with open(f".cache/timer/{date.today()}.txt", "a+") as f:
             f.write(f"{active_timer[str(event.message_id)]['user']},{active_timer[str(event.message_id)]['tag']},{active_timer[str(event.message_id)]['total_time']}\n")
@@ -104,16 +113,25 @@ async def timer_set(event: MessageEvent, args: CmdArgs, adaptor: Adapter) -> Non
 @on_start_match(target=".timerlist")
 async def timer_list(event: MessageEvent, adaptor: Adapter) -> None:
     """处理 .timerlist 命令，列出所有活动的倒计时"""
-    if not active_timer:
+    user_reminders = reminders.for_user(None if str(event.user_id) == OWNER else event.user_id)
+    if not active_timer and not user_reminders:
         await adaptor.send_reply("当前没有活动的倒计时。")
         return
 
-    response = "当前活动的倒计时：\n"
-    for msg_id, timer_info in active_timer.items():
-        user_id = timer_info["user"]
-        response += f"倒计时ID: {msg_id}, 倒计时发起者QQ号: {user_id}, 剩余时间: {timer_info['remain_time']}\n"
+    response = ""
+    if active_timer:
+        response += "当前活动的倒计时：\n"
+        for msg_id, timer_info in active_timer.items():
+            user_id = timer_info["user"]
+            response += f"倒计时ID: {msg_id}, 倒计时发起者QQ号: {user_id}, 剩余时间: {timer_info['remain_time']}\n"
 
-    await adaptor.send_reply(response)
+    if user_reminders:
+        response += "当前的提醒：\n"
+        for reminder in user_reminders:
+            next_fire = datetime.fromtimestamp(reminder.next_fire).strftime("%Y-%m-%d %H:%M")
+            response += f"提醒ID: {reminder.reminder_id}, 规则: {reminder.rule.describe()}, 下次提醒: {next_fire}, 内容: {reminder.message}\n"
+
+    await outbox.reply(event, response.strip())
 
 @on_start_match(target=".check")
 async def check_timer(event: MessageEvent, adaptor: Adapter) -> None:
@@ -133,7 +151,7 @@ async def check_timer(event: MessageEvent, adaptor: Adapter) -> None:
 async def timer_kill(event: MessageEvent, args: CmdArgs, adaptor: Adapter) -> None:
     """处理 .timerkill 命令，取消指定的倒计时"""
     if len(args.vals) < 1 or args.vals[0] == "help":
-        await adaptor.send_reply("取消指定的倒计时。\n格式：\n.timerkill <倒计时ID>")
+        await adaptor.send_reply("取消指定的倒计时。\n格式：\n.timerkill <倒计时ID或提醒ID>")
         return
 
     try:
@@ -148,9 +166,84 @@ async def timer_kill(event: MessageEvent, args: CmdArgs, adaptor: Adapter) -> No
             task.cancel()
             del active_timer[msg_id]
             await adaptor.send_reply(f"倒计时 {msg_id} 已被取消。")
+    elif msg_id in reminders.reminders:
+        reminder = reminders.reminders[msg_id]
+        if reminder.user_id != event.user_id and str(event.user_id) != OWNER:
+            await adaptor.send_reply("只能取消自己设置的提醒。")
+            return
+        reminders.remove(msg_id)
+        reminders.save()
+        _reminder_wakeup.set()
+        await adaptor.send_reply(f"提醒 {msg_id} 已被取消。")
     else:
         await adaptor.send_reply(f"没有找到 ID 为 {msg_id} 的倒计时。")
 
+@on_start_match(target=".remind")
+async def remind_set(event: MessageEvent, adaptor: Adapter) -> None:
+    """处理 .remind 命令，设置周期或定点提醒"""
+    text = "".join(seg.data["text"] for seg in event.get_segments(TextSegment)).strip()
+    text = text[len(".remind"):].strip()
+    if not text or text == "help":
+        await adaptor.send_reply(
+            "设置周期或定点提醒。\n格式：\n.remind <时间规则> <提醒内容>\n"
+            "示例：\n.remind 每天早上8点 起床\n.remind 每周一晚上9点 组会\n"
+            ".remind 明天下午3点 交作业\n.remind 2025-01-01 08:00 新年快乐\n"
+            ".remind cron 0 8 * * 1-5 打卡"
+        )
+        return
+
+    try:
+        rule, message = parse_reminder(text)
+        group_id = event.group_id if isinstance(event, GroupMessageEvent) else None
+        reminder = reminders.add(rule, message or "时间到", event.user_id, group_id, self_id=event.self_id)
+    except RuleError as e:
+        await adaptor.send_reply(f"提醒设置失败：{e}")
+        return
+
+    reminders.save()
+    _reminder_wakeup.set()
+    next_fire = datetime.fromtimestamp(reminder.next_fire).strftime("%Y-%m-%d %H:%M")
+    await adaptor.send_reply(f"提醒 {reminder.reminder_id} 已设置，下次提醒时间：{next_fire}。可以使用 .timerkill {reminder.reminder_id} 取消。")
+
+
+async def dispatch_reminders() -> None:
+    """提醒调度循环：睡眠到最早的触发时间，然后按目标批量发送到期提醒"""
+    while True:
+        next_fire = reminders.next_fire()
+        timeout = None if next_fire is None else max(0.0, next_fire - datetime.now().timestamp())
+        _reminder_wakeup.clear()
+        try:
+            await asyncio.wait_for(_reminder_wakeup.wait(), timeout)
+            continue  # 队列有变化，重新计算睡眠时间
+        except asyncio.TimeoutError:
+            pass
+
+        batches = reminders.pop_due()
+        if not batches:
+            continue
+        reminders.save()
+
+        sends = []
+        for (self_id, kind, target_id), items in batches.items():
+            segments = [TextSegment("提醒时间到！\n")]
+            for reminder in items:
+                if kind == "group":
+                    segments.append(AtSegment(reminder.user_id))
+                segments.append(TextSegment(f" {reminder.message}\n"))
+            sends.append(send_reminder(kind, target_id, segments, self_id))
+        await asyncio.gather(*sends)
+
+
+async def send_reminder(kind: str, target_id: int, segments: list, self_id: int | None = None) -> None:
+    """经发送队列发送一批提醒, 各目标并行排队, 同一目标按限速依次发出"""
+    try:
+        if kind == "group":
+            await outbox.send(segments, group_id=target_id, self_id=self_id)
+        else:
+            await outbox.send(segments, user_id=target_id, self_id=self_id)
+    except Exception as e:
+        print(f"发送提醒失败: {e}")
+
 @on_message(parser=CmdParser(cmd_start=".", cmd_sep=" ", targets="todaytimer"))
 async def today_timer(event: MessageEvent, args: CmdArgs, adaptor: Adapter) -> None:
     """处理 .todaytimer 命令，查看特定日期的倒计时记录（默认今天）"""
@@ -159,49 +252,23 @@ async def today_timer(event: MessageEvent, args: CmdArgs, adaptor: Adapter) -> N
         return
     date_str = args.vals[0] if args.vals else date.today().strftime("%Y-%m-%d")
 
-    os.makedirs(".cache/timer", exist_ok=True)
-    file_path = f".cache/timer/{date_str}.txt"
-    if not os.path.exists(file_path):
+    totals = load_records(date_str)
+    if not totals:
         await adaptor.send_reply(f"{date_str} 没有倒计时记录。")
         return
 
-    with open(file_path, "r") as f:
-        records = f.readlines()
-
     response = f"{date_str}的计时记录：\n"
-    total_time: dict[str, timedelta] = {}
-    total_user: dict[str, dict[str, timedelta]] = {}
-    for user in os.listdir(".cache/timer/prompt"):
-        user_id = user.split(".")[0]
-        total_user[user_id] = dict()
-    for record in records:
-        user_id, tag, time = record.strip().split(",")
-        hh, mm, ss = map(int, time.split(":"))
-        time = hh * 3600 + mm * 60 + ss
-        total_time[f"{user_id},{tag}"] = total_time.get(f"{user_id},{tag}", timedelta(0)) + timedelta(seconds=time)
-    for key, value in total_time.items():
-        user_id, tag = key.split(",")
-        if user_id in total_user:
-            total_user[user_id][tag] = total_user[user_id].get(tag, timedelta(0)) + value
-
-        if str(event.user_id) == OWNER:
-            response += f"用户QQ号: {user_id}, 标签: {tag}, 总时间: {value}\n"
-        elif user_id == str(event.user_id):
-            response += f"标签: {tag}, 总时间: {value}\n"
+    for user_id, tags in totals.items():
+        for tag, value in tags.items():
+            if str(event.user_id) == OWNER:
+                response += f"用户QQ号: {user_id}, 标签: {tag}, 总时间: {value}\n"
+            elif user_id == str(event.user_id):
+                response += f"标签: {tag}, 总时间: {value}\n"
     await adaptor.send_reply(response)
 
-    if str(event.user_id) in total_user:
-        event_str = "\n".join([f"{key}: {value}" for key, value in total_user[str(event.user_id)].items()])
-        with open(f".cache/timer/prompt/{event.user_id}.txt", "r") as f:
-            prompt = f.read().strip()
-        prompt = prompt.format(event_str=event_str)
-        response = conversation_dict[event.user_id].chat(prompt)
-        # owner_response = conversation_dict[int(OWNER)].chat(f"""一天5个小时是我的给自己计划的保底学习时间，7个小时是我给自己的标准学习时间。
-        #                                                     今天我不同事项的学习时间是：\n{event_str}\n
-        #                                                     上面学习时间的格式为HH:MM:SS。
-        #                                                     你帮我算算今天我一共学了多久，再安慰或者鼓励我一下吧。
-        #                                                     """)
-        await send_text(response)
+    summary = await get_summary(str(event.user_id), date_str)
+    if summary:
+        await send_text(summary)
 
 @on_message(parser=CmdParser(cmd_start=".", cmd_sep=" ", targets="todayprompt"))
 async def today_prompt(event: MessageEvent, args: CmdArgs, adaptor: Adapter) -> None:
@@ -223,4 +290,14 @@ async def today_prompt(event: MessageEvent, args: CmdArgs, adaptor: Adapter) ->
             f.write(prompt)
         await adaptor.send_reply(f"已成功设置用户 {user} 的todaytimer的prompt。")
 
-TimerPlugin = PluginPlanner(version="0.0.1", flows=[timer_set, timer_list, check_timer, timer_kill, pause, today_timer, today_prompt])
+TimerPlugin = PluginPlanner(version="0.0.1", flows=[timer_set, timer_list, check_timer, timer_kill, pause, remind_set, today_timer, today_prompt])
+
+_background_tasks: list[asyncio.Task] = []
+
+@TimerPlugin.on(PluginLifeSpan.INITED)
+async def start_background_tasks() -> None:
+    """插件加载后恢复提醒队列, 并启动每日总结的定时批处理与提醒调度循环"""
+    if not _background_tasks:
+        reminders.load()
+        _background_tasks.append(asyncio.create_task(daily_summary_loop()))
+        _background_tasks.append(asyncio.create_task(dispatch_reminders()))
@@ -0,0 +1,135 @@
+"""多账号 - 一个进程连接多个 OneBot 实现, 记录各连接对应的账号, 并把消息从收到事件的账号发回"""
+import asyncio
+import os
+import re
+import time
+from collections import Counter
+from typing import Any, Callable
+
+from dotenv import load_dotenv
+from melobot.adapter import AdapterLifeSpan
+from melobot.protocols.onebot.v11 import Adapter
+
+load_dotenv()
+# 同一个群里有多个账号时, 只由其中排在最前的账号处理群消息 (被 @ 的账号除外);
+# 账号超过这么多秒没有收到某个群的消息, 视为已不在该群
+GROUP_OWNER_TTL = float(os.getenv("ACCOUNT_GROUP_OWNER_TTL", "600"))
+
+
+def _mentions(data: dict, self_id: int) -> bool:
+    """原始消息是否 @ 了该账号, 兼容消息段数组与 CQ 码字符串两种格式"""
+    message = data.get("message")
+    if isinstance(message, list):
+        return any(
+            seg.get("type") == "at" and str(seg.get("data", {}).get("qq")) == str(self_id)
+            for seg in message
+        )
+    return re.search(rf"\[CQ:at,qq={self_id}[,\]]", str(data.get("raw_message") or message or "")) is not None
+
+
+class AccountRegistry:
+    """
+    多账号连接的登记表。
+
+    add_io 按配置顺序登记连接并包装它的 input, 从原始事件的 self_id 得知连接对应的账号;
+    route 返回 filter_out 使用的过滤函数, 让不在事件处理流程中的发送 (发送队列、提醒、自动轮询)
+    也从指定账号发出, 未指定账号时从第一个连接发出。
+    同一个群里有多个账号时, 其余账号收到的同一条群消息在分发前丢弃, 避免重复回复。
+    只有一个连接时不做任何过滤, 与单账号的行为相同。
+    """
+
+    def __init__(self) -> None:
+        self.ios: list[Any] = []
+        self.self_ids: dict[int, int] = {}  # 连接序号 -> 账号
+        self.events: Counter[int] = Counter()
+        self.dropped: Counter[int] = Counter()
+        self._groups: dict[int, dict[int, float]] = {}  # 群号 -> {连接序号: 最近收到消息的时间}
+
+    def add_io(self, io):
+        index = len(self.ios)
+        self.ios.append(io)
+        read = io.input
+
+        async def input():
+            while True:
+                packet = await read()
+                if self.accept(index, packet.data):
+                    return packet
+
+        io.input = input
+        return io
+
+    @property
+    def multi(self) -> bool:
+        return len(self.ios) > 1
+
+    def learn(self, index: int, self_id: int) -> None:
+        if self.self_ids.get(index) != self_id:
+            self.self_ids[index] = self_id
+            print(f"连接 {index + 1} 登录账号 {self_id}")
+
+    def accept(self, index: int, data: dict) -> bool:
+        """记录事件来自哪个账号, 返回是否分发该事件"""
+        if (self_id := data.get("self_id")) is not None:
+            self.learn(index, int(self_id))
+        self.events[index] += 1
+        if not self.multi or data.get("post_type") != "message" or data.get("message_type") != "group":
+            return True
+
+        now = time.monotonic()
+        seen = self._groups.setdefault(data.get("group_id"), {})
+        seen[index] = now
+        owner = min(i for i, last in seen.items() if now - last <= GROUP_OWNER_TTL)
+        if index == owner or (self_id is not None and _mentions(data, self_id)):
+            return True
+        self.dropped[index] += 1
+        return False
+
+    def index_of(self, self_id: int | None) -> int:
+        for index, known in self.self_ids.items():
+            if known == self_id:
+                return index
+        return 0
+
+    def resolve(self, self_id: int | None) -> int | None:
+        """未指定账号时使用第一个连接的账号"""
+        return self.self_ids.get(0) if self_id is None else self_id
+
+    def route(self, self_id: int | None) -> Callable[[Any], bool] | None:
+        """filter_out 使用的过滤函数; 只有一个连接时返回 None, 交给 melobot 默认处理"""
+        if not self.multi:
+            return None
+        io = self.ios[self.index_of(self_id)]
+        return lambda src: src is io
+
+    async def login(self, adapter: Adapter, index: int) -> None:
+        """通过 get_login_info 获取连接的账号, 不必等到收到第一个事件"""
+        try:
+            with adapter.filter_out(lambda src: src is self.ios[index]):
+                handle = await adapter.get_login_info()
+            echo = await asyncio.wait_for(handle.unwrap(0), 30)
+            if echo.data:
+                self.learn(index, int(echo.data["user_id"]))
+        except Exception as e:
+            print(f"获取连接 {index + 1} 的账号失败, 将从收到的事件中得知: {e}")
+
+    def install(self, adapter: Adapter) -> None:
+        @adapter.on(AdapterLifeSpan.STARTED)
+        async def start_login() -> None:
+            if self.multi:
+                for index in range(len(self.ios)):
+                    asyncio.create_task(self.login(adapter, index))
+
+    def status(self) -> str:
+        lines = [f"共 {len(self.ios)} 个连接:"]
+        for index in range(len(self.ios)):
+            account = self.self_ids.get(index, "未知")
+            lines.append(f"  {index + 1}. 账号 {account}: 收到 {self.events[index]} 个事件, "
+                         f"丢弃重复的群消息 {self.dropped[index]} 条")
+        shared = sum(len(seen) > 1 for seen in self._groups.values())
+        if self.multi:
+            lines.append(f"{len(self._groups)} 个群中有 {shared} 个群同时有多个账号")
+        return "\n".join(lines)
+
+
+accounts = AccountRegistry()
@@ -1,46 +1,33 @@
 # -*- coding: utf-8 -*-
 # 导入所有需要的库
 import os
-import re
-import sys
+import threading
+from concurrent.futures import CancelledError
 
-import feedparser
 import requests
 from pathlib import Path
+from typing import Callable
 from loguru import logger
 
-# 获取当前脚本文件所在的目录路径
-workspace = Path(sys.argv[0]).resolve().parent
+from .bangumi_config import config_store
+from .bangumi_download import DOWNLOAD_GIVE_UP, DownloadTask, TorrentDownloader
+from .bangumi_episode import ReleasePolicy, analyze_title, episode_key, pick_best, url_infohash
+from .bangumi_feed import FeedFormatError, ParsedFeed, StreamingFeed, parse_feed
+from .bangumi_fetch import FETCH_WORKERS, FeedCache, FeedFetcher, FeedHealth
+from .bangumi_history import HistoryRecord, HistoryStore
+from .bangumi_rules import FeedRule, RuleSet
+from .bangumi_scheduler import PollScheduler
+from .workers import workers
 
-# 确定配置文件的路径
-if env_config_path := os.getenv("MTA_CONFIGPATH"):
-    logger.info(f"从环境变量加载配置文件, 路径: {env_config_path}")
-    config_path = Path(env_config_path)
-else:
-    logger.info(f"使用默认配置文件路径, {workspace}/.cache/bangumi_config/config.json")
-    config_path = Path(f"{workspace}/.cache/bangumi_config/config.json")
-
-# 从配置文件加载配置
-config = None
-if config_path.exists() and config_path.is_file():
-    if config_path.suffix == '.json':
-        import json
-        config = json.load(config_path.open(encoding="utf8"))
-        logger.info(f"成功加载配置文件: {config_path.as_posix()}")
-    else:
-        logger.warning(f"不支持的配置文件类型, {config_path.name}")
+# 项目根目录
+workspace = Path(__file__).resolve().parent.parent
 
-if not config:
-    logger.error("配置文件未找到或加载失败!")
-    exit(1)
-
-# 确定历史记录文件的路径
+# 确定历史记录文件的路径 (旧版的 history.txt 会在首次启动时导入同名的 .db 文件)
 if history_path := os.getenv("MTA_HISTORY_FILE"):
     history_path = Path(history_path)
 else:
     history_path = Path(f"{workspace}/.cache/bangumi_config/history.txt")
-logger.info(f"使用历史记录文件: {history_path.as_posix()}")
-history_path.parent.mkdir(parents=True, exist_ok=True)
+history_db_path = history_path.with_suffix(".db")
 
 # 确定 .torrent 文件的根保存目录
 if torrent_dir := os.getenv("MTA_TORRENTS_DIR"):
@@ -48,163 +35,334 @@ if torrent_dir := os.getenv("MTA_TORRENTS_DIR"):
 else:
     # torrent_base_dir = Path("/home/ecs-user/bangumi/bangumi")
     torrent_base_dir = Path.home() / "bangumi" / "bangumi"
-logger.info(f"种子文件将保存在根目录: {torrent_base_dir.as_posix()}")
-torrent_base_dir.mkdir(parents=True, exist_ok=True)  # 确保根目录存在
-
-# 设置历史记录的最大条目数
-MAX_HISTORY = os.getenv("MTA_MAX_HISTORY", max(300, len([f for f in config.get('mikan', []) if f.get('enable', True)]) * 48))
-logger.info(f"最大历史记录条数设置为 {MAX_HISTORY}")
-
-
-def load_history() -> set:
-    """从 history.txt 文件中加载下载历史记录"""
-    history = set()
-    if history_path.exists() and history_path.is_file():
-        with history_path.open(encoding='utf8') as f:
-            for line in f:
-                bang = line.strip()
-                if bang == '':
-                    continue
-                history.add(bang)
-                if len(history) >= MAX_HISTORY:
-                    break
-    else:
-        history_path.touch(exist_ok=True)
-    return history
-
-# 加载历史记录到全局变量中
-downloaded_history = load_history()
-
-# 初始化 HTTP 请求会话 (session)
-session = requests.session()
-# 从环境变量或配置文件中加载代理设置
-if http_proxy := os.getenv("HTTP_PROXY"):
-    session.proxies.update(http=http_proxy)
-if https_proxy := os.getenv("HTTPS_PROXY"):
-    session.proxies.update(https=https_proxy)
-if proxy := config.get('proxy'):
-    session.proxies.update(proxy)
 
 # 设置 User-Agent
 agent = os.getenv("MTA_USER_AGENT", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36 Edg/114.0.1823.82")
-session.headers = {"user-agent": agent}
 
+# 各订阅预编译的过滤规则
+feed_rules = RuleSet()
 
-def download_and_save_torrent(url: str, save_dir: str, title: str):
-    """
-    下载 .torrent 文件, 根据标题重命名后保存到指定的子目录中。
 
-    :param url: .torrent 文件的下载链接
-    :param save_dir: 要保存在哪个子目录 (通常是番剧名)
-    :param title: RSS 条目的原始标题, 用于生成文件名
+class BangumiRuntime:
     """
-    # 对原始标题进行清理, 移除在文件名中非法的字符, 使其成为一个安全的文件名
-    safe_title = re.sub(r'[\\/*?:"<>|]', "_", title)
-    new_filename = f"{safe_title}.torrent"
-
-    # 构造最终的保存路径, 如: torrents/某某番剧/净化后的标题.torrent
-    save_path = torrent_base_dir.joinpath(save_dir, new_filename)
-
-    # 确保番剧专属的子目录存在, 如果不存在则创建
-    save_path.parent.mkdir(parents=True, exist_ok=True)
+    更新所需的会话与状态文件。
 
-    logger.info(f"准备下载种子: {title}")
-    try:
-        # 使用 session 下载 .torrent 文件
-        resp = session.get(url)
-        resp.raise_for_status()  # 如果请求失败 (例如 404), 会抛出异常
+    在第一次更新时才创建, 导入本模块不会读取配置或打开数据库;
+    配置文件缺失时抛出 RuntimeError, 只影响本次更新。
+    """
 
-        # 将下载的二进制内容写入文件
-        save_path.write_bytes(resp.content)
-        logger.success(f"成功保存种子文件到: {save_path.as_posix()}")
+    def __init__(self) -> None:
+        logger.info(f"使用配置文件: {config_store.path.as_posix()}")
+        config = config_store.get()
+        if not config:
+            raise RuntimeError(f"配置文件 {config_store.path.as_posix()} 未找到或加载失败!")
+
+        logger.info(f"使用历史记录数据库: {history_db_path.as_posix()}")
+        history_path.parent.mkdir(parents=True, exist_ok=True)
+        logger.info(f"种子文件将保存在根目录: {torrent_base_dir.as_posix()}")
+        torrent_base_dir.mkdir(parents=True, exist_ok=True)  # 确保根目录存在
+
+        # 加载历史记录 (超过 MTA_HISTORY_DAYS 天的记录会在每次更新时清理, 每天最多一次)
+        self.history = HistoryStore(history_db_path, legacy_path=history_path)
+
+        # 初始化 HTTP 请求会话 (session), 从环境变量或配置文件中加载代理设置
+        self.session = session = requests.session()
+        if http_proxy := os.getenv("HTTP_PROXY"):
+            session.proxies.update(http=http_proxy)
+        if https_proxy := os.getenv("HTTPS_PROXY"):
+            session.proxies.update(https=https_proxy)
+        if proxy := config.get('proxy'):
+            session.proxies.update(proxy)
+        # 连接池大小与并发抓取数一致, 避免线程间争抢连接
+        http_adapter = requests.adapters.HTTPAdapter(pool_connections=FETCH_WORKERS, pool_maxsize=FETCH_WORKERS)
+        session.mount("http://", http_adapter)
+        session.mount("https://", http_adapter)
+        session.headers = {"user-agent": agent}
+
+        # 订阅健康状态 (失败次数与退避时间), 与历史记录放在同一目录
+        self.feed_health = FeedHealth(history_path.parent / "feed_health.json")
+        # 订阅缓存元数据 (etag / last_modified / 内容指纹 / 最新条目 guid)
+        self.feed_cache = FeedCache(history_path.parent / "feed_cache.json")
+        # 轮询调度状态 (各订阅的发布规律与下次轮询时间)
+        self.poll_scheduler = PollScheduler(history_path.parent / "feed_schedule.json")
+
+
+_runtime: BangumiRuntime | None = None
+_runtime_lock = threading.Lock()
+
+
+def runtime() -> BangumiRuntime:
+    """获取更新所需的会话与状态, 首次调用时创建, 失败时下次调用会重试"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = BangumiRuntime()
+        return _runtime
+
+
+def get_latest(content: bytes, rule: FeedRule | None = None, savedir: str | None = None,
+               stop_guid: str | None = None, feed_url: str = "") -> tuple[list[DownloadTask], str | None, list[float]]:
+    """
+    解析已抓取的 RSS feed 内容, 找出需要下载的新种子。
+
+    Mikan 的条目按发布时间倒序排列, 遇到上次已处理过的最新条目 (stop_guid)
+    或已在下载历史中的条目即停止遍历。
+    有 stop_guid 时通常只有开头几个条目是新的, 直接在当前线程流式解析, 停止遍历后剩余内容不再解析
+    (下载历史只在本进程中可用, 交给工作进程就无法在历史命中时提前停止);
+    没有 stop_guid 时需要遍历全部条目, 整体交给工作进程解析。
+    返回 (下载任务列表, 本次最新条目的 guid, 遍历过的条目的发布时间)。
+    """
+    if stop_guid:
+        try:
+            return _collect(StreamingFeed(content), rule, savedir, stop_guid, feed_url)
+        except FeedFormatError:
+            # _collect 没有副作用, 交给工作进程按 feedparser 重新解析
+            pass
+    feed = workers.call("feed", parse_feed, content, stop_guid)
+    if feed.fallback:
+        logger.warning(f"订阅 {feed_url} 不是预期的 Mikan RSS 格式 ({feed.fallback}), 改用 feedparser 解析")
+    return _collect(feed, rule, savedir, stop_guid, feed_url)
+
+
+def _collect(feed: ParsedFeed | StreamingFeed, rule: FeedRule | None, savedir: str | None,
+             stop_guid: str | None, feed_url: str) -> tuple[list[DownloadTask], str | None, list[float]]:
+    tasks: list[DownloadTask] = []
+    published: list[float] = []
+    seen_titles = set()
+    newest_guid = None
+    history = runtime().history
+
+    for index, entry in enumerate(feed):
+        title = entry.title
+        if index == 0:
+            newest_guid = entry.guid
+
+        if stop_guid and entry.guid == stop_guid:
+            break
+
+        if entry.published is not None:
+            published.append(entry.published)
+
+        if rule and not rule.match(title):
+            continue
 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"下载种子文件 {url} 失败, 错误: {e}")
+        if title in history:
+            # 有上次的处理记录时, 更早的条目都已处理过
+            if stop_guid:
+                break
+            continue
 
+        if title not in seen_titles and entry.torrent_url:
+            bangumi_name = savedir or feed.title.replace("Mikan Project - ", "")
+            tasks.append(DownloadTask(entry.torrent_url, bangumi_name, title, feed_url))
+            seen_titles.add(title)
 
-def get_latest(url: str, rule: str | None = None, savedir: str | None = None, cache: list[str] = []) -> list[str]:
-    """获取指定 RSS feed 的最新更新, 并下载保存种子文件"""
-    bangumi_cache = set()
-    try:
-        content = session.get(url).content
-    except requests.exceptions.RequestException as e:
-        logger.error(f"无法获取 RSS Feed: {url}, 错误: {e}")
-        return # 获取失败则直接返回
+    return tasks, newest_guid, published
 
-    entries = feedparser.parse(content)
 
-    if savedir:
-        bangumi_name = savedir
-    else:
-        bangumi_name = entries['feed']['title'].replace("Mikan Project - ", "")
+def select_releases(candidates: list[DownloadTask]) -> tuple[list[DownloadTask], int]:
+    """
+    每集只保留一个最佳版本, 返回 (要下载的任务, 跳过的重复条目数)。
 
-    for entry in entries['entries']:
-        title = entry['title'].strip()
+    infohash (从 Mikan 的下载地址得到) 或剧集已在下载历史中的条目直接跳过;
+    同一集的多个版本 (不同字幕组、分辨率、重新发布或来自多个订阅) 按最先配置的订阅的偏好挑选
+    (候选按订阅的配置顺序排列, 使用第一个版本所属订阅的 task.policy)。
+    """
+    history = runtime().history
+    seen_hashes = set()
+    episodes: dict[str, list[DownloadTask]] = {}
+    selected: list[DownloadTask] = []
+    skipped = 0
+    for task in candidates:
+        if torrent_hash := url_infohash(task.url):
+            if torrent_hash in seen_hashes or history.has_infohash(torrent_hash):
+                skipped += 1
+                continue
+            seen_hashes.add(torrent_hash)
+        if task.episode_key is None:
+            selected.append(task)
+        elif history.has_episode(task.episode_key):
+            skipped += 1
+        else:
+            episodes.setdefault(task.episode_key, []).append(task)
 
-        if rule and not re.search(rule, title):
-            continue
+    best = {
+        id(pick_best(variants, lambda t: analyze_title(t.title), variants[0].policy))
+        for variants in episodes.values()
+    }
+    skipped += sum(len(variants) for variants in episodes.values()) - len(best)
+    selected.extend(t for t in candidates if id(t) in best)
+    return selected, skipped
 
-        if title not in downloaded_history and title not in bangumi_cache:
-            download_url = None
-            for link in entry['links']:
-                if link.get('type') == 'application/x-bittorrent':
-                    download_url = link['href']
-                    break  # 找到后即可退出循环
-
-            if download_url:
-                # 【调用新函数】将下载任务交给新的保存函数处理
-                download_and_save_torrent(download_url, bangumi_name, title)
-                bangumi_cache.add(title)
-                cache.append(title)
-        else:
-            # logger.debug(f"跳过已处理的条目: {title}")
-            continue
 
-    downloaded_history.update(bangumi_cache)
-    return cache
+def history_record(result, failed: bool = False) -> HistoryRecord:
+    task = result.task
+    info = analyze_title(task.title)
+    return HistoryRecord(
+        title=task.title, save_dir=task.save_dir, feed_url=task.feed_url,
+        group=info.group, series=info.series, episode=info.episode,
+        resolution=info.resolution, lang=info.lang,
+        # 放弃的条目不占用剧集与 infohash, 同一集的其他版本仍可下载
+        episode_key=None if failed else task.episode_key, infohash=None if failed else result.infohash,
+        failed=failed,
+    )
 
 
-def write_history(line):
-    """将新的下载历史写入文件顶部 (此函数未改变)"""
-    line = line.strip()
-    if line == '':
-        return
-    with history_path.open(mode='r+', encoding='utf8') as w:
-        content = w.read()
-        w.seek(0, 0)
-        w.write(line + '\n' + content)
+def due_feeds() -> set[str]:
+    """当前到了轮询时间的已启用订阅的 url"""
+    current = config_store.get()
+    urls = [b['url'] for b in current.get('mikan', []) if b.get('enable', True) and b.get('url')]
+    return set(runtime().poll_scheduler.due(urls))
 
 
-# --- 4. 主程序运行 (逻辑基本未变) ---
 @logger.catch
-def run() -> list[str]:
-    """主执行函数"""
-    global config
-    cache: list[str] = []
-    config = json.load(config_path.open(encoding="utf8"))
-    logger.info("开始检查 Mikan RSS Feed 更新...")
-    logger.info(config)
-    for bangumi in config.get('mikan', []):
+def run(progress: Callable[[str], None] | None = None, only: set[str] | None = None) -> list[str]:
+    """
+    主执行函数, 返回本次成功保存的种子标题。
+
+    :param progress: 进度回调, 在抓取结束和每个订阅的种子全部下载完成时调用 (在工作线程中调用)
+    :param only: 只检查这些 url 的订阅, 为 None 时检查全部已启用的订阅
+    """
+    progress = progress or (lambda _: None)
+    rt = runtime()
+    feed_cache, poll_scheduler = rt.feed_cache, rt.poll_scheduler
+    # 运行时对象常驻进程, 每次更新时检查一次保留期 (每天最多清理一次)
+    rt.history.prune()
+    config = config_store.get()
+    logger.info(f"开始检查 Mikan RSS Feed 更新... (配置版本 {config_store.version})")
+    # 配置版本不变时沿用已编译的规则
+    feed_rules.refresh(config, config_store.version)
+
+    # (订阅配置, 该订阅自己的过滤规则), 同一 url 可以有多个规则不同的订阅
+    feeds: list[tuple[dict, FeedRule]] = []
+    for index, bangumi in enumerate(config.get('mikan', [])):
         if not bangumi.get('enable', True):
             continue
-
-        url = bangumi.get('url')
-        if not url:
+        if not bangumi.get('url'):
             logger.warning("发现一个已启用但没有提供 url 的配置项, 已跳过。")
             continue
+        if only is not None and bangumi['url'] not in only:
+            continue
+        if index in feed_rules.errors:
+            progress(f"《{bangumi.get('title', bangumi['url'])}》的过滤规则无效, 已跳过: {feed_rules.errors[index]}")
+            continue
+        feeds.append((bangumi, feed_rules.get(index)))
+
+    def fingerprint(bangumi: dict, rule: FeedRule) -> str:
+        """订阅的指纹, 由解析时实际使用的规则与保存目录构成"""
+        return f"{rule.fingerprint}\n{bangumi.get('savedir') or ''}"
+
+    # 同一 url 的多个订阅按规则指纹分别记录进度; 新增订阅或规则、保存目录变化后
+    # 该订阅没有可信的进度, 需要完整下载 url 的内容并重新解析, 其他订阅的进度不受影响
+    for bangumi, rule in feeds:
+        if fingerprint(bangumi, rule) not in feed_cache.subscriptions(bangumi['url']):
+            feed_cache.forget_validators(bangumi['url'])
+
+    # 抓取阶段: 并发请求所有订阅, 单个订阅超时或失败不会阻塞其他订阅
+    results = FeedFetcher(rt.session, rt.feed_health, feed_cache).fetch_all([b['url'] for b, _ in feeds])
+    changed = sum(r.changed for r in results.values())
+    failed = sum(not r.ok for r in results.values())
+    progress(f"已检查 {len(results)} 个订阅, {changed} 个有变化, {failed} 个失败或处于退避期。")
+
+    # 解析阶段: 收集所有订阅的候选条目, 同一标题只保留一个
+    candidates: list[DownloadTask] = []
+    queued_titles = set()
+    pending_meta: dict[str, dict] = {}
+    cancelled: set[str] = set()
+    for bangumi, rule in feeds:
+        url = bangumi['url']
+        result = results[url]
+        if not result.changed:
+            continue
 
-        rule = bangumi.get('rule') or None
         savedir = bangumi.get('savedir') or None
 
-        cache = get_latest(url, rule=rule, savedir=savedir, cache=cache)
-
-    if len(cache) > 0:
-        logger.info(f"本次运行共新增 {len(cache)} 个种子文件, 正在更新历史记录...")
-        write_history('\n'.join(cache[::-1]))
+        try:
+            feed_tasks, newest_guid, published = get_latest(
+                result.content, rule=None if rule.is_empty else rule, savedir=savedir,
+                stop_guid=feed_cache.subscriptions(url).get(fingerprint(bangumi, rule)), feed_url=url,
+            )
+        except CancelledError:
+            # 解析任务经 ..workers cancel 取消: 跳过该订阅, 不提交缓存元数据, 下次重新解析
+            progress(f"《{bangumi.get('title') or url}》的解析已取消。")
+            cancelled.add(url)
+            continue
+        poll_scheduler.observe(url, published)
+        policy = ReleasePolicy.from_item(bangumi)
+        # Mikan 的 bangumiId 订阅或指定了保存目录的订阅只包含一部番剧
+        single_series = bool(savedir) or "bangumiId=" in url
+        for task in feed_tasks:
+            if task.title in queued_titles:
+                continue
+            queued_titles.add(task.title)
+            if policy.enabled:
+                task.episode_key = episode_key(analyze_title(task.title), task.save_dir, single_series)
+                task.policy = policy
+            candidates.append(task)
+        # 提交时整体替换 subs, 已删除或规则已变化的订阅的旧进度随之丢弃
+        meta = pending_meta.setdefault(url, dict(subs={}, **result.validators))
+        meta['subs'][fingerprint(bangumi, rule)] = newest_guid
+
+    # 去重阶段: 每集只下载一个版本
+    tasks, duplicates = select_releases(candidates)
+    if duplicates:
+        progress(f"跳过 {duplicates} 个重复的剧集版本。")
+
+    # 下载阶段: 并发下载, 只有成功保存的标题才会写入历史记录
+    remaining: dict[str, list] = {}
+    for task in tasks:
+        remaining.setdefault(task.feed_url, [0, 0, 0, task.save_dir])[0] += 1
+
+    def on_done(result) -> None:
+        counter = remaining[result.task.feed_url]
+        counter[0] -= 1
+        if result.ok:
+            counter[1] += 1
+        elif not result.duplicate:
+            counter[2] += 1
+        if counter[0] == 0:
+            text = f"《{counter[3]}》新增 {counter[1]} 个种子"
+            progress(text + (f", {counter[2]} 个下载失败。" if counter[2] else "。"))
+
+    downloader = TorrentDownloader(rt.session, torrent_base_dir, is_known=rt.history.has_infohash)
+    download_results = downloader.download_all(tasks, on_done=on_done)
+    saved = [r.task.title for r in download_results if r.ok]
+    # 与已有种子相同的条目也记入历史, 下次不再下载
+    recorded = [history_record(r) for r in download_results if r.ok or r.duplicate]
+    # 永久性错误 (如 404) 在 DOWNLOAD_GIVE_UP 次更新中都出现后放弃该条目, 订阅的缓存元数据得以提交
+    failures = rt.history.record_failures([r.task.title for r in download_results if r.permanent])
+    given_up = {r.task.title for r in download_results if r.permanent and failures[r.task.title] >= DOWNLOAD_GIVE_UP}
+    for r in download_results:
+        if r.task.title in given_up:
+            logger.error(f"种子 {r.task.title} 已在 {failures[r.task.title]} 次更新中下载失败 ({r.error}), 不再重试")
+            progress(f"《{r.task.save_dir}》的 {r.task.title} 多次下载失败 ({r.error}), 已放弃。")
+            recorded.append(history_record(r, failed=True))
+    failed_feeds = {
+        r.task.feed_url for r in download_results if not r.ok and not r.duplicate and r.task.title not in given_up
+    }
+
+    # 有种子下载失败或解析被取消的订阅不更新缓存元数据, 下次会重新解析并重试
+    for url, meta in pending_meta.items():
+        if url not in failed_feeds and url not in cancelled:
+            feed_cache.commit(url, **meta)
+    feed_cache.save()
+
+    # 记录本次轮询, 由调度器根据发布规律安排下一次轮询
+    for url, result in results.items():
+        if not result.skipped:
+            poll_scheduler.record_poll(url)
+    poll_scheduler.save()
+
+    if len(saved) > 0:
+        logger.info(f"本次运行共新增 {len(saved)} 个种子文件, 正在更新历史记录...")
     else:
         logger.info("本次运行没有发现新更新。")
+    rt.history.add(recorded)
+    rt.history.flush()
+    if failed_feeds:
+        logger.warning(f"有 {len(download_results) - len(recorded)} 个种子下载失败, 将在下次更新时重试。")
     logger.info("运行结束。")
-    return cache
+    return saved
 
 
 if __name__ == '__main__':
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""番剧订阅配置模块 - 带缓存与版本号的配置读写服务"""
+import copy
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from loguru import logger
+
+workspace = Path(__file__).resolve().parent.parent
+
+# 所有插件与更新器共用同一个默认路径
+CONFIG_PATH = Path(os.getenv("MTA_CONFIGPATH") or workspace / ".cache" / "bangumi_config" / "config.json")
+
+
+class ConfigError(ValueError):
+    """配置文件无法解析, 此时不允许修改配置, 以免覆盖文件中尚未修好的内容"""
+
+
+class ConfigStore:
+    """
+    番剧订阅配置服务。
+
+    内存中保存解析后的配置与版本号, 只有文件修改时间变化时才重新解析;
+    修改通过 edit() 串行进行, 并先写临时文件再重命名, 避免并发修改互相覆盖或写出半个文件。
+    文件无法解析时 get() 继续返回上一次成功加载的配置, edit() 抛出 ConfigError。
+    """
+
+    def __init__(self, path: Path = CONFIG_PATH) -> None:
+        self.path = path
+        self._lock = threading.RLock()
+        self._config: dict = {}
+        self._stamp: tuple[int, int] | None = None
+        self.error: str | None = None  # 当前文件无法解析的原因
+        self.version = 0
+
+    @property
+    def exists(self) -> bool:
+        return self.path.is_file()
+
+    def _file_stamp(self) -> tuple[int, int] | None:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _reload_if_changed(self) -> None:
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        if stamp is None:
+            self._config = {}
+        else:
+            try:
+                with self.path.open(encoding="utf8") as f:
+                    self._config = json.load(f)
+            except ValueError as e:
+                # 记录文件状态, 文件再次修改前不重复解析; 保留上一次的配置, 版本号不变
+                self._stamp = stamp
+                self.error = str(e)
+                logger.error(f"配置文件 {self.path.as_posix()} 无法解析, 继续使用上一次加载的配置: {e}")
+                return
+            logger.info(f"已加载配置文件: {self.path.as_posix()}")
+        self._stamp = stamp
+        self.error = None
+        self.version += 1
+
+    def get(self) -> dict:
+        """返回当前配置, 调用方不应修改返回的对象, 修改请使用 edit()"""
+        with self._lock:
+            self._reload_if_changed()
+            return self._config
+
+    @contextmanager
+    def edit(self) -> Iterator[dict]:
+        """
+        修改配置的上下文, 退出时如有变化则原子写回文件。
+
+        with config_store.edit() as config:
+            config["mikan"].append(item)
+        """
+        with self._lock:
+            self._reload_if_changed()
+            if self.error is not None:
+                raise ConfigError(f"配置文件格式有误, 请先修复: {self.error}")
+            config = copy.deepcopy(self._config)
+            config.setdefault("mikan", [])
+            yield config
+            if config != self._config:
+                self._write(config)
+
+    def _write(self, config: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.path.parent, prefix=".config.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf8") as f:
+                json.dump(config, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_name, self.path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        self._config = config
+        self._stamp = self._file_stamp()
+        self.version += 1
+
+
+config_store = ConfigStore()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""种子下载模块 - 并发下载、校验并原子写入 .torrent 文件"""
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import requests
+from loguru import logger
+
+from .bangumi_episode import ReleasePolicy
+from .bangumi_fetch import TIMEOUT
+from .bencode import BencodeError, torrent_infohash
+from .workers import workers
+
+# 并发下载数与单个种子的最大尝试次数
+DOWNLOAD_WORKERS = int(os.getenv("MTA_DOWNLOAD_WORKERS", "8"))
+DOWNLOAD_ATTEMPTS = int(os.getenv("MTA_DOWNLOAD_ATTEMPTS", "4"))
+# 重试间隔: RETRY_BASE * 2^(n-1) 秒
+RETRY_BASE = float(os.getenv("MTA_DOWNLOAD_RETRY_BASE", "1"))
+# 同一个种子在多少次更新中都遇到永久性错误 (如 404) 后放弃, 不再阻止订阅推进
+DOWNLOAD_GIVE_UP = int(os.getenv("MTA_DOWNLOAD_GIVE_UP", "3"))
+
+
+@dataclass
+class DownloadTask:
+    """一个待下载的种子"""
+    url: str
+    save_dir: str  # 要保存在哪个子目录 (通常是番剧名)
+    title: str  # RSS 条目的原始标题, 用于生成文件名
+    feed_url: str = ""
+    episode_key: str | None = None  # 剧集去重键, 见 bangumi_episode.episode_key
+    policy: ReleasePolicy | None = None  # 产生该任务的订阅的版本偏好, 同一集有多个版本时使用
+
+
+@dataclass
+class DownloadResult:
+    """单个种子的下载结果"""
+    task: DownloadTask
+    path: Path | None = None
+    error: str | None = None
+    attempts: int = 0
+    infohash: str | None = None
+    duplicate: bool = False  # 与已下载的种子 infohash 相同, 没有保存
+    permanent: bool = False  # 失败原因不会因重试而消失 (如 404)
+
+    @property
+    def ok(self) -> bool:
+        return self.path is not None
+
+
+class TransientError(Exception):
+    """可以重试的错误 (网络异常、超时、429 与 5xx)"""
+
+
+def safe_filename(title: str) -> str:
+    """移除在文件名中非法的字符, 使其成为一个安全的文件名"""
+    return re.sub(r'[\\/*?:"<>|]', "_", title)
+
+
+def atomic_write(path: Path, data: bytes) -> None:
+    """先写入同目录下的临时文件, 落盘后再重命名到目标路径"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+class TorrentDownloader:
+    """
+    在有界线程池中下载种子, 失败时带退避重试, 只有校验通过的文件才会落盘。
+
+    is_known 用于判断 infohash 是否已经下载过; 本次运行中 infohash 相同的种子也只保存一次。
+    """
+
+    def __init__(self, session: requests.Session, base_dir: Path,
+                 max_workers: int = DOWNLOAD_WORKERS, attempts: int = DOWNLOAD_ATTEMPTS,
+                 is_known: Callable[[str], bool] | None = None) -> None:
+        self.session = session
+        self.base_dir = base_dir
+        self.max_workers = max_workers
+        self.attempts = attempts
+        self.is_known = is_known or (lambda _: False)
+        self._seen: set[str] = set()
+        self._seen_lock = threading.Lock()
+
+    def _claim(self, torrent_hash: str) -> bool:
+        """登记 infohash, 已下载过或本次已保存过时返回 False"""
+        with self._seen_lock:
+            if torrent_hash in self._seen or self.is_known(torrent_hash):
+                return False
+            self._seen.add(torrent_hash)
+            return True
+
+    def _release(self, torrent_hash: str) -> None:
+        """保存失败时撤销登记, 同一 infohash 的其他版本或之后的重试仍可保存"""
+        with self._seen_lock:
+            self._seen.discard(torrent_hash)
+
+    def _fetch(self, url: str) -> bytes:
+        try:
+            resp = self.session.get(url, timeout=TIMEOUT)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            raise TransientError(str(e)) from e
+        if resp.status_code == 429 or resp.status_code >= 500:
+            raise TransientError(f"HTTP {resp.status_code}")
+        resp.raise_for_status()
+        return resp.content
+
+    def _download_one(self, task: DownloadTask) -> DownloadResult:
+        save_path = self.base_dir.joinpath(task.save_dir, f"{safe_filename(task.title)}.torrent")
+        logger.info(f"准备下载种子: {task.title}")
+
+        error = ""
+        permanent = False
+        for attempt in range(1, self.attempts + 1):
+            try:
+                data = self._fetch(task.url)
+                # 站点出错时可能返回 HTML 页面, 校验失败同样视为可重试
+                try:
+                    torrent_hash = workers.call("torrent", torrent_infohash, data)
+                except BencodeError as e:
+                    raise TransientError(f"种子文件校验失败: {e}") from e
+                if not self._claim(torrent_hash):
+                    logger.info(f"种子 {task.title} 与已下载的种子相同 ({torrent_hash}), 跳过保存")
+                    return DownloadResult(task, attempts=attempt, infohash=torrent_hash, duplicate=True)
+                # 先登记再写入, 并发下载的相同种子只有一个会落盘; 写入失败时撤销登记
+                try:
+                    atomic_write(save_path, data)
+                except BaseException:
+                    self._release(torrent_hash)
+                    raise
+                logger.success(f"成功保存种子文件到: {save_path.as_posix()}")
+                return DownloadResult(task, path=save_path, attempts=attempt, infohash=torrent_hash)
+            except TransientError as e:
+                error = str(e)
+                if attempt < self.attempts:
+                    delay = RETRY_BASE * 2 ** (attempt - 1)
+                    logger.warning(f"下载种子 {task.url} 失败 ({error}), {delay:.0f} 秒后第 {attempt + 1} 次尝试")
+                    time.sleep(delay)
+            except CancelledError:
+                # 校验任务经 ..workers cancel 取消, 本次不再重试
+                error = "已取消"
+                break
+            except (requests.exceptions.RequestException, OSError) as e:
+                error = str(e)
+                # 429 与 5xx 已在 _fetch 中转为 TransientError, 这里的 HTTPError 都是 4xx
+                permanent = isinstance(e, requests.exceptions.HTTPError)
+                break
+
+        logger.error(f"下载种子文件 {task.url} 失败, 错误: {error}")
+        return DownloadResult(task, error=error, attempts=attempt, permanent=permanent)
+
+    def download_all(self, tasks: list[DownloadTask],
+                     on_done: Callable[[DownloadResult], None] | None = None) -> list[DownloadResult]:
+        """并发下载所有种子, 每完成一个调用一次 on_done; 结果顺序与 tasks 一致"""
+        if not tasks:
+            return []
+        workers = max(1, min(self.max_workers, len(tasks)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rss-download") as pool:
+            futures = [pool.submit(self._download_one, task) for task in tasks]
+            if on_done is not None:
+                for future in as_completed(futures):
+                    on_done(future.result())
+            return [future.result() for future in futures]
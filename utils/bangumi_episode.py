@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""剧集识别模块 - 从标题中解析番剧、集数、分辨率、字幕语言与字幕组, 并按偏好挑选每集的最佳版本"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Iterable, TypeVar
+
+# 标题开头的字幕组标签, 如 [LoliHouse] 或 【喵萌奶茶屋】
+_GROUP_RE = re.compile(r"^\s*[\[【]([^\]】]+)[\]】]")
+_RESOLUTION_RE = re.compile(
+    r"(?<![0-9])(2160|1080|720|480)[pPiI]|(?<![0-9])(3840|1920|1280|848|720)[xX×](2160|1080|720|480)|\b4[kK]\b"
+)
+# 集数的常见写法: [01] [12v2] [12END] / - 01 / 第01话 / S01E01, 按顺序尝试
+_EPISODE_RES = [
+    re.compile(r"\[(\d{1,3}(?:\.\d)?)(?:[vV](\d))?(?:\s*END|\s*完)?\]"),
+    re.compile(r"\s[-–]\s(\d{1,3}(?:\.\d)?)(?:[vV](\d))?(?=\s|\[|\(|【|$|END)"),
+    re.compile(r"第(\d{1,3}(?:\.\d)?)[话話集](?:[vV](\d))?"),
+    re.compile(r"[Ss]\d{1,2}[Ee][Pp]?(\d{1,3})(?:[vV](\d))?"),
+]
+# 合集: [01-12] / 01~24 / 全集 / Fin
+_BATCH_RE = re.compile(r"[\[\s]\d{1,3}\s*[-~]\s*\d{1,3}(?:\s*[^\d\s\]])*[\]\s]|全集|合集|\bFin\b|BDBOX", re.IGNORECASE)
+_SEASON_RE = re.compile(r"\b[Ss](\d{1,2})(?:[Ee]|\b)|Season\s*(\d{1,2})|第([一二三四五六七八九十\d]{1,3})季")
+_CN_NUMBERS = {c: i for i, c in enumerate("零一二三四五六七八九十")}
+_LANG_TOKENS = [
+    ("CHS", re.compile(r"简|CHS|GB|(?<![a-z])SC(?![a-z])", re.IGNORECASE)),
+    ("CHT", re.compile(r"繁|CHT|BIG5|(?<![a-z])TC(?![a-z])", re.IGNORECASE)),
+    ("JP", re.compile(r"日|JP(?:N|SC|TC)?\b", re.IGNORECASE)),
+]
+_TAG_RE = re.compile(r"[\[【(（★][^\]】)）★]*[\]】)）★]")
+
+T = TypeVar("T")
+
+
+def _season(text: str) -> int | None:
+    if not (m := _SEASON_RE.search(text)):
+        return None
+    value = next(g for g in m.groups() if g)
+    if value.isdigit():
+        return int(value)
+    if value.startswith("十"):
+        return 10 + _CN_NUMBERS.get(value[1:], 0)
+    if len(value) == 2 and value.endswith("十"):
+        return _CN_NUMBERS.get(value[0], 0) * 10
+    return _CN_NUMBERS.get(value)
+
+
+def normalize_series(text: str) -> str:
+    """番剧名的比较用形式: 取 "中文名 / 外文名" 的第一部分, 去掉标点与空白并转为小写"""
+    text = text.split(" / ")[0].split("/")[0]
+    return re.sub(r"[\W_]+", "", text).lower()
+
+
+@dataclass(frozen=True)
+class TitleInfo:
+    """从标题中解析出的信息, 无法识别的字段为空"""
+    group: str = ""
+    series: str = ""  # 规范化后的番剧名
+    season: int | None = None
+    episode: float | None = None  # 合集或无法识别时为 None
+    version: int = 1  # v2 等重新发布的版本号
+    resolution: str = ""  # 2160p / 1080p / 720p / 480p
+    lang: str = ""  # 字幕语言, 如 CHS、CHT、CHS+JP
+
+    @property
+    def langs(self) -> set[str]:
+        return set(self.lang.split("+")) if self.lang else set()
+
+
+@lru_cache(maxsize=8192)
+def analyze_title(title: str) -> TitleInfo:
+    """解析 RSS 条目标题"""
+    group = m.group(1).strip() if (m := _GROUP_RE.search(title)) else ""
+    rest = title[m.end():] if m else title
+
+    resolution = ""
+    if r := _RESOLUTION_RE.search(title):
+        resolution = (r.group(1) or r.group(3) or "2160") + "p"
+
+    # 集数之后一般只剩下分辨率、字幕语言等标签
+    episode, version, series_text, tags = None, 1, rest, rest
+    if not _BATCH_RE.search(rest):
+        for pattern in _EPISODE_RES:
+            if e := pattern.search(rest):
+                episode = float(e.group(1))
+                version = int(e.group(2)) if e.group(2) else 1
+                series_text, tags = rest[:e.start()], rest[e.end():]
+                break
+
+    # 番剧名: 优先取集数前面第一个不像标签的方括号内容, 否则取去掉标签后的文本
+    series = ""
+    for part in re.findall(r"[\[【]([^\]】]+)[\]】]", series_text):
+        if not re.search(r"新番|月番|^\d+$|字幕|招募", part):
+            series = normalize_series(part)
+            break
+    if not series:
+        series = normalize_series(_TAG_RE.sub(" ", series_text))
+
+    langs = [name for name, pattern in _LANG_TOKENS if pattern.search(tags)]
+    return TitleInfo(
+        group=group, series=series, season=_season(rest), episode=episode,
+        version=version, resolution=resolution, lang="+".join(langs),
+    )
+
+
+def episode_key(info: TitleInfo, save_dir: str, single_series: bool) -> str | None:
+    """
+    剧集的去重键, 合集或无法识别集数时为 None (不参与去重)。
+
+    单番剧订阅 (Mikan 的 bangumiId 订阅或配置了保存目录) 以保存目录区分番剧,
+    不受各字幕组译名不同的影响; 聚合订阅则加上从标题解析的番剧名与季数。
+    """
+    if info.episode is None:
+        return None
+    episode = f"{info.episode:g}"
+    if single_series:
+        return f"{save_dir}\n{episode}"
+    if not info.series:
+        return None
+    return f"{save_dir}\n{info.series}\n{info.season or 1}\n{episode}"
+
+
+_HASH_IN_URL_RE = re.compile(r"/([0-9a-fA-F]{40})\.torrent(?:$|\?)")
+
+
+def url_infohash(url: str) -> str | None:
+    """Mikan 的种子下载地址以 infohash 命名, 可以在下载前判断是否重复"""
+    return m.group(1).lower() if (m := _HASH_IN_URL_RE.search(url)) else None
+
+
+def _rank(value: str | set[str], preference: list[str]) -> int:
+    """值在偏好列表中的位置, 越小越好; 不在列表中时排在最后"""
+    values = value if isinstance(value, set) else {value.lower()}
+    ranks = [i for i, p in enumerate(preference) if p in values]
+    return min(ranks) if ranks else len(preference)
+
+
+@dataclass
+class ReleasePolicy:
+    """
+    同一集有多个版本时的挑选规则, 来自订阅配置中的 prefer 字段:
+
+        "prefer": {"group": ["LoliHouse"], "resolution": ["1080p", "720p"], "lang": ["CHS", "CHT"]}
+
+    依次比较字幕组、字幕语言、分辨率的偏好顺序, 然后选版本号更高的, 最后选订阅中更靠前 (更新) 的。
+    """
+    groups: tuple[str, ...] = ()
+    resolutions: tuple[str, ...] = ("1080p", "2160p", "720p")
+    langs: tuple[str, ...] = ("chs", "cht")
+    enabled: bool = True
+
+    @classmethod
+    def from_item(cls, item: dict) -> "ReleasePolicy":
+        prefer = item.get("prefer") or {}
+        defaults = cls()
+        return cls(
+            groups=tuple(g.lower() for g in prefer.get("group", defaults.groups)),
+            resolutions=tuple(r.lower() for r in prefer.get("resolution", defaults.resolutions)),
+            langs=tuple(lang.lower() for lang in prefer.get("lang", defaults.langs)),
+            enabled=item.get("dedupe", True) is not False,
+        )
+
+    def score(self, info: TitleInfo) -> tuple:
+        group_rank = len(self.groups)
+        group = info.group.lower()
+        for i, name in enumerate(self.groups):
+            if name in group:
+                group_rank = i
+                break
+        return (
+            group_rank,
+            _rank({lang.lower() for lang in info.langs}, list(self.langs)),
+            _rank(info.resolution, list(self.resolutions)),
+            -info.version,
+        )
+
+
+def pick_best(candidates: Iterable[T], info: Callable[[T], TitleInfo], policy: ReleasePolicy) -> T:
+    """按偏好选出最佳版本, 分数相同时保留先出现的"""
+    return min(candidates, key=lambda c: policy.score(info(c)))
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Mikan RSS 解析模块 - 针对 Mikan 固定格式的流式解析, 格式不符时退回 feedparser"""
+import calendar
+from dataclasses import dataclass
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Iterator
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+import feedparser
+
+TORRENT_TYPE = "application/x-bittorrent"
+# 每次喂给解析器的字节数, 提前停止时剩余内容不会被解析
+CHUNK_SIZE = 16 * 1024
+
+
+class FeedFormatError(ValueError):
+    """内容不是预期的 Mikan RSS 格式"""
+
+
+@dataclass
+class FeedEntry:
+    """RSS 条目中用到的字段"""
+    title: str
+    torrent_url: str | None
+    published: float | None  # 发布时间戳
+    guid: str | None
+
+
+def parse_pubdate(text: str | None) -> float | None:
+    """Mikan 的 pubDate 是不带时区的 ISO 格式, 按本地时间处理; 也兼容标准 RSS 的 RFC 822 格式"""
+    if not text:
+        return None
+    text = text.strip()
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(text).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+class StreamingFeed:
+    """
+    Mikan RSS 的流式解析器。
+
+    基于 XMLPullParser 分块解析, 每解析完一个 <item> 就产出一个 FeedEntry 并释放该节点,
+    调用方停止迭代后剩余内容不再解析。频道标题出现在所有条目之前, 迭代开始后即可读取 title。
+    遇到不符合预期的结构时抛出 FeedFormatError, 由调用方退回 feedparser。
+    """
+
+    def __init__(self, content: bytes) -> None:
+        self.content = content
+        self.title = ""
+
+    def __iter__(self) -> Iterator[FeedEntry]:
+        parser = XMLPullParser(events=("start", "end"))
+        channel = None
+        depth = 0
+        try:
+            for offset in range(0, len(self.content), CHUNK_SIZE):
+                parser.feed(self.content[offset:offset + CHUNK_SIZE])
+                for event, elem in parser.read_events():
+                    tag = _local(elem.tag)
+                    if event == "start":
+                        depth += 1
+                        if depth == 1 and tag != "rss":
+                            raise FeedFormatError(f"根节点是 <{tag}> 而不是 <rss>")
+                        if depth == 2 and tag == "channel":
+                            channel = elem
+                        continue
+                    depth -= 1
+                    if depth == 2 and tag == "title" and channel is not None:
+                        self.title = (elem.text or "").strip()
+                    elif depth == 2 and tag == "item" and channel is not None:
+                        entry = self._entry(elem)
+                        channel.remove(elem)
+                        yield entry
+            parser.close()
+        except ParseError as e:
+            raise FeedFormatError(f"XML 解析失败: {e}") from None
+        if channel is None:
+            raise FeedFormatError("没有找到 <channel> 节点")
+
+    @staticmethod
+    def _entry(item) -> FeedEntry:
+        title = guid = torrent_url = pub_date = None
+        for child in item:
+            tag = _local(child.tag)
+            if tag == "title":
+                title = child.text
+            elif tag == "guid":
+                guid = (child.text or "").strip() or None
+            elif tag == "enclosure" and child.get("type") == TORRENT_TYPE:
+                torrent_url = child.get("url")
+            elif tag in ("torrent", "pubDate"):
+                # Mikan 的发布时间在 <torrent xmlns="https://mikanani.me/0.1/"> 下
+                node = child if tag == "pubDate" else next((c for c in child if _local(c.tag) == "pubDate"), None)
+                if node is not None and pub_date is None:
+                    pub_date = node.text
+        if not title or not title.strip():
+            raise FeedFormatError("条目缺少标题")
+        return FeedEntry(title.strip(), torrent_url, parse_pubdate(pub_date), guid)
+
+
+class FeedparserFeed:
+    """基于 feedparser 的通用解析, 接口与 StreamingFeed 相同"""
+
+    def __init__(self, content: bytes) -> None:
+        parsed = feedparser.parse(content)
+        self.title = parsed["feed"].get("title", "")
+        self.entries = parsed["entries"]
+
+    def __iter__(self) -> Iterator[FeedEntry]:
+        for entry in self.entries:
+            published = parse_pubdate(entry.get("published"))
+            if published is None and (parsed := entry.get("published_parsed")):
+                published = calendar.timegm(parsed)
+            torrent_url = next(
+                (link["href"] for link in entry.get("links", []) if link.get("type") == TORRENT_TYPE), None
+            )
+            yield FeedEntry(entry["title"].strip(), torrent_url, published, entry.get("id"))
+
+
+@dataclass
+class ParsedFeed:
+    """已解析完成的订阅, 接口与 StreamingFeed 相同, 可以在进程间传递"""
+    title: str
+    entries: list[FeedEntry]
+    fallback: str = ""  # 退回 feedparser 的原因, 为空表示使用了流式解析
+
+    def __iter__(self) -> Iterator[FeedEntry]:
+        return iter(self.entries)
+
+
+def parse_feed(content: bytes, stop_guid: str | None = None) -> ParsedFeed:
+    """
+    解析订阅内容, 解析到 guid 为 stop_guid 的条目 (包含该条目) 为止, 可以交给工作进程执行。
+
+    内容不是预期的 Mikan RSS 格式时退回 feedparser 解析全部条目。
+    """
+    feed = StreamingFeed(content)
+    entries = []
+    try:
+        for entry in feed:
+            entries.append(entry)
+            if stop_guid and entry.guid == stop_guid:
+                break
+        return ParsedFeed(feed.title, entries)
+    except FeedFormatError as e:
+        fallback = FeedparserFeed(content)
+        return ParsedFeed(fallback.title, list(fallback), fallback=str(e))
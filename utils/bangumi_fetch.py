@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""RSS 抓取模块 - 并发抓取订阅、超时控制、失败退避与条件请求"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from loguru import logger
+
+# 全局并发数与单个站点的并发数
+FETCH_WORKERS = int(os.getenv("MTA_FETCH_WORKERS", "32"))
+PER_HOST_LIMIT = int(os.getenv("MTA_PER_HOST_LIMIT", "16"))
+# 连接超时与读取超时 (秒)
+CONNECT_TIMEOUT = float(os.getenv("MTA_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("MTA_READ_TIMEOUT", "20"))
+TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+# 失败退避: 第 n 次连续失败后等待 BACKOFF_BASE * 2^(n-1) 秒, 最长 BACKOFF_MAX 秒
+BACKOFF_BASE = float(os.getenv("MTA_BACKOFF_BASE", "300"))
+BACKOFF_MAX = float(os.getenv("MTA_BACKOFF_MAX", str(6 * 3600)))
+
+
+@dataclass
+class FetchResult:
+    """单个订阅的抓取结果"""
+    url: str
+    content: bytes | None = None
+    error: str | None = None
+    skipped: bool = False  # 处于退避期, 本次未请求
+    not_modified: bool = False  # 服务器返回 304 或内容指纹未变化
+    validators: dict = field(default_factory=dict)  # 待提交的 etag / last_modified / content_hash
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        """请求是否成功完成 (包括内容未变化的情况)"""
+        return self.error is None and not self.skipped
+
+    @property
+    def changed(self) -> bool:
+        """是否拿到了需要解析的新内容"""
+        return self.content is not None
+
+
+class JsonState:
+    """以 url 为键、持久化到 json 文件的订阅状态"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self.data: dict[str, dict] = {}
+        if path.exists():
+            try:
+                self.data = json.loads(path.read_text(encoding="utf8"))
+            except (OSError, ValueError) as e:
+                logger.warning(f"状态文件 {path.name} 损坏, 已忽略: {e}")
+
+    def get(self, url: str) -> dict:
+        return self.data.get(url, {})
+
+    def save(self) -> None:
+        """写入磁盘 (先写临时文件再替换)"""
+        with self._lock:
+            text = json.dumps(self.data, ensure_ascii=False, indent=2)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(text, encoding="utf8")
+        os.replace(tmp_path, self.path)
+
+
+class FeedHealth(JsonState):
+    """订阅健康状态, 记录连续失败次数与下次重试时间"""
+
+    def should_skip(self, url: str, now: float | None = None) -> bool:
+        """订阅是否仍处于退避期"""
+        state = self.data.get(url)
+        return bool(state) and state.get("next_retry", 0) > (now or time.time())
+
+    def record_success(self, url: str) -> None:
+        with self._lock:
+            state = self.data.setdefault(url, {})
+            state.update(failures=0, next_retry=0, last_error="", last_ok=time.time())
+
+    def record_failure(self, url: str, error: str) -> float:
+        """记录一次失败并返回退避秒数"""
+        with self._lock:
+            state = self.data.setdefault(url, {})
+            failures = state.get("failures", 0) + 1
+            delay = min(BACKOFF_BASE * 2 ** (failures - 1), BACKOFF_MAX)
+            state.update(failures=failures, next_retry=time.time() + delay, last_error=error)
+        return delay
+
+
+class FeedCache(JsonState):
+    """
+    订阅缓存元数据: etag、last_modified、内容指纹, 以及各订阅上次处理到的最新条目 guid。
+
+    同一 url 可以对应多个订阅 (规则或保存目录不同), 条件请求的元数据按 url 共享,
+    最新条目 guid 按订阅的规则指纹分别记录在 subs 中。
+    抓取时只读取, 订阅被完整处理后才调用 commit 更新, 处理失败的订阅下次会重新解析。
+    """
+
+    def conditional_headers(self, url: str) -> dict[str, str]:
+        """构造条件请求头"""
+        state = self.get(url)
+        headers = {}
+        if etag := state.get("etag"):
+            headers["If-None-Match"] = etag
+        if last_modified := state.get("last_modified"):
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def is_unchanged(self, url: str, content_hash: str) -> bool:
+        return self.get(url).get("content_hash") == content_hash
+
+    def subscriptions(self, url: str) -> dict[str, str | None]:
+        """规则指纹 -> 该订阅上次处理到的最新条目 guid"""
+        state = self.get(url)
+        if "subs" in state:
+            return state["subs"]
+        # 旧格式: 每个 url 只记录一个规则指纹
+        if "rule" in state:
+            return {state["rule"]: state.get("newest_guid")}
+        return {}
+
+    def commit(self, url: str, **meta) -> None:
+        with self._lock:
+            state = self.data.setdefault(url, {})
+            if "subs" in meta:
+                state.pop("rule", None)
+                state.pop("newest_guid", None)
+            state.update(meta)
+
+    def forget_validators(self, url: str) -> None:
+        """丢弃条件请求的元数据, 下次抓取会完整下载, 各订阅已记录的进度保留"""
+        with self._lock:
+            for key in ("etag", "last_modified", "content_hash"):
+                self.data.get(url, {}).pop(key, None)
+
+
+class FeedFetcher:
+    """在线程池中并发抓取订阅, 同时限制全局与单站点的并发数"""
+
+    def __init__(self, session: requests.Session, health: FeedHealth, cache: FeedCache,
+                 max_workers: int = FETCH_WORKERS, per_host: int = PER_HOST_LIMIT) -> None:
+        self.session = session
+        self.health = health
+        self.cache = cache
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self._host_limits: dict[str, threading.BoundedSemaphore] = {}
+        self._host_lock = threading.Lock()
+
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[host]
+
+    def _fetch_one(self, url: str) -> FetchResult:
+        start = time.monotonic()
+        with self._host_limit(url):
+            try:
+                resp = self.session.get(url, headers=self.cache.conditional_headers(url), timeout=TIMEOUT)
+                resp.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                delay = self.health.record_failure(url, str(e))
+                logger.error(f"无法获取 RSS Feed: {url}, 错误: {e}, {delay:.0f} 秒后重试")
+                return FetchResult(url, error=str(e), elapsed=time.monotonic() - start)
+        self.health.record_success(url)
+        elapsed = time.monotonic() - start
+
+        if resp.status_code == 304:
+            return FetchResult(url, not_modified=True, elapsed=elapsed)
+
+        content_hash = hashlib.sha1(resp.content).hexdigest()
+        validators = {
+            "etag": resp.headers.get("ETag", ""),
+            "last_modified": resp.headers.get("Last-Modified", ""),
+            "content_hash": content_hash,
+        }
+        if self.cache.is_unchanged(url, content_hash):
+            # 服务器不支持条件请求时, 用内容指纹判断是否变化
+            self.cache.commit(url, etag=validators["etag"], last_modified=validators["last_modified"])
+            return FetchResult(url, not_modified=True, elapsed=elapsed)
+        return FetchResult(url, content=resp.content, validators=validators, elapsed=elapsed)
+
+    def fetch_all(self, urls: list[str]) -> dict[str, FetchResult]:
+        """并发抓取所有订阅, 处于退避期的订阅直接跳过; 返回 url -> 抓取结果"""
+        results: dict[str, FetchResult] = {}
+        pending: list[str] = []
+        for url in dict.fromkeys(urls):
+            if self.health.should_skip(url):
+                logger.info(f"订阅处于退避期, 本次跳过: {url}")
+                results[url] = FetchResult(url, skipped=True)
+            else:
+                pending.append(url)
+
+        if pending:
+            workers = max(1, min(self.max_workers, len(pending)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rss-fetch") as pool:
+                for result in pool.map(self._fetch_one, pending):
+                    results[result.url] = result
+
+        self.health.save()
+        self.cache.save()
+        return results
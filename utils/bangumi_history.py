@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""下载历史模块 - 基于 SQLite 的历史记录与内存布隆过滤器"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import astuple, dataclass
+from pathlib import Path
+from typing import Iterable
+
+from loguru import logger
+
+# 历史记录保留天数
+HISTORY_DAYS = float(os.getenv("MTA_HISTORY_DAYS", "365"))
+# 布隆过滤器的位数 (固定大小, 默认 2^20 位即 128KB) 与哈希函数个数
+BLOOM_BITS = int(os.getenv("MTA_HISTORY_BLOOM_BITS", str(1 << 20)))
+BLOOM_HASHES = 7
+
+
+def title_key(title: str) -> int:
+    """标题的 64 位哈希 (有符号, 可直接作为 SQLite 的整数主键)"""
+    digest = hashlib.blake2b(title.encode("utf8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+@dataclass
+class HistoryRecord:
+    """一条下载记录, 除标题外的字段由标题解析而来, 旧记录中为空"""
+    title: str
+    save_dir: str = ""
+    feed_url: str = ""
+    group: str = ""
+    series: str = ""
+    episode: float | None = None
+    resolution: str = ""
+    lang: str = ""
+    episode_key: str | None = None
+    infohash: str | None = None
+    failed: bool = False  # 多次下载失败后放弃的条目, 只用于跳过该标题
+
+
+# 在最初的 history 表上追加的结构化字段
+_RECORD_COLUMNS = {
+    "save_dir": "TEXT NOT NULL DEFAULT ''",
+    "feed_url": "TEXT NOT NULL DEFAULT ''",
+    "grp": "TEXT NOT NULL DEFAULT ''",
+    "series": "TEXT NOT NULL DEFAULT ''",
+    "episode": "REAL",
+    "resolution": "TEXT NOT NULL DEFAULT ''",
+    "lang": "TEXT NOT NULL DEFAULT ''",
+    "episode_key": "TEXT",
+    "infohash": "TEXT",
+    "failed": "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+class BloomFilter:
+    """固定大小的布隆过滤器, 基于标题的 64 位哈希做双重哈希"""
+
+    def __init__(self, bits: int = BLOOM_BITS, hashes: int = BLOOM_HASHES, data: bytes | None = None) -> None:
+        self.bits = bits
+        self.hashes = hashes
+        self.array = bytearray(data) if data is not None else bytearray((bits + 7) // 8)
+
+    def _positions(self, key: int) -> Iterable[int]:
+        key &= (1 << 64) - 1
+        h1, h2 = key >> 32, (key & 0xFFFFFFFF) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def add(self, key: int) -> None:
+        for pos in self._positions(key):
+            self.array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: int) -> bool:
+        return all(self.array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class HistoryStore:
+    """
+    下载历史。
+
+    记录保存在 SQLite 中并以标题哈希为主键, 追加与查询都是 O(1) 的索引操作;
+    内存中只保留固定大小的布隆过滤器用于快速判断"肯定没下载过"。
+    过滤器由 flush 持久化 (每次更新结束时调用一次), 启动时无需扫描全部历史;
+    追加记录后还没 flush 就退出时, 下次启动会从记录重建过滤器。
+    每条记录还保存了解析出的剧集信息与 infohash, 并建有索引, 用于跨字幕组与跨订阅去重。
+    """
+
+    def __init__(self, path: Path, retention_days: float = HISTORY_DAYS, legacy_path: Path | None = None) -> None:
+        self.path = path
+        self.retention = retention_days * 86400
+        self._lock = threading.Lock()
+        self._bloom_dirty = False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS history (
+                key INTEGER PRIMARY KEY,
+                title TEXT NOT NULL,
+                added_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS history_added_at ON history (added_at);
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value BLOB
+            );
+            CREATE TABLE IF NOT EXISTS failures (
+                key INTEGER PRIMARY KEY,
+                title TEXT NOT NULL,
+                runs INTEGER NOT NULL
+            );
+            """
+        )
+        self._add_record_columns()
+        if legacy_path is not None:
+            self._migrate(legacy_path)
+        self.bloom = self._load_bloom()
+        self.prune()
+
+    def _add_record_columns(self) -> None:
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(history)")}
+        with self._conn:
+            for column, decl in _RECORD_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE history ADD COLUMN {column} {decl}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS history_episode_key ON history (episode_key)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS history_infohash ON history (infohash)")
+
+    def _meta(self, name: str):
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name: str, value) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def _load_bloom(self) -> BloomFilter:
+        data = self._meta("bloom")
+        # bloom_dirty 表示有记录还没写入持久化的过滤器
+        if data is not None and len(data) == (BLOOM_BITS + 7) // 8 and not self._meta("bloom_dirty"):
+            return BloomFilter(data=data)
+        return self._rebuild_bloom()
+
+    def _rebuild_bloom(self) -> BloomFilter:
+        bloom = BloomFilter()
+        for (key,) in self._conn.execute("SELECT key FROM history"):
+            bloom.add(key)
+        with self._conn:
+            self._set_meta("bloom", bytes(bloom.array))
+            self._set_meta("bloom_dirty", 0)
+        self._bloom_dirty = False
+        return bloom
+
+    def _migrate(self, legacy_path: Path) -> None:
+        """从旧的 history.txt 导入记录 (文件顶部为最新), 导入后重命名旧文件"""
+        if not legacy_path.is_file():
+            return
+        with legacy_path.open(encoding="utf8") as f:
+            titles = [line.strip() for line in f if line.strip()]
+        now = time.time()
+        # 保留原有顺序: 越靠前的记录时间越新
+        rows = [(title_key(t), t, now - i) for i, t in enumerate(titles)]
+        with self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO history (key, title, added_at) VALUES (?, ?, ?)", rows)
+            self._conn.execute("DELETE FROM meta WHERE name = 'bloom'")
+        legacy_path.rename(legacy_path.with_name(legacy_path.name + ".migrated"))
+        logger.info(f"已从 {legacy_path.name} 导入 {len(rows)} 条历史记录")
+
+    def __contains__(self, title: str) -> bool:
+        key = title_key(title)
+        if key not in self.bloom:
+            return False
+        with self._lock:
+            row = self._conn.execute("SELECT title FROM history WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] == title
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def has_episode(self, episode_key: str) -> bool:
+        """是否已经下载过这一集 (任意字幕组或订阅的版本)"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM history WHERE episode_key = ? LIMIT 1", (episode_key,)).fetchone()
+        return row is not None
+
+    def has_infohash(self, infohash: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM history WHERE infohash = ? LIMIT 1", (infohash,)).fetchone()
+        return row is not None
+
+    def add(self, records: Iterable[HistoryRecord]) -> None:
+        """追加一批下载记录"""
+        now = time.time()
+        rows = [(title_key(r.title), now, *astuple(r)) for r in records]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO history (key, added_at, title, " + ", ".join(_RECORD_COLUMNS)
+                + ") VALUES (?, ?, ?, " + ", ".join("?" * len(_RECORD_COLUMNS)) + ")",
+                rows,
+            )
+            self._conn.executemany("DELETE FROM failures WHERE key = ?", ((row[0],) for row in rows))
+            for row in rows:
+                self.bloom.add(row[0])
+            if not self._bloom_dirty:
+                self._set_meta("bloom_dirty", 1)
+                self._bloom_dirty = True
+
+    def record_failures(self, titles: list[str]) -> dict[str, int]:
+        """记录一次更新中下载失败的标题, 返回各标题累计失败的更新次数; 标题写入历史时清除"""
+        counts = {}
+        with self._lock, self._conn:
+            for title in titles:
+                key = title_key(title)
+                self._conn.execute(
+                    "INSERT INTO failures (key, title, runs) VALUES (?, ?, 1) "
+                    "ON CONFLICT(key) DO UPDATE SET runs = runs + 1",
+                    (key, title),
+                )
+                counts[title] = self._conn.execute("SELECT runs FROM failures WHERE key = ?", (key,)).fetchone()[0]
+        return counts
+
+    def flush(self) -> None:
+        """把内存中的布隆过滤器写入数据库"""
+        with self._lock:
+            if not self._bloom_dirty:
+                return
+            with self._conn:
+                self._set_meta("bloom", bytes(self.bloom.array))
+                self._set_meta("bloom_dirty", 0)
+            self._bloom_dirty = False
+
+    def prune(self) -> int:
+        """删除超过保留期的记录, 每天最多执行一次; 返回删除条数"""
+        now = time.time()
+        with self._lock:
+            if now - (self._meta("last_prune") or 0) < 86400:
+                return 0
+            with self._conn:
+                removed = self._conn.execute(
+                    "DELETE FROM history WHERE added_at < ?", (now - self.retention,)
+                ).rowcount
+                self._set_meta("last_prune", now)
+            if removed:
+                self.bloom = self._rebuild_bloom()
+                logger.info(f"已清理 {removed} 条超过保留期的历史记录")
+        return removed
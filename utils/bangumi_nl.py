@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""番剧订阅的自然语言管理 - 常用指令的本地语法与番剧名模糊索引"""
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+# 匹配结果的最低分数, 以及最佳结果需要领先第二名多少才会被直接采用
+MIN_SCORE = 0.45
+CLEAR_MARGIN = 0.15
+# 删除、禁用等操作要求的最低分数: 查询需完整包含在番剧名中 (或拼音一致), 否则让用户用编号确认
+DESTRUCTIVE_SCORE = 1.0
+
+_CJK_RE = re.compile(r"[぀-ヿ㐀-鿿]")
+_STRIP_RE = re.compile(r"[\W_]+")
+
+# 常见说法: (动作, 正则), 正则中的 target 分组为番剧名或列表编号
+_LIST_RE = re.compile(r"^(?:列表|列出|订阅列表|全部订阅|所有订阅|list|ls|(?:查看|看看|显示)?(?:一下)?(?:全部|所有|当前)?的?(?:订阅|番剧)(?:列表)?|有哪些(?:订阅|番剧)?)[吧呢吗啊~～!！?？。.]*$", re.IGNORECASE)
+_COMMANDS = [
+    ("query", re.compile(r"^(?:查询|查看|查一下|看看|详情|信息|query|info)\s*(?P<target>.+?)(?:的)?(?:详情|信息|配置)?$", re.IGNORECASE)),
+    ("query", re.compile(r"^(?P<target>.+?)\s*的(?:详情|信息|配置)$")),
+    ("enable", re.compile(r"^(?:启用|开启|打开|恢复|重新订阅|enable)\s*(?P<target>.+)$", re.IGNORECASE)),
+    ("enable", re.compile(r"^(?:把|将)?\s*(?P<target>.+?)\s*(?:启用|开启|打开|恢复)$")),
+    ("disable", re.compile(r"^(?:禁用|关闭|暂停|停用|停止|disable)\s*(?P<target>.+)$", re.IGNORECASE)),
+    ("disable", re.compile(r"^(?:把|将)?\s*(?P<target>.+?)\s*(?:禁用|关闭|暂停|停用)(?:掉)?$")),
+    ("remove", re.compile(r"^(?:删除|删掉|移除|去掉|取消订阅|退订|remove|rm|del)\s*(?P<target>.+)$", re.IGNORECASE)),
+    ("remove", re.compile(r"^(?:把|将)?\s*(?P<target>.+?)\s*(?:删除|删掉|移除|去掉|退订)(?:掉)?$")),
+]
+# "所有"、"全部" 之类的批量操作不在本地语法的范围内
+_BULK_RE = re.compile(r"^(?:所有|全部|一切|每个|这些|那些)")
+_INDEX_RE = re.compile(r"^(?:第|#|No\.?)?\s*(\d{1,4})\s*(?:个|号)?$", re.IGNORECASE)
+_POLITE_RE = re.compile(r"^(?:请|帮我|麻烦|给我)+|[吧呢吗啊~～!！?？。.]+$")
+
+
+def parse_command(text: str, titles: list[str] | None = None) -> dict | None:
+    """
+    用本地语法解析常见的管理指令, 返回与 LLM 解析结果相同结构的 {"action", "details"}。
+
+    支持列表、查询、启用、禁用与删除; 番剧可以用名称或列表中的编号指定。
+    无法识别时返回 None, 由调用方交给 LLM 处理。给出 titles 时, 名称与任何番剧都不相近的
+    (如 "停止更新"、"看看今天有什么新番") 不视为本地指令, 同样交给 LLM。
+    """
+    text = _POLITE_RE.sub("", text.strip()).strip()
+    if not text:
+        return None
+    if _LIST_RE.match(text):
+        return {"action": "list", "details": {}}
+    for action, pattern in _COMMANDS:
+        if not (m := pattern.match(text)):
+            continue
+        target = m.group("target").strip().strip("《》「」\"'“”")
+        if not target:
+            return None
+        if index := _INDEX_RE.match(target):
+            details = {"index": int(index.group(1))}
+        elif _BULK_RE.match(target) or (titles is not None and not resolve_title(target, titles)[1]):
+            return None
+        else:
+            details = {"title": target}
+        if action in ("enable", "disable"):
+            details.update(field="enable", value=action == "enable")
+            action = "update"
+        return {"action": action, "details": details}
+    return None
+
+
+def normalize(text: str) -> str:
+    return _STRIP_RE.sub("", text).lower()
+
+
+def ngrams(text: str) -> set[str]:
+    """中日文字符取单字与双字, 其余取双字与三字"""
+    grams = set()
+    for i, ch in enumerate(text):
+        if _CJK_RE.match(ch):
+            grams.add(ch)
+        grams.add(text[i:i + 2])
+        if not _CJK_RE.match(ch):
+            grams.add(text[i:i + 3])
+    return grams
+
+
+def _pinyin_keys(title: str) -> list[str]:
+    """番剧名的全拼与首字母, 未安装 pypinyin 时返回空列表"""
+    if not _CJK_RE.search(title):
+        return []
+    try:
+        from pypinyin import Style, lazy_pinyin
+    except ImportError:
+        return []
+    return [
+        normalize("".join(lazy_pinyin(title))),
+        normalize("".join(lazy_pinyin(title, style=Style.FIRST_LETTER))),
+    ]
+
+
+class TitleIndex:
+    """
+    番剧名的 n-gram 倒排索引。
+
+    每个番剧名连同其拼音 (可选) 建立索引, 查询时只对共享 n-gram 的候选打分:
+    分数综合查询被覆盖的比例与 Dice 系数, 完整包含查询时额外加分。
+    """
+
+    def __init__(self, titles: list[str]) -> None:
+        self.titles = titles
+        self._keys: list[list[tuple[str, set[str]]]] = []
+        self._postings: dict[str, set[int]] = defaultdict(set)
+        for i, title in enumerate(titles):
+            keys = []
+            for key in [normalize(title), *_pinyin_keys(title)]:
+                if key:
+                    grams = ngrams(key)
+                    keys.append((key, grams))
+                    for gram in grams:
+                        self._postings[gram].add(i)
+            self._keys.append(keys)
+
+    def search(self, query: str, limit: int = 5) -> list[tuple[int, float]]:
+        """返回按分数从高到低排列的 (番剧在列表中的下标, 分数)"""
+        query = normalize(query)
+        if not query:
+            return []
+        query_grams = ngrams(query)
+        candidates = set()
+        for gram in query_grams:
+            candidates |= self._postings.get(gram, set())
+
+        scored = []
+        for i in candidates:
+            best = 0.0
+            for key, grams in self._keys[i]:
+                if key == query:
+                    score = 2.0
+                else:
+                    common = len(query_grams & grams)
+                    coverage = common / len(query_grams)
+                    dice = 2 * common / (len(query_grams) + len(grams))
+                    score = 0.7 * coverage + 0.3 * dice + (0.5 if query in key else 0.0)
+                best = max(best, score)
+            scored.append((i, best))
+        scored.sort(key=lambda x: (-x[1], len(self.titles[x[0]])))
+        return scored[:limit]
+
+
+@lru_cache(maxsize=4)
+def build_index(titles: tuple[str, ...]) -> TitleIndex:
+    """按番剧名列表缓存索引, 配置不变时不会重建"""
+    return TitleIndex(list(titles))
+
+
+def resolve_title(query: str, titles: list[str], definite: float = MIN_SCORE) -> tuple[int | None, list[int]]:
+    """
+    查找名称对应的番剧, 返回 (确定的下标, 候选下标列表)。
+
+    只有最佳结果不低于 definite 且明显领先时才确定, 否则下标为 None, 由调用方让用户从候选中选择。
+    删除、禁用等操作应传入 DESTRUCTIVE_SCORE。
+    """
+    ranked = [(i, s) for i, s in build_index(tuple(titles)).search(query) if s >= MIN_SCORE]
+    if not ranked:
+        return None, []
+    if ranked[0][1] < definite:
+        return None, [i for i, _ in ranked]
+    if len(ranked) == 1 or ranked[0][1] >= 2.0 or ranked[0][1] - ranked[1][1] >= CLEAR_MARGIN:
+        return ranked[0][0], [i for i, _ in ranked]
+    return None, [i for i, _ in ranked]
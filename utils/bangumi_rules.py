@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""RSS 过滤规则模块 - 在加载配置时预编译并校验每个订阅的过滤规则"""
+import re
+from dataclasses import dataclass, field
+
+from loguru import logger
+
+from .bangumi_episode import analyze_title
+
+# 订阅配置中与过滤相关的字段
+RULE_FIELDS = ("rule", "include", "exclude", "resolution", "group")
+LIST_FIELDS = ("include", "exclude", "resolution", "group")
+
+# 用户规则中的反向引用在合并成一个正则后序号会错位, 这类规则单独匹配
+_BACKREF_RE = re.compile(r"\\[1-9]|\(\?P=")
+
+
+class RuleError(ValueError):
+    """订阅的过滤规则无效"""
+
+
+def normalize_resolution(value: str) -> str:
+    value = value.strip().lower()
+    if value in ("4k", "uhd"):
+        return "2160p"
+    if m := re.fullmatch(r"(?:\d+x)?(\d+)[pi]?", value):
+        return m.group(1) + "p"
+    raise RuleError(f"无法识别的分辨率 '{value}', 可用如 1080p、720p、4K")
+
+
+def as_list(value) -> list[str]:
+    """配置中的列表字段既可以是列表, 也可以是用 ; 分隔的字符串"""
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in re.split(r"[;；]", value) if v.strip()]
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    raise RuleError(f"无法识别的规则列表: {value!r}")
+
+
+def _compile(pattern: str, name: str) -> re.Pattern:
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        raise RuleError(f"{name} 中的正则 '{pattern}' 无效: {e}") from None
+
+
+@dataclass
+class FeedRule:
+    """
+    一个订阅预编译后的过滤规则。
+
+    标题需要匹配 rule 与 include 中的全部正则, 且不匹配 exclude 中的任何一个正则;
+    设置了 resolution / group 时, 标题中的分辨率与字幕组也必须在其中 (识别不出的视为不匹配)。
+    正则部分尽量合并为一个带前瞻断言的正则, 每个条目只需匹配一次。
+    """
+    include: tuple[str, ...] = ()
+    exclude: tuple[str, ...] = ()
+    resolutions: frozenset[str] = frozenset()
+    groups: tuple[str, ...] = ()
+    _include: list[re.Pattern] = field(init=False, repr=False, compare=False)
+    _exclude: list[re.Pattern] = field(init=False, repr=False, compare=False)
+    _combined: re.Pattern | None = field(init=False, repr=False, compare=False, default=None)
+
+    def __post_init__(self) -> None:
+        self._include = [_compile(p, "include") for p in self.include]
+        self._exclude = [_compile(p, "exclude") for p in self.exclude]
+        if any(_BACKREF_RE.search(p) for p in self.include + self.exclude):
+            return
+        parts = [f"(?=[\\s\\S]*?(?:{p}))" for p in self.include]
+        if self.exclude:
+            parts.append("(?![\\s\\S]*?(?:" + "|".join(f"(?:{p})" for p in self.exclude) + "))")
+        if parts:
+            try:
+                self._combined = re.compile("".join(parts))
+            except re.error:
+                pass  # 例如带有行内全局标志的正则, 退回逐条匹配
+
+    @classmethod
+    def from_item(cls, item: dict) -> "FeedRule":
+        """从订阅配置项编译规则, 规则无效时抛出 RuleError, 添加或修改订阅时也用它提前校验"""
+        include = as_list(item.get("include"))
+        if rule := (item.get("rule") or "").strip():
+            include.insert(0, rule)
+        return cls(
+            include=tuple(include),
+            exclude=tuple(as_list(item.get("exclude"))),
+            resolutions=frozenset(normalize_resolution(r) for r in as_list(item.get("resolution"))),
+            groups=tuple(g.lower() for g in as_list(item.get("group"))),
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.include or self.exclude or self.resolutions or self.groups)
+
+    @property
+    def fingerprint(self) -> str:
+        """规则内容的指纹, 规则变化后需要重新解析订阅"""
+        return "\n".join([
+            "|".join(self.include), "|".join(self.exclude),
+            ",".join(sorted(self.resolutions)), ",".join(self.groups),
+        ])
+
+    def match(self, title: str) -> bool:
+        if self.resolutions or self.groups:
+            info = analyze_title(title)
+            if self.resolutions and info.resolution not in self.resolutions:
+                return False
+            if self.groups:
+                group = info.group.lower()
+                if not group or not any(g in group for g in self.groups):
+                    return False
+        if self._combined is not None:
+            return self._combined.match(title) is not None
+        return all(p.search(title) for p in self._include) and not any(p.search(title) for p in self._exclude)
+
+    def describe(self) -> str:
+        parts = []
+        if self.include:
+            parts.append("包含 " + " 且 ".join(self.include))
+        if self.exclude:
+            parts.append("排除 " + " 或 ".join(self.exclude))
+        if self.resolutions:
+            parts.append("分辨率 " + "/".join(sorted(self.resolutions)))
+        if self.groups:
+            parts.append("字幕组 " + "/".join(self.groups))
+        return ", ".join(parts) or "无过滤规则"
+
+
+MATCH_ALL = FeedRule()
+
+
+class RuleSet:
+    """
+    配置中全部订阅的已编译规则, 按配置版本缓存, 配置不变时不会重新编译。
+
+    规则按订阅在配置中的下标保存, 同一 url 的多个订阅各自使用自己的规则;
+    规则无效的订阅记录在 errors 中并在本次更新中跳过, 不影响其他订阅 (包括同一 url 的订阅)。
+    """
+
+    def __init__(self) -> None:
+        self.version: int | None = None
+        self.rules: dict[int, FeedRule] = {}
+        self.errors: dict[int, str] = {}
+
+    def refresh(self, config: dict, version: int) -> None:
+        if version == self.version:
+            return
+        rules, errors = {}, {}
+        for index, item in enumerate(config.get("mikan", [])):
+            if not item.get("url"):
+                continue
+            try:
+                rules[index] = FeedRule.from_item(item)
+            except RuleError as e:
+                errors[index] = str(e)
+                logger.error(f"订阅 {item.get('title', item['url'])} 的过滤规则无效, 已跳过: {e}")
+        self.rules, self.errors, self.version = rules, errors, version
+
+    def get(self, index: int) -> FeedRule | None:
+        """配置中第 index 个订阅的规则, 规则无效时返回 None"""
+        if index in self.errors:
+            return None
+        return self.rules.get(index, MATCH_ALL)
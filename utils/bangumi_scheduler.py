@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""RSS 轮询调度模块 - 根据每部番剧的更新规律安排轮询时间"""
+import hashlib
+import os
+import statistics
+import time
+from datetime import datetime
+
+from .bangumi_fetch import JsonState
+
+WEEK = 7 * 86400
+# 预计更新时间前后的密集轮询窗口 (秒)
+WINDOW_BEFORE = float(os.getenv("MTA_POLL_WINDOW_BEFORE", str(15 * 60)))
+WINDOW_AFTER = float(os.getenv("MTA_POLL_WINDOW_AFTER", str(3 * 3600)))
+# 窗口内、窗口外、没有规律可循以及已完结时的轮询间隔 (秒)
+FAST_INTERVAL = float(os.getenv("MTA_POLL_FAST", str(5 * 60)))
+IDLE_INTERVAL = float(os.getenv("MTA_POLL_IDLE", str(6 * 3600)))
+UNKNOWN_INTERVAL = float(os.getenv("MTA_POLL_UNKNOWN", str(3600)))
+FINISHED_INTERVAL = float(os.getenv("MTA_POLL_FINISHED", str(86400)))
+# 超过 max(3 倍更新周期, 21 天) 没有新条目即视为已完结
+FINISHED_AFTER = 21 * 86400
+# 最多保留的发布时间数量与聚类半径 (秒)
+MAX_RELEASES = 16
+SLOT_RADIUS = 90 * 60
+
+
+def week_offset(ts: float) -> float:
+    """时间戳在本地时间一周内的偏移秒数 (周一 0 点为 0)"""
+    dt = datetime.fromtimestamp(ts)
+    return dt.weekday() * 86400 + dt.hour * 3600 + dt.minute * 60 + dt.second
+
+
+def _circular_distance(a: float, b: float) -> float:
+    d = abs(a - b) % WEEK
+    return min(d, WEEK - d)
+
+
+def release_slots(releases: list[float]) -> list[float]:
+    """
+    把历次发布时间按"周内偏移"聚类, 返回每个簇的中心。
+
+    周更番剧通常只有一个簇; 偶尔出现的补档、合集等孤立点在有足够样本时被忽略。
+    """
+    clusters: list[list[float]] = []
+    for offset in sorted(week_offset(ts) for ts in releases):
+        for cluster in clusters:
+            if _circular_distance(cluster[0], offset) <= SLOT_RADIUS:
+                cluster.append(offset)
+                break
+        else:
+            clusters.append([offset])
+    if len(releases) >= 4:
+        clusters = [c for c in clusters if len(c) >= 2] or clusters
+    return [statistics.median(c) for c in clusters]
+
+
+def _jitter(url: str, spread: float) -> float:
+    """按 url 计算固定的偏移量, 把各订阅的轮询时间错开"""
+    digest = hashlib.md5(url.encode("utf8")).digest()
+    return int.from_bytes(digest[:4], "big") / 2 ** 32 * spread
+
+
+class PollScheduler(JsonState):
+    """
+    轮询调度器: 从条目发布时间学习每个订阅的更新时段。
+
+    在预计更新时段附近密集轮询, 其余时间稀疏轮询, 长期没有更新的订阅视为已完结并降低频率。
+    每个订阅的状态包括最近的发布时间、上次轮询时间与下次轮询时间。
+    """
+
+    def observe(self, url: str, published: list[float]) -> None:
+        """记录订阅中条目的发布时间 (同一天内的多个条目只算一次发布)"""
+        if not published:
+            return
+        with self._lock:
+            state = self.data.setdefault(url, {})
+            releases = sorted(set(state.get("releases", [])) | set(published))
+            merged: list[float] = []
+            for ts in releases:
+                if merged and ts - merged[-1] < 12 * 3600:
+                    continue
+                merged.append(ts)
+            state["releases"] = merged[-MAX_RELEASES:]
+
+    def cadence(self, url: str) -> float | None:
+        """发布间隔的中位数, 样本不足时返回 None"""
+        releases = self.get(url).get("releases", [])
+        if len(releases) < 2:
+            return None
+        return statistics.median(b - a for a, b in zip(releases, releases[1:]))
+
+    def is_finished(self, url: str, now: float) -> bool:
+        releases = self.get(url).get("releases", [])
+        if not releases:
+            return False
+        cadence = self.cadence(url) or WEEK
+        return now - releases[-1] > max(3 * cadence, FINISHED_AFTER)
+
+    def next_poll(self, url: str, now: float) -> float:
+        """计算下一次轮询时间"""
+        releases = self.get(url).get("releases", [])
+        if not releases:
+            return now + UNKNOWN_INTERVAL + _jitter(url, 300)
+        if self.is_finished(url, now):
+            return now + FINISHED_INTERVAL + _jitter(url, 3600)
+
+        offset = week_offset(now)
+        week_start = now - offset
+        latest = releases[-1]
+        next_window = now + IDLE_INTERVAL
+        for slot in release_slots(releases):
+            # 检查本周与下周的该时段
+            for base in (week_start - WEEK, week_start, week_start + WEEK):
+                start, end = base + slot - WINDOW_BEFORE, base + slot + WINDOW_AFTER
+                if end <= now or latest >= start:
+                    continue  # 时段已过, 或本时段的新集已经拿到
+                if start <= now:
+                    return now + FAST_INTERVAL + _jitter(url, 60)
+                next_window = min(next_window, start)
+        return next_window + _jitter(url, 120)
+
+    def record_poll(self, url: str, now: float | None = None) -> None:
+        """记录一次轮询并计算下次轮询时间"""
+        now = now or time.time()
+        next_poll = self.next_poll(url, now)
+        with self._lock:
+            state = self.data.setdefault(url, {})
+            state.update(last_poll=now, next_poll=next_poll)
+
+    def due(self, urls: list[str], now: float | None = None) -> list[str]:
+        """返回已经到了轮询时间的订阅"""
+        now = now or time.time()
+        return [url for url in urls if self.get(url).get("next_poll", 0) <= now]
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""网盘同步模块 - 基于本地上传清单的增量同步"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Protocol
+
+from loguru import logger
+
+from .workers import workers
+
+workspace = Path(__file__).resolve().parent.parent
+
+# 需要同步的本地目录与上传清单的位置
+SYNC_DIR = Path(os.getenv("MTA_SYNC_DIR", str(Path.home() / "bangumi")))
+MANIFEST_PATH = Path(os.getenv("MTA_UPLOAD_MANIFEST", str(workspace / ".cache" / "bangumi_config" / "upload_manifest.db")))
+# 并发上传数、单个文件的最大尝试次数与重试间隔基数 (秒);
+# 上传在进程池的 upload 类任务中执行, 实际并发不超过 WORKER_LIMITS 中 upload 的上限
+UPLOAD_WORKERS = int(os.getenv("MTA_UPLOAD_WORKERS", "4"))
+UPLOAD_ATTEMPTS = int(os.getenv("MTA_UPLOAD_ATTEMPTS", "3"))
+UPLOAD_RETRY_BASE = float(os.getenv("MTA_UPLOAD_RETRY_BASE", "2"))
+
+
+class Uploader(Protocol):
+    """上传后端"""
+
+    def upload(self, local_path: Path, remote_path: str) -> None:
+        """上传单个文件, 失败时抛出异常"""
+
+    def syncup(self, local_dir: Path) -> None:
+        """把整个本地目录与远端完整对账"""
+
+
+_bypy = None
+_bypy_lock = threading.Lock()
+
+
+class ByPyUploader:
+    """
+    基于 bypy 的百度网盘上传后端, 远端根目录对应 local_dir。
+
+    bypy 客户端每个进程只创建一个, 上传后端本身不带状态, 可以交给工作进程执行。
+    """
+
+    @property
+    def bypy(self):
+        global _bypy
+        with _bypy_lock:
+            if _bypy is None:
+                from bypy import ByPy
+                _bypy = ByPy()
+            return _bypy
+
+    def upload(self, local_path: Path, remote_path: str) -> None:
+        # bypy 返回 0 表示成功, 大文件会分片上传并支持断点续传
+        code = self.bypy.upload(str(local_path), remote_path, ondup="overwrite")
+        if code != 0:
+            raise RuntimeError(f"bypy 上传失败, 错误码 {code}")
+
+    def syncup(self, local_dir: Path) -> None:
+        code = self.bypy.syncup(localdir=str(local_dir))
+        if code != 0:
+            raise RuntimeError(f"bypy 同步失败, 错误码 {code}")
+
+
+class LocalUploader:
+    """把文件复制到本地目录的上传后端, 用于测试或挂载的网盘目录"""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def upload(self, local_path: Path, remote_path: str) -> None:
+        target = self.root / remote_path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(local_path, target)
+
+    def syncup(self, local_dir: Path) -> None:
+        shutil.copytree(local_dir, self.root, dirs_exist_ok=True)
+
+
+def file_md5(path: Path) -> str:
+    md5 = hashlib.md5()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+@dataclass
+class SyncReport:
+    """一次同步的结果"""
+    scanned: int = 0
+    uploaded: int = 0
+    failed: int = 0
+    cancelled: int = 0  # 经 ..workers cancel 取消的上传, 不计入失败
+    elapsed: float = 0.0
+
+    def describe(self) -> str:
+        text = f"检查 {self.scanned} 个文件, 上传 {self.uploaded} 个"
+        if self.failed:
+            text += f", {self.failed} 个失败 (下次同步时重试)"
+        if self.cancelled:
+            text += f", {self.cancelled} 个已取消 (下次同步时上传)"
+        return text + f", 耗时 {self.elapsed:.1f} 秒。"
+
+
+class UploadManifest:
+    """
+    上传清单: 记录每个文件的路径、大小、修改时间、MD5 与远端状态。
+
+    大小与修改时间都没变的文件不会重新计算 MD5;
+    MD5 与上次成功上传时一致的文件不会重新上传。
+    """
+
+    def __init__(self, path: Path = MANIFEST_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                md5 TEXT NOT NULL,
+                remote_state TEXT NOT NULL DEFAULT 'pending',
+                remote_md5 TEXT NOT NULL DEFAULT '',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT NOT NULL DEFAULT '',
+                uploaded_at REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+
+    @property
+    def empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM files LIMIT 1").fetchone() is None
+
+    def scan(self, local_dir: Path) -> tuple[list[str], list[str]]:
+        """
+        扫描本地目录并更新清单, 返回 (扫描到的相对路径列表, 需要上传的相对路径列表)。
+
+        本地已删除的文件从清单中移除, 不再重试上传。
+        """
+        with self._lock:
+            known = {
+                row[0]: row[1:]
+                for row in self._conn.execute("SELECT path, size, mtime, md5, remote_state, remote_md5 FROM files")
+            }
+        updates = []
+        seen = []
+        for path in local_dir.rglob("*"):
+            # 跳过临时文件与目录
+            if not path.is_file() or path.name.startswith("."):
+                continue
+            rel = path.relative_to(local_dir).as_posix()
+            seen.append(rel)
+            stat = path.stat()
+            row = known.get(rel)
+            if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+                continue
+            md5 = file_md5(path)
+            state = "uploaded" if row and row[4] == md5 else "pending"
+            updates.append((rel, stat.st_size, stat.st_mtime, md5, state))
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO files (path, size, mtime, md5, remote_state) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    size = excluded.size, mtime = excluded.mtime,
+                    md5 = excluded.md5, remote_state = excluded.remote_state
+                """,
+                updates,
+            )
+            removed = known.keys() - set(seen)
+            self._conn.executemany("DELETE FROM files WHERE path = ?", ((rel,) for rel in removed))
+            pending = [row[0] for row in self._conn.execute("SELECT path FROM files WHERE remote_state != 'uploaded'")]
+        return seen, pending
+
+    def mark_uploaded(self, rel: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE files SET remote_state = 'uploaded', remote_md5 = md5, attempts = 0, "
+                "last_error = '', uploaded_at = ? WHERE path = ?",
+                (time.time(), rel),
+            )
+
+    def mark_failed(self, rel: str, error: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE files SET remote_state = 'failed', attempts = attempts + 1, last_error = ? WHERE path = ?",
+                (error, rel),
+            )
+
+    def mark_all_uploaded(self, paths: list[str]) -> None:
+        """把 paths 中的文件标记为已上传; 只传入完整对账前扫描到的文件, 对账期间新增的文件留给下次同步"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE files SET remote_state = 'uploaded', remote_md5 = md5, attempts = 0, "
+                "last_error = '', uploaded_at = ? WHERE path = ?",
+                ((now, rel) for rel in paths),
+            )
+
+
+class IncrementalSync:
+    """
+    只上传新增或变化的文件, 并行上传并带退避重试; 上传在工作进程中执行, 上传后端需要能被 pickle。
+
+    增量同步与完整对账互斥执行, 避免两个上传会话同时操作同一个目录。
+    上传清单为空时 (第一次同步) 先做一次完整对账, 不把已有的文件全部重新上传。
+    """
+
+    def __init__(self, uploader: Uploader, manifest: UploadManifest, local_dir: Path = SYNC_DIR,
+                 max_workers: int = UPLOAD_WORKERS, attempts: int = UPLOAD_ATTEMPTS) -> None:
+        self.uploader = uploader
+        self.manifest = manifest
+        self.local_dir = local_dir
+        self.max_workers = max_workers
+        self.attempts = attempts
+        self._running = threading.Lock()
+
+    def _upload_one(self, rel: str) -> tuple[str, str, str | None]:
+        """上传单个文件, 返回 (相对路径, 状态, 错误信息), 状态为 uploaded、cancelled 或 failed"""
+        error = ""
+        for attempt in range(1, self.attempts + 1):
+            try:
+                workers.call("upload", self.uploader.upload, self.local_dir / rel, rel)
+                self.manifest.mark_uploaded(rel)
+                return rel, "uploaded", None
+            except CancelledError:
+                # 经 ..workers cancel 取消: 不重试也不记为失败, 文件仍待上传, 下次同步时再上传
+                return rel, "cancelled", None
+            except Exception as e:
+                error = str(e)
+                if attempt < self.attempts:
+                    time.sleep(UPLOAD_RETRY_BASE * 2 ** (attempt - 1))
+        self.manifest.mark_failed(rel, error)
+        logger.error(f"上传 {rel} 失败: {error}")
+        return rel, "failed", error
+
+    def sync(self, progress: Callable[[str], None] | None = None) -> SyncReport:
+        """增量同步, 每个文件上传完成后调用一次 progress"""
+        with self._running:
+            if self.manifest.empty:
+                if progress:
+                    progress("上传清单为空, 先与网盘完整对账")
+                return self._full_sync()
+            return self._sync(progress)
+
+    def _sync(self, progress: Callable[[str], None] | None) -> SyncReport:
+        start = time.monotonic()
+        seen, pending = self.manifest.scan(self.local_dir)
+        report = SyncReport(scanned=len(seen))
+        if pending:
+            pool_size = max(1, min(self.max_workers, len(pending)))
+            with ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="rss-upload") as pool:
+                futures = [pool.submit(self._upload_one, rel) for rel in pending]
+                for future in as_completed(futures):
+                    rel, status, error = future.result()
+                    if status == "uploaded":
+                        report.uploaded += 1
+                        if progress:
+                            progress(f"已上传 {rel}")
+                    elif status == "cancelled":
+                        report.cancelled += 1
+                        if progress:
+                            progress(f"已取消上传 {rel}")
+                    else:
+                        report.failed += 1
+                        if progress:
+                            progress(f"上传 {rel} 失败: {error}")
+        report.elapsed = time.monotonic() - start
+        return report
+
+    def full_sync(self) -> SyncReport:
+        """完整对账: 交给上传后端比较整个目录, 成功后把对账前扫描到的文件标记为已上传"""
+        with self._running:
+            return self._full_sync()
+
+    def _full_sync(self) -> SyncReport:
+        start = time.monotonic()
+        seen, _ = self.manifest.scan(self.local_dir)
+        # 完整对账单独计数, 不占用增量上传的名额; 取消只会让等待方返回, 已开始的对账会在工作进程中运行到结束
+        workers.call("syncup", self.uploader.syncup, self.local_dir)
+        self.manifest.mark_all_uploaded(seen)
+        return SyncReport(scanned=len(seen), elapsed=time.monotonic() - start)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""bencode 解码模块 - 校验 .torrent 文件并计算 infohash"""
+import hashlib
+
+MAX_DEPTH = 64
+
+
+class BencodeError(ValueError):
+    """bencode 数据格式错误"""
+
+
+def _decode(data: bytes, i: int, depth: int) -> tuple[object, int]:
+    """从位置 i 开始解码一个值, 返回 (值, 下一个位置)"""
+    if depth > MAX_DEPTH:
+        raise BencodeError("嵌套层数过深")
+    if i >= len(data):
+        raise BencodeError("数据意外结束")
+
+    c = data[i:i + 1]
+    if c == b"i":
+        end = data.find(b"e", i)
+        if end == -1:
+            raise BencodeError("整数缺少结束符")
+        text = data[i + 1:end]
+        if not text or text == b"-" or (text.lstrip(b"-").startswith(b"0") and text not in (b"0",)):
+            raise BencodeError(f"非法整数: {text!r}")
+        try:
+            return int(text), end + 1
+        except ValueError as e:
+            raise BencodeError(f"非法整数: {text!r}") from e
+
+    if c == b"l":
+        i += 1
+        items = []
+        while data[i:i + 1] != b"e":
+            value, i = _decode(data, i, depth + 1)
+            items.append(value)
+        return items, i + 1
+
+    if c == b"d":
+        i += 1
+        result: dict[bytes, object] = {}
+        while data[i:i + 1] != b"e":
+            key, i = _decode(data, i, depth + 1)
+            if not isinstance(key, bytes):
+                raise BencodeError("字典键必须是字符串")
+            result[key], i = _decode(data, i, depth + 1)
+        return result, i + 1
+
+    if c.isdigit():
+        colon = data.find(b":", i)
+        if colon == -1:
+            raise BencodeError("字符串缺少长度分隔符")
+        try:
+            length = int(data[i:colon])
+        except ValueError as e:
+            raise BencodeError("非法字符串长度") from e
+        start = colon + 1
+        if start + length > len(data):
+            raise BencodeError("字符串长度超出数据范围")
+        return data[start:start + length], start + length
+
+    raise BencodeError(f"位置 {i} 处存在非法字符 {c!r}")
+
+
+def decode(data: bytes) -> object:
+    """解码完整的 bencode 数据, 末尾不允许有多余内容"""
+    value, end = _decode(data, 0, 0)
+    if end != len(data):
+        raise BencodeError("数据末尾存在多余内容")
+    return value
+
+
+def info_span(data: bytes) -> tuple[int, int]:
+    """返回顶层字典中 info 值在原始数据中的 [start, end) 区间"""
+    if data[:1] != b"d":
+        raise BencodeError("种子文件顶层必须是字典")
+    i = 1
+    while data[i:i + 1] != b"e":
+        key, i = _decode(data, i, 1)
+        start = i
+        _, i = _decode(data, i, 1)
+        if key == b"info":
+            return start, i
+    raise BencodeError("种子文件缺少 info 字段")
+
+
+def validate_torrent(data: bytes) -> dict:
+    """校验数据是合法的 .torrent 文件 (顶层字典且包含 info 字典), 返回解码结果"""
+    torrent = decode(data)
+    if not isinstance(torrent, dict) or not isinstance(torrent.get(b"info"), dict):
+        raise BencodeError("不是合法的种子文件")
+    return torrent
+
+
+def infohash(data: bytes) -> str:
+    """计算种子的 v1 infohash (info 字典原始字节的 SHA-1)"""
+    start, end = info_span(data)
+    return hashlib.sha1(data[start:end]).hexdigest()
+
+
+def torrent_infohash(data: bytes) -> str:
+    """校验种子文件并返回 infohash, 可以交给工作进程执行"""
+    validate_torrent(data)
+    return infohash(data)
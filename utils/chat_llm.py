@@ -5,15 +5,15 @@ import re
 from datetime import datetime, timedelta
 from pathlib import Path
 from zoneinfo import ZoneInfo
-from openai import OpenAI
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# 初始化 OpenAI 客户端
+# OpenAI 客户端在首次调用时创建, 导入本模块时不加载 openai
 API_KEY = os.getenv("API_KEY")
-client = OpenAI(api_key=API_KEY, base_url="https://api.siliconflow.cn/v1")
+BASE_URL = "https://api.siliconflow.cn/v1"
 MODEL_NAME = "deepseek-ai/DeepSeek-V3"
+_client = None
 
 # 中国时区
 CST = ZoneInfo("Asia/Shanghai")
@@ -25,6 +25,15 @@ MEMORY_DIR = WORKSPACE / ".cache" / "chat_memory"
 from .chat_prompt import CHARACTER_SYSTEM_PROMPT
 
 
+def get_client():
+    """获取共用的 OpenAI 客户端, 首次调用时才导入 openai 并创建"""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=API_KEY, base_url=BASE_URL)
+    return _client
+
+
 def get_current_time_str() -> str:
     """获取当前时间字符串"""
     now = datetime.now(CST)
@@ -82,7 +91,7 @@ def analyze_search_intent(user_message: str, memory: list) -> dict:
 输出："""
 
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model=MODEL_NAME,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.3,
@@ -162,7 +171,7 @@ def call_llm(user_message: str, memory: list, need_search: bool = False, search_
     })
 
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model=MODEL_NAME,
             messages=messages,
             temperature=0.8,
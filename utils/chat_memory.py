@@ -5,7 +5,7 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from zoneinfo import ZoneInfo
 
-from .chat_llm import client, MODEL_NAME
+from .chat_llm import get_client, MODEL_NAME
 
 # 记忆配置
 RECENT_TURNS = 4  # 保留最近4轮完整对话
@@ -154,7 +154,7 @@ def _generate_summary(messages: list) -> str:
 请直接输出摘要（50-150字），不要有额外说明："""
 
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model=MODEL_NAME,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.3,
@@ -191,7 +191,7 @@ def _extract_important_points(messages: list) -> list:
 只提取真正重要的事项，普通聊天内容不需要提取："""
 
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model=MODEL_NAME,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.3,
@@ -1,11 +1,87 @@
 import base64
+import os
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# 本地图片的发送方式: base64 内联 (默认), 或 file 以 file:// 路径交给与 bot 同机的 OneBot 实现读取
+MEDIA_MODE = os.getenv("MEDIA_MODE", "base64")
+# 已编码图片缓存的总字节数上限
+MEDIA_CACHE_BYTES = int(os.getenv("MEDIA_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+
+class MediaCache:
+    """
+    本地图片的编码缓存。
+
+    每个文件只编码一次, 以 (mtime, 大小) 判断文件是否变化;
+    按编码后的总字节数限制容量, 超出时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, max_bytes: int = MEDIA_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[tuple[int, int], str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> str:
+        """返回 "base64://..." 形式的图片内容"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+
+        with open(path, "rb") as f:
+            encoded = "base64://" + base64.b64encode(f.read()).decode("utf-8")
+        with self._lock:
+            self.misses += 1
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.size -= len(old[1])
+            if len(encoded) <= self.max_bytes:
+                self._entries[path] = (stamp, encoded)
+                self.size += len(encoded)
+                while self.size > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return encoded
+
+
+media_cache = MediaCache()
+
+
 def img_to_b64(img_path: str) -> str:
     """
     Convert an image file to a base64 encoded string.
 
+    The encoded string is cached until the file changes.
+
     :param img_path: Path to the image file.
     :return: Base64 encoded string of the image.
     """
-    with open(img_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-    return "base64://" + encoded_string
\ No newline at end of file
+    return media_cache.get(img_path)
+
+
+def image_file(img_path: str, mode: str = MEDIA_MODE, cache: bool = True) -> str:
+    """
+    ImageSegment 的 file 参数: 按 MEDIA_MODE 选择 file:// 路径或缓存的 base64 内容。
+
+    :param img_path: Path to the image file.
+    :param mode: "file" 或 "base64"
+    :param cache: 只发送一次的图片传 False, 编码结果不进入缓存
+    """
+    if mode == "file":
+        return "file://" + os.path.abspath(img_path)
+    if not cache:
+        with open(img_path, "rb") as f:
+            return "base64://" + base64.b64encode(f.read()).decode("utf-8")
+    return img_to_b64(img_path)
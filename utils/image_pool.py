@@ -0,0 +1,151 @@
+"""随机图片预取池 - 在后台预先下载随机图片到本地, 发送时直接使用本地文件"""
+import asyncio
+import mimetypes
+import time
+from pathlib import Path
+
+import requests
+
+# 用过的图片保留一段时间再删除, 等 OneBot 实现读取完 file:// 路径
+USED_TTL = 600
+
+
+class ImagePool:
+    """
+    随机图片预取池。
+
+    后台任务保持 ready 目录中有 size 张新鲜图片, 超过 max_age 秒的图片会被丢弃重新下载;
+    take 在线程中取走一张后唤醒后台任务补充。上游接口失败时按指数退避重试,
+    退避期间 take 不会提前唤醒后台任务。
+    """
+
+    def __init__(self, url: str, directory: str | Path, size: int = 5, max_age: float = 3600,
+                 max_bytes: int = 10 * 1024 * 1024, timeout: float = 15) -> None:
+        self.url = url
+        self.ready_dir = Path(directory) / "ready"
+        self.used_dir = Path(directory) / "used"
+        self.size = size
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.served = 0
+        self.missed = 0
+        self.fetched = 0
+        self.failed = 0
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._backoff_until = 0.0  # 退避结束的 time.monotonic()
+
+    def _ready(self) -> list[Path]:
+        """池中的图片, 从旧到新; 顺带删除过期的图片"""
+        if not self.ready_dir.exists():
+            return []
+        now = time.time()
+        files = []
+        for path in self.ready_dir.iterdir():
+            if path.name.startswith("."):
+                continue
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                continue  # 刚被 take 取走或被另一个线程当作过期图片删除
+            if now - mtime > self.max_age:
+                path.unlink(missing_ok=True)
+            else:
+                files.append((mtime, path))
+        return [path for _, path in sorted(files)]
+
+    def _prune_used(self) -> None:
+        if not self.used_dir.exists():
+            return
+        now = time.time()
+        for path in self.used_dir.iterdir():
+            if now - path.stat().st_mtime > USED_TTL:
+                path.unlink(missing_ok=True)
+
+    def fetch_one(self) -> Path:
+        """在工作线程中执行: 下载一张图片到池中"""
+        with requests.get(self.url, timeout=self.timeout, stream=True) as resp:
+            resp.raise_for_status()
+            content_type = resp.headers.get("Content-Type", "").split(";")[0].strip()
+            if not content_type.startswith("image/"):
+                raise ValueError(f"上游返回的不是图片: {content_type or '未知类型'}")
+            data = bytearray()
+            for chunk in resp.iter_content(64 * 1024):
+                data += chunk
+                if len(data) > self.max_bytes:
+                    raise ValueError(f"图片超过 {self.max_bytes} 字节")
+        ext = mimetypes.guess_extension(content_type) or ".img"
+        self.ready_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.ready_dir / f".{time.time_ns()}{ext}"
+        tmp.write_bytes(data)
+        path = tmp.with_name(tmp.name[1:])
+        tmp.replace(path)
+        return path
+
+    def _take(self) -> Path | None:
+        """在工作线程中执行: 把最旧的一张图片移到 used 目录; 文件被后台任务同时删除等错误时返回 None"""
+        try:
+            ready = self._ready()
+            if not ready:
+                return None
+            self.used_dir.mkdir(parents=True, exist_ok=True)
+            return ready[0].replace(self.used_dir / ready[0].name)
+        except OSError as e:
+            print(f"从图片预取池取图失败: {e}")
+            return None
+
+    async def take(self) -> Path | None:
+        """取出池中最旧的一张图片, 池为空或取图失败时返回 None"""
+        path = await asyncio.to_thread(self._take)
+        if self._wakeup is not None and time.monotonic() >= self._backoff_until:
+            self._wakeup.set()
+        if path is None:
+            self.missed += 1
+        else:
+            self.served += 1
+        return path
+
+    async def run(self) -> None:
+        """后台补充循环"""
+        failures = 0
+        while True:
+            try:
+                ready = await asyncio.to_thread(self._ready)
+                await asyncio.to_thread(self._prune_used)
+            except OSError as e:
+                print(f"检查图片预取池失败: {e}")
+                ready = []
+            if len(ready) < self.size:
+                try:
+                    await asyncio.to_thread(self.fetch_one)
+                    self.fetched += 1
+                    failures = 0
+                    self._backoff_until = 0.0
+                    continue
+                except (requests.exceptions.RequestException, ValueError, OSError) as e:
+                    self.failed += 1
+                    failures += 1
+                    print(f"预取图片失败: {e}")
+                timeout = min(300.0, 2.0 ** failures)
+                self._backoff_until = time.monotonic() + timeout
+            else:
+                # 池已满, 等到被取走或最旧的图片过期
+                try:
+                    timeout = max(1.0, self.max_age - (time.time() - ready[0].stat().st_mtime))
+                except OSError:
+                    timeout = 1.0
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self.run())
+
+    def status(self) -> str:
+        return (f"池中 {len(self._ready())}/{self.size} 张, 已发送 {self.served} 张, "
+                f"池空 {self.missed} 次, 已下载 {self.fetched} 张, 下载失败 {self.failed} 次")
@@ -0,0 +1,233 @@
+"""发送队列 - 按发送目标限速, 长文本按行切分, 超长输出折叠为合并转发消息"""
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+
+from dotenv import load_dotenv
+from melobot import get_bot
+from melobot.protocols.onebot.v11 import Adapter, GroupMessageEvent, MessageEvent, NodeSegment, ReplySegment, TextSegment
+
+from .accounts import accounts
+
+load_dotenv()
+# 每个目标每秒可发送的消息数与突发上限
+OUTBOX_RATE = float(os.getenv("OUTBOX_RATE", "1"))
+OUTBOX_BURST = int(os.getenv("OUTBOX_BURST", "3"))
+# 单条消息的最大字数, 以及超过多少字时改为合并转发
+OUTBOX_CHUNK = int(os.getenv("OUTBOX_CHUNK", "1500"))
+OUTBOX_FOLD = int(os.getenv("OUTBOX_FOLD", "3000"))
+OUTBOX_NODE_NAME = os.getenv("OUTBOX_NODE_NAME", "leafbot")
+# 等待 OneBot 实现回应发送结果的最长秒数, 超时视为发送失败
+OUTBOX_ECHO_TIMEOUT = float(os.getenv("OUTBOX_ECHO_TIMEOUT", "30"))
+# 一条合并转发消息最多包含的节点数
+MAX_NODES = 90
+
+Target = tuple[int | None, str, int]  # (发送账号, "group" | "private", id)
+
+
+def split_text(text: str, limit: int) -> list[str]:
+    """按行把文本切分为不超过 limit 字的若干段, 单行过长时才在行内切开"""
+    chunks, current = [], ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current:
+        chunks.append(current)
+    return [chunk.rstrip("\n") for chunk in chunks if chunk.strip()]
+
+
+class TokenBucket:
+    """令牌桶, acquire 在没有令牌时等待到下一个令牌生成"""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        self._refill()
+        while self.tokens < 1:
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+            self._refill()
+        self.tokens -= 1
+
+    @property
+    def idle(self) -> bool:
+        """令牌已满, 可以丢弃而不影响限速"""
+        self._refill()
+        return self.tokens >= self.burst
+
+
+@dataclass
+class Outgoing:
+    """排队中的一条待发送消息"""
+    target: Target
+    msgs: list | str
+    forward: bool = False
+    enqueued_at: float = field(default_factory=time.monotonic)
+    done: asyncio.Future | None = None
+
+
+class Outbox:
+    """
+    发送队列。
+
+    每个目标 (账号与群或私聊) 有独立的队列与令牌桶, 同一目标的消息按提交顺序发送,
+    不同目标之间互不阻塞。send 在 OneBot 实现回应发送成功后才返回; 连接断开、回应失败或超时时抛出异常,
+    同一目标的下一条消息在收到上一条的回应后才发送。
+    多账号时 reply 从收到事件的账号发出, send 从 self_id 指定的账号发出, 未指定时使用第一个连接。
+    """
+
+    def __init__(self, rate: float = OUTBOX_RATE, burst: int = OUTBOX_BURST,
+                 chunk: int = OUTBOX_CHUNK, fold: int = OUTBOX_FOLD, latency_window: int = 200) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.chunk = chunk
+        self.fold = fold
+        self._queues: dict[Target, deque[Outgoing]] = {}
+        self._workers: dict[Target, asyncio.Task] = {}
+        self._buckets: dict[Target, TokenBucket] = {}
+        self.latencies: deque[float] = deque(maxlen=latency_window)
+        self.sent = 0
+        self.failed = 0
+        self.split = 0
+        self.folded = 0
+
+    def prepare(self, target: Target, text: str, node_uin: int | None = None) -> list[Outgoing]:
+        """把文本转为一条或多条待发送消息: 过长时按行切分, 超过折叠阈值时合并转发"""
+        if len(text) <= self.chunk:
+            return [Outgoing(target, text)]
+        chunks = split_text(text, self.chunk)
+        if len(text) <= self.fold:
+            self.split += 1
+            return [Outgoing(target, chunk) for chunk in chunks]
+        self.folded += 1
+        uin = node_uin if node_uin is not None else target[2]
+        nodes = [
+            NodeSegment(content=[TextSegment(chunk)], name=OUTBOX_NODE_NAME, uin=uin, use_std=True)
+            for chunk in chunks
+        ]
+        return [Outgoing(target, nodes[i:i + MAX_NODES], forward=True) for i in range(0, len(nodes), MAX_NODES)]
+
+    async def send(self, msgs: str | list, *, user_id: int | None = None, group_id: int | None = None,
+                   node_uin: int | None = None, self_id: int | None = None) -> None:
+        """发送给群 (group_id) 或私聊 (user_id); 文本会按需切分或折叠, 消息段列表原样发送"""
+        account = accounts.resolve(self_id)
+        target: Target = (account, "group", group_id) if group_id is not None else (account, "private", user_id)
+        items = self.prepare(target, msgs, node_uin) if isinstance(msgs, str) else [Outgoing(target, msgs)]
+        await self._submit(items)
+
+    async def reply(self, event: MessageEvent, text: str) -> None:
+        """回复事件来源, 与 send_reply 一样引用原消息; 合并转发无法引用, 直接发送"""
+        if isinstance(event, GroupMessageEvent):
+            target: Target = (event.self_id, "group", event.group_id)
+        else:
+            target = (event.self_id, "private", event.user_id)
+        items = self.prepare(target, text, event.self_id)
+        if not items[0].forward:
+            items[0].msgs = [ReplySegment(str(event.message_id)), TextSegment(items[0].msgs)]
+        await self._submit(items)
+
+    async def _submit(self, items: list[Outgoing]) -> None:
+        loop = asyncio.get_running_loop()
+        for item in items:
+            item.done = loop.create_future()
+            target = item.target
+            self._queues.setdefault(target, deque()).append(item)
+            if target not in self._workers:
+                self._workers[target] = asyncio.create_task(self._drain(target))
+        results = await asyncio.gather(*(item.done for item in items), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def _drain(self, target: Target) -> None:
+        queue = self._queues[target]
+        bucket = self._buckets.setdefault(target, TokenBucket(self.rate, self.burst))
+        adaptor = get_bot().get_adapter(Adapter)
+        self_id, kind, target_id = target
+        kwargs = {"group_id": target_id} if kind == "group" else {"user_id": target_id}
+        route = accounts.route(self_id)
+        try:
+            while queue:
+                item = queue[0]
+                await bucket.acquire()
+                try:
+                    with adaptor.filter_out(route) if route else nullcontext():
+                        if item.forward:
+                            handles = await adaptor.send_forward_custom(item.msgs, **kwargs)
+                        else:
+                            handles = await adaptor.send_custom(item.msgs, **kwargs)
+                    await self._confirm(handles)
+                except Exception as e:
+                    self.failed += 1
+                    if not item.done.done():
+                        item.done.set_exception(e)
+                else:
+                    self.sent += 1
+                    self.latencies.append(time.monotonic() - item.enqueued_at)
+                    if not item.done.done():
+                        item.done.set_result(None)
+                queue.popleft()
+        finally:
+            del self._queues[target]
+            del self._workers[target]
+            if bucket.idle:
+                del self._buckets[target]
+
+    @staticmethod
+    async def _confirm(handles) -> None:
+        """等待发送操作的回应; 句柄只是把发送安排成了后台任务, 发送错误要从回应中取得"""
+        if not len(handles):
+            raise RuntimeError("没有可用的输出源, 消息未发送")
+        echoes = await asyncio.wait_for(handles.unwrap_all(), OUTBOX_ECHO_TIMEOUT)
+        for echo in echoes:
+            # async 表示 OneBot 实现已接受请求, 稍后异步发送
+            if not (echo.is_ok() or echo.is_async()):
+                raise RuntimeError(f"发送失败: {echo!r}")
+
+    @property
+    def depth(self) -> int:
+        """所有目标排队中的消息总数"""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def latency(self, quantile: float) -> float:
+        """最近若干条消息从提交到确认发送成功的耗时分位数 (秒)"""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+    def status(self) -> str:
+        busiest = sorted(self._queues.items(), key=lambda kv: len(kv[1]), reverse=True)[:5]
+        lines = [
+            f"排队中 {self.depth} 条 ({len(self._queues)} 个目标)",
+            f"已发送 {self.sent} 条, 失败 {self.failed} 条, 切分 {self.split} 次, 合并转发 {self.folded} 次",
+            f"发送延迟: p50 {self.latency(0.5) * 1000:.0f} ms, p95 {self.latency(0.95) * 1000:.0f} ms, "
+            f"最大 {max(self.latencies, default=0) * 1000:.0f} ms (最近 {len(self.latencies)} 条)",
+        ]
+        lines.extend(
+            f"  {kind} {target_id}" + (f" (账号 {self_id})" if accounts.multi else "") + f": {len(queue)} 条"
+            for (self_id, kind, target_id), queue in busiest
+        )
+        return "\n".join(lines)
+
+
+outbox = Outbox()
@@ -0,0 +1,138 @@
+"""采样分析器 - 在运行中的进程里定时采集所有线程的调用栈, 统计各函数与各插件处理函数的耗时"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+
+PROFILE_DIR = Path(".cache/profiles")
+# 按本文件的位置确定插件目录, 与启动时的工作目录无关
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "plugins") + os.sep
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _thread_cpu(thread_id: int) -> float | None:
+    """线程已消耗的 CPU 时间, 平台不支持时返回 None"""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread_id))
+    except (AttributeError, OSError):
+        return None
+
+
+@dataclass
+class Profile:
+    """一次采样的结果, 时间单位为秒"""
+    duration: float = 0.0
+    samples: int = 0
+    interval: float = 0.0
+    stacks: Counter = field(default_factory=Counter)  # 折叠调用栈 -> 墙钟时间
+    self_wall: Counter = field(default_factory=Counter)
+    self_cpu: Counter = field(default_factory=Counter)
+    total_wall: Counter = field(default_factory=Counter)
+    handler_wall: Counter = field(default_factory=Counter)
+    handler_cpu: Counter = field(default_factory=Counter)
+
+    def folded(self) -> str:
+        """flamegraph.pl / speedscope 可读取的折叠格式, 数值为毫秒"""
+        return "\n".join(f"{stack} {round(wall * 1000)}" for stack, wall in self.stacks.most_common()) + "\n"
+
+    def save(self, directory: Path = PROFILE_DIR) -> Path:
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+        path.write_text(self.folded(), encoding="utf8")
+        return path
+
+    def summary(self, top: int = 15) -> str:
+        lines = [f"采样 {self.duration:.1f} 秒, {self.samples} 次 (间隔 {self.interval * 1000:.0f} ms)"]
+        if self.handler_wall:
+            lines.append("插件处理函数 (墙钟 / CPU):")
+            for name, wall in self.handler_wall.most_common(top):
+                lines.append(f"  {wall:7.2f}s / {self.handler_cpu[name]:6.2f}s  {name}")
+        # 空闲线程的等待会占满墙钟时间, 能取得 CPU 时间时按 CPU 排序
+        ranking = self.self_cpu if sum(self.self_cpu.values()) > 0 else self.self_wall
+        lines.append("函数自身耗时 (墙钟 / CPU / 含子调用):")
+        for name, _ in ranking.most_common(top):
+            lines.append(f"  {self.self_wall[name]:7.2f}s / {self.self_cpu[name]:6.2f}s / {self.total_wall[name]:6.2f}s  {name}")
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """
+    采样分析器。
+
+    run 在调用线程中按 interval 采集除自身外所有线程的调用栈, 结束后返回 Profile;
+    不采样时没有任何开销。CPU 时间按两次采样之间线程 CPU 时钟的增量分摊到当时的调用栈。
+    插件处理函数取调用栈中最外层位于 plugins 目录的函数。
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def run(self, seconds: float) -> Profile:
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("已有采样正在进行")
+        try:
+            return self._sample(seconds)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float) -> Profile:
+        profile = Profile(interval=self.interval)
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        last_cpu: dict[int, float | None] = {}
+        start = last = time.perf_counter()
+        deadline = start + seconds
+
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            wall = now - last
+            last = now
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                cpu_now = _thread_cpu(thread_id)
+                previous = last_cpu.get(thread_id)
+                last_cpu[thread_id] = cpu_now
+                cpu = cpu_now - previous if cpu_now is not None and previous is not None else 0.0
+                thread_name = names.setdefault(thread_id, f"thread-{thread_id}")
+
+                stack = []
+                handler = None
+                while frame is not None:
+                    name = _frame_name(frame)
+                    stack.append(name)
+                    if frame.f_code.co_filename.startswith(PLUGIN_DIR):
+                        handler = name
+                    frame = frame.f_back
+                stack.reverse()
+
+                profile.stacks[";".join([thread_name, *stack])] += wall
+                profile.self_wall[stack[-1]] += wall
+                profile.self_cpu[stack[-1]] += cpu
+                for name in set(stack):
+                    profile.total_wall[name] += wall
+                if handler is not None:
+                    profile.handler_wall[handler] += wall
+                    profile.handler_cpu[handler] += cpu
+            profile.samples += 1
+            if now >= deadline:
+                break
+
+        profile.duration = time.perf_counter() - start
+        return profile
+
+
+profiler = SamplingProfiler()
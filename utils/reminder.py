@@ -0,0 +1,389 @@
+"""周期/定点提醒模块 - 规则解析与基于最小堆的日历队列"""
+import heapq
+import json
+import os
+import re
+import sqlite3
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timedelta, date
+from pathlib import Path
+
+REMINDER_PATH = Path(".cache/timer/reminders.db")
+
+WEEKDAY_NAMES = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6}
+
+# 中文时间：可选时段 + 小时 + 可选分钟，如 "早上8点"、"晚上9点半"、"21:30"
+_PERIOD = r"(?P<period>凌晨|早上|早晨|上午|中午|下午|傍晚|晚上)?"
+_CLOCK = _PERIOD + r"\s*(?:(?P<h1>\d{1,2})[:：](?P<m1>\d{2})|(?P<h2>\d{1,2})\s*[点时](?:\s*(?P<half>半)|\s*(?P<m2>\d{1,2})\s*分?)?)"
+
+_DAILY_RE = re.compile(r"^(?:每天|每日)\s*" + _CLOCK)
+_WORKDAY_RE = re.compile(r"^(?:每个?工作日)\s*" + _CLOCK)
+_WEEKLY_RE = re.compile(r"^每(?:周|星期|礼拜)(?P<wd>[一二三四五六日天])\s*" + _CLOCK)
+_RELDAY_RE = re.compile(r"^(?P<rel>今天|明天|后天)\s*" + _CLOCK)
+_ABS_RE = re.compile(r"^(?P<y>\d{4})[-/年](?P<mo>\d{1,2})[-/月](?P<d>\d{1,2})日?\s*" + _CLOCK)
+_CRON_RE = re.compile(r"^cron\s+(?P<expr>(?:\S+\s+){4}\S+)")
+
+
+class RuleError(ValueError):
+    """提醒规则无法解析"""
+
+
+def _clock(m: re.Match) -> tuple[int, int]:
+    """从正则匹配中取出 (小时, 分钟)，并按时段换算为 24 小时制"""
+    if m.group("h1") is not None:
+        hour, minute = int(m.group("h1")), int(m.group("m1"))
+    else:
+        hour = int(m.group("h2"))
+        minute = 30 if m.group("half") else int(m.group("m2") or 0)
+
+    period = m.group("period")
+    if period in ("下午", "傍晚", "晚上") and hour < 12:
+        hour += 12
+    elif period == "中午" and hour < 6:
+        hour += 12
+    elif period in ("凌晨", "晚上") and hour == 12:
+        # 晚上12点即午夜
+        hour = 0
+
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        raise RuleError("时间超出范围")
+    return hour, minute
+
+
+def _midnight(m: re.Match) -> bool:
+    """"晚上12点" 指当天结束时的午夜，即次日 0 点"""
+    return m.group("period") == "晚上" and int(m.group("h1") or m.group("h2")) == 12
+
+
+def _cron_field(text: str, low: int, high: int) -> list[int]:
+    """解析 cron 单个字段，支持 *、a-b、a,b 与 /step"""
+    values: set[int] = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = map(int, part.split("-", 1))
+        else:
+            start = end = int(part)
+        if start < low or end > high or start > end or step < 1:
+            raise RuleError(f"cron 字段超出范围: {text}")
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+
+@dataclass
+class ReminderRule:
+    """
+    提醒规则。
+
+    周期规则以 cron 的五个字段表示（分 时 日 月 周，周一为 0），
+    定点规则只有 once（时间戳），触发一次后失效。
+    """
+    text: str
+    minutes: list[int] = field(default_factory=list)
+    hours: list[int] = field(default_factory=list)
+    days: list[int] = field(default_factory=list)
+    months: list[int] = field(default_factory=list)
+    weekdays: list[int] = field(default_factory=list)
+    once: float | None = None
+
+    @property
+    def recurring(self) -> bool:
+        return self.once is None
+
+    def _day_matches(self, d: date) -> bool:
+        if d.month not in self.months:
+            return False
+        dom_any = len(self.days) == 31
+        dow_any = len(self.weekdays) == 7
+        dom_ok = d.day in self.days
+        dow_ok = d.weekday() in self.weekdays
+        # 与 cron 一致：日与周都受限时二者满足其一即可
+        if not dom_any and not dow_any:
+            return dom_ok or dow_ok
+        return dom_ok and dow_ok
+
+    def next_after(self, after: datetime) -> datetime | None:
+        """计算严格晚于 after 的下一次触发时间，没有则返回 None"""
+        if self.once is not None:
+            fire = datetime.fromtimestamp(self.once)
+            return fire if fire > after else None
+
+        start = (after + timedelta(minutes=1)).replace(second=0, microsecond=0)
+        day = start.date()
+        # 最多向后查找 4 年以覆盖 2 月 29 日
+        for _ in range(366 * 4 + 1):
+            if self._day_matches(day):
+                for hour in self.hours:
+                    if day == start.date() and hour < start.hour:
+                        continue
+                    for minute in self.minutes:
+                        candidate = datetime(day.year, day.month, day.day, hour, minute)
+                        if candidate >= start:
+                            return candidate
+            day += timedelta(days=1)
+        return None
+
+    def describe(self) -> str:
+        return self.text
+
+
+def _cron_rule(text: str, minutes, hours, days=None, months=None, weekdays=None) -> ReminderRule:
+    return ReminderRule(
+        text=text,
+        minutes=minutes,
+        hours=hours,
+        days=days or list(range(1, 32)),
+        months=months or list(range(1, 13)),
+        weekdays=weekdays if weekdays is not None else list(range(7)),
+    )
+
+
+def parse_reminder(text: str, now: datetime | None = None) -> tuple[ReminderRule, str]:
+    """
+    从文本开头解析提醒规则，返回 (规则, 剩余的提醒内容)。
+
+    支持：每天早上8点、每周一晚上9点、每个工作日 8:30、明天下午3点、
+    2025-01-01 08:00 以及 cron 表达式（cron 0 8 * * 1-5，周字段 0 或 7 为周日）。
+    """
+    now = now or datetime.now()
+    text = text.strip()
+
+    if m := _CRON_RE.match(text):
+        fields = m.group("expr").split()
+        try:
+            minute = _cron_field(fields[0], 0, 59)
+            hour = _cron_field(fields[1], 0, 23)
+            dom = _cron_field(fields[2], 1, 31)
+            month = _cron_field(fields[3], 1, 12)
+            # cron 中 0/7 为周日，这里转换为 Python 的 weekday（周一为 0）
+            dow = sorted({(d - 1) % 7 for d in _cron_field(fields[4], 0, 7)})
+        except ValueError as e:
+            raise RuleError(f"cron 表达式错误: {e}") from e
+        rule = _cron_rule(m.group(0), minute, hour, dom, month, dow)
+        return rule, text[m.end():].strip()
+
+    if m := _DAILY_RE.match(text):
+        hour, minute = _clock(m)
+        return _cron_rule(m.group(0), [minute], [hour]), text[m.end():].strip()
+
+    if m := _WORKDAY_RE.match(text):
+        hour, minute = _clock(m)
+        return _cron_rule(m.group(0), [minute], [hour], weekdays=[0, 1, 2, 3, 4]), text[m.end():].strip()
+
+    if m := _WEEKLY_RE.match(text):
+        hour, minute = _clock(m)
+        weekday = (WEEKDAY_NAMES[m.group("wd")] + _midnight(m)) % 7
+        return _cron_rule(m.group(0), [minute], [hour], weekdays=[weekday]), text[m.end():].strip()
+
+    if m := _RELDAY_RE.match(text):
+        hour, minute = _clock(m)
+        offset = {"今天": 0, "明天": 1, "后天": 2}[m.group("rel")] + _midnight(m)
+        target = (now + timedelta(days=offset)).replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if target <= now:
+            raise RuleError("提醒时间已经过去了")
+        return ReminderRule(text=m.group(0), once=target.timestamp()), text[m.end():].strip()
+
+    if m := _ABS_RE.match(text):
+        hour, minute = _clock(m)
+        try:
+            target = datetime(int(m.group("y")), int(m.group("mo")), int(m.group("d")), hour, minute)
+            target += timedelta(days=_midnight(m))
+        except ValueError as e:
+            raise RuleError(f"日期错误: {e}") from e
+        if target <= now:
+            raise RuleError("提醒时间已经过去了")
+        return ReminderRule(text=m.group(0), once=target.timestamp()), text[m.end():].strip()
+
+    raise RuleError("无法识别的提醒时间")
+
+
+@dataclass
+class Reminder:
+    """一条提醒及其发送目标"""
+    reminder_id: str
+    rule: ReminderRule
+    message: str
+    user_id: int
+    group_id: int | None
+    next_fire: float
+    self_id: int | None = None  # 设置提醒时收到消息的账号，从该账号发出提醒
+
+    @property
+    def target(self) -> tuple[int | None, str, int]:
+        """发送目标，群提醒按群聚合，私聊提醒按用户聚合"""
+        if self.group_id is not None:
+            return (self.self_id, "group", self.group_id)
+        return (self.self_id, "private", self.user_id)
+
+
+class CalendarQueue:
+    """
+    日历队列：以最小堆按触发时间排序所有提醒。
+
+    插入、取出最早到期项均为 O(log n)；取消采用惰性删除，
+    被取消的条目在出堆时跳过，过多时整体重建。
+    提醒按 ID 逐行保存在 SQLite 中，save 只写入上次保存后变化的提醒。
+    """
+
+    def __init__(self, path: Path = REMINDER_PATH) -> None:
+        self.path = path
+        self.reminders: dict[str, Reminder] = {}
+        self._heap: list[tuple[float, str]] = []
+        self._seq = 0
+        self._dirty: set[str] = set()
+        self._conn: sqlite3.Connection | None = None
+
+    def __len__(self) -> int:
+        return len(self.reminders)
+
+    def _push(self, reminder: Reminder) -> None:
+        heapq.heappush(self._heap, (reminder.next_fire, reminder.reminder_id))
+
+    def add(self, rule: ReminderRule, message: str, user_id: int, group_id: int | None,
+            now: datetime | None = None, self_id: int | None = None) -> Reminder:
+        """新增提醒并返回它"""
+        fire = rule.next_after(now or datetime.now())
+        if fire is None:
+            raise RuleError("该规则之后不会再触发")
+        self._seq += 1
+        reminder = Reminder(f"R{self._seq}", rule, message, user_id, group_id, fire.timestamp(), self_id)
+        self.reminders[reminder.reminder_id] = reminder
+        self._dirty.add(reminder.reminder_id)
+        self._push(reminder)
+        return reminder
+
+    def remove(self, reminder_id: str) -> Reminder | None:
+        """取消提醒，堆中的旧条目在出堆时被跳过"""
+        reminder = self.reminders.pop(reminder_id, None)
+        if reminder is not None:
+            self._dirty.add(reminder_id)
+        if len(self._heap) > 2 * len(self.reminders) + 64:
+            self._rebuild()
+        return reminder
+
+    def _rebuild(self) -> None:
+        self._heap = [(r.next_fire, r.reminder_id) for r in self.reminders.values()]
+        heapq.heapify(self._heap)
+
+    def _is_live(self, fire: float, reminder_id: str) -> bool:
+        reminder = self.reminders.get(reminder_id)
+        return reminder is not None and reminder.next_fire == fire
+
+    def next_fire(self) -> float | None:
+        """最早的触发时间戳"""
+        while self._heap and not self._is_live(*self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime | None = None) -> dict[tuple[int | None, str, int], list[Reminder]]:
+        """
+        取出所有已到期的提醒，按发送目标分组。
+
+        周期提醒会重新计算下一次触发时间并放回队列，定点提醒被移除。
+        """
+        now = now or datetime.now()
+        now_ts = now.timestamp()
+        batches: dict[tuple[int | None, str, int], list[Reminder]] = {}
+        while self._heap and self._heap[0][0] <= now_ts:
+            fire, reminder_id = heapq.heappop(self._heap)
+            if not self._is_live(fire, reminder_id):
+                continue
+            reminder = self.reminders[reminder_id]
+            batches.setdefault(reminder.target, []).append(reminder)
+            self._dirty.add(reminder_id)
+
+            next_fire = reminder.rule.next_after(now) if reminder.rule.recurring else None
+            if next_fire is None:
+                del self.reminders[reminder_id]
+            else:
+                reminder.next_fire = next_fire.timestamp()
+                self._push(reminder)
+        return batches
+
+    def for_user(self, user_id: int | None = None) -> list[Reminder]:
+        """列出提醒（按下次触发时间排序），user_id 为 None 时列出全部"""
+        items = [r for r in self.reminders.values() if user_id is None or r.user_id == user_id]
+        return sorted(items, key=lambda r: r.next_fire)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS reminders (reminder_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        return self._conn
+
+    def save(self) -> None:
+        """持久化上次保存后新增、取消或重新计算了触发时间的提醒"""
+        conn = self._connect()
+        dirty, self._dirty = self._dirty, set()
+        with conn:
+            for reminder_id in dirty:
+                reminder = self.reminders.get(reminder_id)
+                if reminder is None:
+                    conn.execute("DELETE FROM reminders WHERE reminder_id = ?", (reminder_id,))
+                else:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO reminders (reminder_id, data) VALUES (?, ?)",
+                        (reminder_id, json.dumps(asdict(reminder), ensure_ascii=False)),
+                    )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seq', ?)", (str(self._seq),))
+
+    @staticmethod
+    def _move_aside(path: Path) -> None:
+        broken = path.with_name(f"{path.name}.broken-{int(time.time())}")
+        os.replace(path, broken)
+        print(f"提醒文件 {path} 已损坏，已移至 {broken}，提醒队列从空开始")
+
+    def _read_rows(self) -> tuple[int, list[str]]:
+        """读取 (seq, 各提醒的 JSON)；数据库损坏时移到一边并从空开始"""
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM meta WHERE key = 'seq'").fetchone()
+            rows = [data for data, in conn.execute("SELECT data FROM reminders")]
+            return int(row[0]) if row else 0, rows
+        except sqlite3.DatabaseError:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            for suffix in ("", "-wal", "-shm"):
+                path = self.path.with_name(self.path.name + suffix)
+                if path.exists():
+                    self._move_aside(path)
+            return 0, []
+
+    def load(self, now: datetime | None = None) -> None:
+        """
+        从磁盘恢复提醒，停机期间错过的周期提醒顺延到下一次，错过的定点提醒立即触发。
+
+        文件损坏时移到一边并从空队列开始，单条无法解析的提醒被跳过，不影响其余提醒。
+        """
+        now = now or datetime.now()
+        self._seq, rows = self._read_rows()
+        for data in rows:
+            try:
+                item = json.loads(data)
+                rule = ReminderRule(**item.pop("rule"))
+                reminder = Reminder(rule=rule, **item)
+            except (json.JSONDecodeError, TypeError, KeyError, AttributeError) as e:
+                print(f"跳过无法解析的提醒: {e}")
+                continue
+            if rule.recurring and reminder.next_fire < now.timestamp():
+                next_fire = rule.next_after(now)
+                if next_fire is None:
+                    self._dirty.add(reminder.reminder_id)
+                    continue
+                reminder.next_fire = next_fire.timestamp()
+                self._dirty.add(reminder.reminder_id)
+            self.reminders[reminder.reminder_id] = reminder
+        self._rebuild()
+        if self._dirty:
+            self.save()
@@ -0,0 +1,162 @@
+"""RSS 更新任务队列 - 在后台执行更新并推送进度"""
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+Reporter = Callable[[str], Awaitable[None]]
+Runner = Callable[[Callable[[str], None], set[str] | None], list[str] | None]
+
+
+def update_summary(result: list[str]) -> tuple[str, str]:
+    """默认的结果描述: (状态中的简短描述, 发送给用户的完整结果)"""
+    return f"新增 {len(result)} 个种子", f"本次已更新 {len(result)} 条 RSS 订阅:\n" + "\n".join(result)
+
+
+@dataclass
+class RssJob:
+    """一次 RSS 更新任务"""
+    job_id: int
+    feeds: set[str] | None = None  # 只检查这些订阅, None 表示全部
+    reporters: list[tuple[Reporter, bool]] = field(default_factory=list)  # (回调, 是否接收进度)
+    status: str = "queued"  # queued / running / done / failed
+    queued_at: float = field(default_factory=time.time)
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    result: list[str] = field(default_factory=list)
+    summary: str = ""
+    error: str = ""
+
+    def describe(self) -> str:
+        """任务状态的一行描述"""
+        queued = time.strftime("%H:%M:%S", time.localtime(self.queued_at))
+        name = f"#{self.job_id}" + ("" if self.feeds is None else f" [{len(self.feeds)} 个订阅]")
+        if self.status == "queued":
+            return f"{name} 排队中 (提交于 {queued}, 已等待 {time.time() - self.queued_at:.0f} 秒)"
+        if self.status == "running":
+            return f"{name} 运行中 (已运行 {time.time() - self.started_at:.0f} 秒)"
+        cost = self.finished_at - self.started_at
+        finished = time.strftime("%H:%M:%S", time.localtime(self.finished_at))
+        if self.status == "failed":
+            return f"{name} 失败于 {finished} (耗时 {cost:.1f} 秒): {self.error}"
+        return f"{name} 完成于 {finished} (耗时 {cost:.1f} 秒), {self.summary}"
+
+
+class RssJobQueue:
+    """
+    RSS 更新任务队列。
+
+    更新在后台线程中执行, 不阻塞事件循环; 同一时间只运行一个任务,
+    任务排队或运行期间的重复请求会合并到该任务中, 共享进度与结果。
+    """
+
+    def __init__(self, runner: Runner, summarize: Callable[[list[str]], tuple[str, str]] = update_summary,
+                 history_size: int = 5) -> None:
+        self.runner = runner
+        self.summarize = summarize
+        self.queued: deque[RssJob] = deque()
+        self.running: RssJob | None = None
+        self.finished: deque[RssJob] = deque(maxlen=history_size)
+        self._next_id = 1
+        self._wakeup: asyncio.Event | None = None
+        self._worker: asyncio.Task | None = None
+
+    def submit(self, reporter: Reporter, feeds: set[str] | None = None,
+               verbose: bool = True) -> tuple[RssJob, bool]:
+        """
+        提交更新请求, 返回 (任务, 是否合并到了已有任务)。
+
+        :param feeds: 只检查这些订阅, None 表示全部
+        :param verbose: 为 False 时只在有新结果或失败时收到最终消息, 不接收进度
+        """
+        def covers(job: RssJob) -> bool:
+            return job.feeds is None or (feeds is not None and feeds <= job.feeds)
+
+        if self.running and covers(self.running):
+            self.running.reporters.append((reporter, verbose))
+            return self.running, True
+        if self.queued:
+            # 排队中的任务还没开始, 扩大它的范围后合并
+            job = self.queued[0]
+            job.feeds = None if job.feeds is None or feeds is None else job.feeds | feeds
+            job.reporters.append((reporter, verbose))
+            return job, True
+
+        job = RssJob(self._next_id, feeds=feeds, reporters=[(reporter, verbose)])
+        self._next_id += 1
+        self.queued.append(job)
+        self._ensure_worker()
+        self._wakeup.set()
+        return job, False
+
+    @property
+    def busy(self) -> bool:
+        return self.running is not None or bool(self.queued)
+
+    def _ensure_worker(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._work())
+
+    async def _broadcast(self, job: RssJob, text: str, final: bool = False) -> None:
+        for reporter, verbose in list(job.reporters):
+            if not verbose and not (final and (job.result or job.status == "failed")):
+                continue
+            try:
+                await reporter(text)
+            except Exception as e:
+                print(f"发送 RSS 任务进度失败: {e}")
+
+    async def _work(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.queued:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            job = self.queued.popleft()
+            job.status = "running"
+            job.started_at = time.time()
+            self.running = job
+
+            sending = []
+
+            def progress(text: str, job: RssJob = job) -> None:
+                # 在工作线程中调用, 转交给事件循环发送
+                sending.append(asyncio.run_coroutine_threadsafe(self._broadcast(job, text), loop))
+
+            try:
+                result = await asyncio.to_thread(self.runner, progress, job.feeds)
+                if result is None:
+                    raise RuntimeError("更新过程中发生异常, 详情见日志")
+                job.result = result
+                job.summary, text = self.summarize(result)
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            job.finished_at = time.time()
+            self.running = None
+            self.finished.appendleft(job)
+
+            # 先等进度消息发完, 保证结果总是最后一条
+            for future in sending:
+                await asyncio.wrap_future(future)
+            if job.status == "failed":
+                text = f"任务失败: {job.error}"
+            await self._broadcast(job, text, final=True)
+
+    def status(self) -> str:
+        """队列状态描述, 包括排队、运行中与最近完成的任务"""
+        lines = []
+        if self.running:
+            lines.append("运行中: " + self.running.describe())
+        for job in self.queued:
+            lines.append("排队中: " + job.describe())
+        if self.finished:
+            lines.append("最近完成:")
+            lines.extend("  " + job.describe() for job in self.finished)
+        return "\n".join(lines) or "当前没有 RSS 更新任务。"
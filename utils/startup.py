@@ -0,0 +1,65 @@
+"""启动模块 - 逐个导入并加载插件, 记录各插件耗时, 单个插件失败只会禁用该插件"""
+import importlib
+import time
+import traceback
+from dataclasses import dataclass
+
+
+@dataclass
+class PluginTiming:
+    """单个插件的启动耗时"""
+    name: str
+    import_time: float = 0.0
+    load_time: float = 0.0
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def import_plugin(module_name: str, attr: str) -> tuple[object | None, PluginTiming]:
+    """导入插件模块并取出其中的 PluginPlanner, 失败时返回 (None, 带错误信息的耗时记录)"""
+    timing = PluginTiming(attr)
+    start = time.perf_counter()
+    try:
+        planner = getattr(importlib.import_module(module_name), attr)
+    except Exception as e:
+        timing.error = f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+        planner = None
+    timing.import_time = time.perf_counter() - start
+    return planner, timing
+
+
+def load_plugins(bot, plugins: list[tuple[str, str]]) -> list[PluginTiming]:
+    """
+    依次导入并加载插件。
+
+    :param plugins: (模块名, PluginPlanner 变量名) 列表
+    """
+    timings = []
+    for module_name, attr in plugins:
+        planner, timing = import_plugin(module_name, attr)
+        if planner is not None:
+            start = time.perf_counter()
+            try:
+                bot.load_plugin(planner)
+            except Exception as e:
+                timing.error = f"{type(e).__name__}: {e}"
+                traceback.print_exc()
+            timing.load_time = time.perf_counter() - start
+        timings.append(timing)
+    return timings
+
+
+def format_report(timings: list[PluginTiming]) -> str:
+    """启动耗时报告, 按耗时从高到低排列"""
+    total = sum(t.import_time + t.load_time for t in timings)
+    lines = [f"插件启动耗时 {total * 1000:.0f} ms:"]
+    for t in sorted(timings, key=lambda t: t.import_time + t.load_time, reverse=True):
+        line = f"  {t.name:<22} 导入 {t.import_time * 1000:7.1f} ms  加载 {t.load_time * 1000:6.1f} ms"
+        if not t.ok:
+            line += f"  已禁用 ({t.error})"
+        lines.append(line)
+    return "\n".join(lines)
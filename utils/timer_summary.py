@@ -0,0 +1,209 @@
+"""每日学习总结模块 - 汇总计时记录并批量生成个性化总结"""
+import asyncio
+import hashlib
+import json
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from .chat_llm import get_client, MODEL_NAME
+from .chat_prompt import CHARACTER_SYSTEM_PROMPT
+from .workers import workers
+
+TIMER_DIR = Path(".cache/timer")
+PROMPT_DIR = TIMER_DIR / "prompt"
+SUMMARY_DIR = TIMER_DIR / "summary"
+
+# 同时进行的 LLM 请求上限
+SUMMARY_CONCURRENCY = int(os.getenv("TIMER_SUMMARY_CONCURRENCY", "4"))
+# 每日批量生成总结的时间（HH:MM）
+SUMMARY_TIME = os.getenv("TIMER_SUMMARY_TIME", "23:30")
+
+
+def parse_duration(text: str) -> int:
+    """将 'H:MM:SS' 或 'MM:SS' 格式的时长转换为秒数"""
+    parts = text.strip().split(":")
+    if len(parts) == 3:
+        h, m, s = map(int, parts)
+        return h * 3600 + m * 60 + s
+    if len(parts) == 2:
+        m, s = map(int, parts)
+        return m * 60 + s
+    raise ValueError(f"无法解析的时长: {text}")
+
+
+def load_records(date_str: str) -> dict[str, dict[str, timedelta]]:
+    """读取某天的计时记录，按 用户 -> 标签 汇总总时长"""
+    file_path = TIMER_DIR / f"{date_str}.txt"
+    totals: dict[str, dict[str, timedelta]] = {}
+    if not file_path.exists():
+        return totals
+
+    with open(file_path, "r") as f:
+        for record in f:
+            parts = record.strip().split(",")
+            if len(parts) < 3:
+                continue
+            user_id, tag, time_str = parts[0], parts[1], parts[2]
+            try:
+                seconds = parse_duration(time_str)
+            except ValueError:
+                continue
+            user_totals = totals.setdefault(user_id, {})
+            user_totals[tag] = user_totals.get(tag, timedelta(0)) + timedelta(seconds=seconds)
+    return totals
+
+
+def build_prompts(totals: dict[str, dict[str, timedelta]]) -> dict[str, str]:
+    """为设置过 prompt 的用户生成个性化 prompt"""
+    prompts: dict[str, str] = {}
+    if not PROMPT_DIR.exists():
+        return prompts
+
+    for prompt_file in PROMPT_DIR.glob("*.txt"):
+        user_id = prompt_file.stem
+        if user_id not in totals:
+            continue
+        event_str = "\n".join(f"{tag}: {value}" for tag, value in totals[user_id].items())
+        template = prompt_file.read_text().strip()
+        try:
+            prompts[user_id] = template.format(event_str=event_str)
+        except (KeyError, IndexError, ValueError) as e:
+            print(f"用户 {user_id} 的 prompt 格式错误: {e}")
+    return prompts
+
+
+def collect_prompts(date_str: str) -> dict[str, str]:
+    """读取某天的计时记录并生成各用户的 prompt，在工作进程中执行"""
+    return build_prompts(load_records(date_str))
+
+
+def _prompt_key(prompt: str) -> str:
+    """prompt 的指纹，记录或模板变化时指纹随之变化"""
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+
+
+def _summary_path(date_str: str) -> Path:
+    return SUMMARY_DIR / f"{date_str}.json"
+
+
+def load_summary_cache(date_str: str) -> dict[str, dict[str, str]]:
+    """读取某天已缓存的总结"""
+    path = _summary_path(date_str)
+    if path.exists():
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+    return {}
+
+
+def save_summary_cache(date_str: str, cache: dict[str, dict[str, str]]) -> None:
+    """写入总结缓存（先写临时文件再替换）"""
+    SUMMARY_DIR.mkdir(parents=True, exist_ok=True)
+    path = _summary_path(date_str)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _generate(prompt: str) -> str:
+    """调用 LLM 生成单个用户的总结"""
+    response = get_client().chat.completions.create(
+        model=MODEL_NAME,
+        messages=[
+            {"role": "system", "content": CHARACTER_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0.8,
+        max_tokens=600
+    )
+    return response.choices[0].message.content.strip()
+
+
+async def generate_summaries(prompts: dict[str, str]) -> dict[str, dict[str, str]]:
+    """在并发上限内为多个用户生成总结，失败的用户不会写入结果"""
+    semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+    async def worker(user_id: str, prompt: str) -> tuple[str, dict[str, str] | None]:
+        async with semaphore:
+            try:
+                text = await asyncio.to_thread(_generate, prompt)
+            except Exception as e:
+                print(f"生成用户 {user_id} 的总结失败: {e}")
+                return user_id, None
+        return user_id, {"key": _prompt_key(prompt), "text": text}
+
+    results = await asyncio.gather(*(worker(u, p) for u, p in prompts.items()))
+    return {user_id: item for user_id, item in results if item is not None}
+
+
+async def run_daily_batch(date_str: str | None = None) -> int:
+    """批量生成某天所有用户的总结，只重新生成记录有变化的用户，返回生成数量"""
+    date_str = date_str or date.today().strftime("%Y-%m-%d")
+    prompts = await workers.run("summary", collect_prompts, date_str)
+    cache = load_summary_cache(date_str)
+
+    stale = {
+        user_id: prompt for user_id, prompt in prompts.items()
+        if cache.get(user_id, {}).get("key") != _prompt_key(prompt)
+    }
+    if not stale:
+        return 0
+
+    cache.update(await generate_summaries(stale))
+    save_summary_cache(date_str, cache)
+    return len(stale)
+
+
+async def get_summary(user_id: str, date_str: str) -> str | None:
+    """
+    获取用户某天的总结。
+
+    缓存命中时直接返回；自上次生成后有新记录时只为该用户重新生成。
+    用户没有设置 prompt 或当天没有记录时返回 None。
+    """
+    prompts = await workers.run("summary", collect_prompts, date_str)
+    prompt = prompts.get(user_id)
+    if prompt is None:
+        return None
+
+    cache = load_summary_cache(date_str)
+    cached = cache.get(user_id)
+    if cached and cached.get("key") == _prompt_key(prompt):
+        return cached["text"]
+
+    generated = await generate_summaries({user_id: prompt})
+    if user_id not in generated:
+        return None
+    # 生成期间批处理可能已写入其他用户，重新读取后合并
+    cache = load_summary_cache(date_str)
+    cache.update(generated)
+    save_summary_cache(date_str, cache)
+    return generated[user_id]["text"]
+
+
+def _seconds_until(hhmm: str) -> float:
+    """距离下一个 HH:MM 的秒数"""
+    hour, minute = map(int, hhmm.split(":"))
+    now = datetime.now()
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+async def daily_summary_loop() -> None:
+    """每天在 SUMMARY_TIME 批量生成当天的总结"""
+    while True:
+        await asyncio.sleep(_seconds_until(SUMMARY_TIME))
+        date_str = date.today().strftime("%Y-%m-%d")
+        try:
+            count = await run_daily_batch(date_str)
+            print(f"{date_str} 的每日总结已生成 {count} 条")
+        except Exception as e:
+            print(f"生成每日总结失败: {e}")
+        # 避免在同一分钟内重复触发
+        await asyncio.sleep(60)
@@ -0,0 +1,145 @@
+"""事件循环卡顿监测 - 后台线程检查事件循环的心跳, 卡顿超过阈值时记录事件循环线程的调用栈"""
+import _thread
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# 事件循环落后多少秒算作卡顿
+WATCHDOG_THRESHOLD = float(os.getenv("WATCHDOG_THRESHOLD", "0.5"))
+# 严格模式: 发生卡顿时中断主线程 (等同 Ctrl+C), 让调试运行或测试在出现阻塞调用时立即失败
+WATCHDOG_STRICT = os.getenv("WATCHDOG_STRICT", "0") == "1"
+STALL_LOG = Path(".cache/logs/stalls.log")
+
+WORKSPACE = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+PLUGIN_DIR = WORKSPACE + "plugins" + os.sep
+
+
+@dataclass
+class CallSite:
+    """同一位置的卡顿汇总"""
+    count: int = 0
+    total: float = 0.0
+    worst: float = 0.0
+
+
+def _describe(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.relpath(code.co_filename, WORKSPACE)}:{frame.f_lineno} {code.co_name}"
+
+
+class LoopWatchdog:
+    """
+    事件循环卡顿监测。
+
+    事件循环中的心跳任务每 interval 秒记录一次时间, 监测线程发现心跳落后超过 threshold 时,
+    取事件循环线程当前的调用栈, 按项目内最深的调用位置汇总次数与耗时, 并写入滚动日志。
+    同一次卡顿只在首次超过阈值时取栈, 结束后补记总时长。
+    """
+
+    def __init__(self, threshold: float = WATCHDOG_THRESHOLD, interval: float = 0.1,
+                 strict: bool = WATCHDOG_STRICT, log_path: Path = STALL_LOG) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.strict = strict
+        self.log_path = log_path
+        self.sites: dict[str, CallSite] = {}
+        self.handlers: Counter[str] = Counter()
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._loop_thread: int | None = None
+        self._thread: threading.Thread | None = None
+        self._task: asyncio.Task | None = None
+        self._logger: logging.Logger | None = None
+
+    def _open_log(self) -> logging.Logger:
+        logger = logging.getLogger("leafbot.stalls")
+        logger.propagate = False
+        if not logger.handlers:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(self.log_path, maxBytes=1024 * 1024, backupCount=5, encoding="utf8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+        return logger
+
+    def start(self) -> None:
+        """在事件循环中调用, 启动心跳任务与监测线程"""
+        if self._thread is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._logger = self._open_log()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self) -> None:
+        stalled_site = None
+        started = 0.0
+        while True:
+            time.sleep(self.interval)
+            lag = time.monotonic() - self._beat - self.interval
+            if lag > self.threshold and stalled_site is None:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is None:
+                    continue
+                stalled_site = self._record(frame, lag)
+                started = self._beat
+                if self.strict and self._loop_thread == threading.main_thread().ident:
+                    _thread.interrupt_main()
+            elif stalled_site is not None and self._beat > started:
+                # 心跳恢复, 补记这次卡顿的总时长
+                duration = self._beat - started - self.interval
+                site = self.sites[stalled_site]
+                site.total += duration
+                site.worst = max(site.worst, duration)
+                self._logger.info("卡顿结束: %.3f 秒 @ %s (累计 %d 次)", duration, stalled_site, site.count)
+                stalled_site = None
+
+    def _record(self, frame, lag: float) -> str:
+        """记录一次卡顿, 返回调用位置"""
+        stack = []
+        while frame is not None:
+            stack.append(frame)
+            frame = frame.f_back
+        in_project = [f for f in stack if f.f_code.co_filename.startswith(WORKSPACE)]
+        site = _describe(in_project[0] if in_project else stack[0])
+        handler = next((_describe(f) for f in reversed(stack) if f.f_code.co_filename.startswith(PLUGIN_DIR)), None)
+
+        self.stalls += 1
+        self.sites.setdefault(site, CallSite()).count += 1
+        if handler:
+            self.handlers[handler] += 1
+        lines = "".join(f"\n    {_describe(f)}" for f in reversed(stack))
+        self._logger.info("事件循环卡顿 %.3f 秒, 处理函数 %s, 位置 %s, 调用栈:%s", lag, handler or "无", site, lines)
+        return site
+
+    def summary(self, top: int = 10) -> str:
+        if not self.stalls:
+            return f"没有超过 {self.threshold} 秒的卡顿。"
+        lines = [f"共 {self.stalls} 次超过 {self.threshold} 秒的卡顿, 按总时长排序的调用位置:"]
+        for site, stat in sorted(self.sites.items(), key=lambda kv: kv[1].total, reverse=True)[:top]:
+            lines.append(f"  {stat.count} 次, 共 {stat.total:.2f} 秒, 最长 {stat.worst:.2f} 秒  {site}")
+        if self.handlers:
+            lines.append("处理函数:")
+            lines.extend(f"  {count} 次  {name}" for name, count in self.handlers.most_common(top))
+        lines.append(f"详细调用栈见 {self.log_path}")
+        return "\n".join(lines)
+
+
+watchdog = LoopWatchdog()
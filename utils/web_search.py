@@ -3,10 +3,17 @@
 """
 import os
 from typing import Optional
-from duckduckgo_search import DDGS
 
-# 初始化 DuckDuckGo 搜索
-ddgs = DDGS()
+# DuckDuckGo 搜索客户端, 首次搜索时才导入并创建
+_ddgs = None
+
+
+def get_ddgs():
+    global _ddgs
+    if _ddgs is None:
+        from duckduckgo_search import DDGS
+        _ddgs = DDGS()
+    return _ddgs
 
 
 def web_search(query: str, max_results: int = 5) -> str:
@@ -21,7 +28,7 @@ def web_search(query: str, max_results: int = 5) -> str:
         格式化的搜索结果字符串
     """
     try:
-        results = list(ddgs.text(query, max_results=max_results))
+        results = list(get_ddgs().text(query, max_results=max_results))
 
         if not results:
             return "没有找到相关的搜索结果呢..."
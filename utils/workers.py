@@ -0,0 +1,202 @@
+"""进程池 - 把 CPU 密集或阻塞的任务按类型交给工作进程执行, 事件循环所在的进程只负责分发事件"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# 工作进程数, 为 0 时改在线程中执行 (仍然按类型限制并发)
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+# 各类任务的并发上限, 格式为 "类型=上限,类型=上限"; 未列出的类型上限为工作进程数。
+# upload 同时受 MTA_UPLOAD_WORKERS 限制, 实际并发为二者中较小的一个; 网盘完整对账 (syncup) 单独计数
+WORKER_LIMITS = os.getenv("WORKER_LIMITS", "feed=2,torrent=2,upload=4,syncup=1,summary=1")
+
+
+def parse_limits(text: str) -> dict[str, int]:
+    limits = {}
+    for part in text.split(","):
+        kind, _, value = part.partition("=")
+        if kind.strip() and value.strip():
+            limits[kind.strip()] = max(1, int(value))
+    return limits
+
+
+@dataclass
+class KindStat:
+    """同一类任务的统计"""
+    queued: int = 0
+    running: int = 0
+    done: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    executed: int = 0  # 实际执行过的任务数, 包括运行中被取消的任务
+    busy: float = 0.0  # 实际执行的累计耗时
+
+
+class WorkerPool:
+    """
+    按类型限流的进程池。
+
+    submit 在事件循环中提交任务, 返回可 await 的 asyncio.Task; call 供工作线程同步调用,
+    任务经事件循环排队后交给同一个进程池。任务函数与参数需要能被 pickle (模块级函数)。
+    取消排队中的任务会立即生效; 已在工作进程中运行的任务无法中断, 等待方立即收到 CancelledError,
+    结果被丢弃, 并发名额在进程真正结束后才归还。
+    进程池在第一次提交任务时创建, 工作进程崩溃后会重新创建。
+    """
+
+    def __init__(self, processes: int = WORKER_PROCESSES, limits: dict[str, int] | None = None) -> None:
+        self.processes = processes
+        self.limits = parse_limits(WORKER_LIMITS) if limits is None else limits
+        self.stats: dict[str, KindStat] = defaultdict(KindStat)
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._tasks: dict[str, set[asyncio.Task]] = defaultdict(set)
+        self._executor: Executor | None = None
+        self._executor_lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def start(self) -> None:
+        """在事件循环中调用, 记录事件循环供工作线程中的 call 使用"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # 信号量绑定在创建它的事件循环上
+            self._semaphores.clear()
+            self._loop = loop
+
+    def limit(self, kind: str) -> int:
+        return self.limits.get(kind, max(1, self.processes))
+
+    def _get_executor(self) -> Executor:
+        with self._executor_lock:
+            if self._executor is None:
+                if self.processes > 0:
+                    # 不用 fork: 事件循环所在的进程里有多个线程, fork 出的子进程可能继承被占用的锁
+                    self._executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+                else:
+                    self._executor = ThreadPoolExecutor(thread_name_prefix="worker")
+            return self._executor
+
+    def _dispatch(self, fn: Callable, args: tuple, kwargs: dict) -> Future:
+        job = functools.partial(fn, *args, **kwargs)
+        try:
+            return self._get_executor().submit(job)
+        except BrokenProcessPool:
+            print("工作进程异常退出, 重新创建进程池")
+            with self._executor_lock:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            return self._get_executor().submit(job)
+
+    async def _run(self, kind: str, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        loop = asyncio.get_running_loop()
+        stat = self.stats[kind]
+        semaphore = self._semaphores.setdefault(kind, asyncio.Semaphore(self.limit(kind)))
+        task = asyncio.current_task()
+        self._tasks[kind].add(task)
+        try:
+            stat.queued += 1
+            try:
+                await semaphore.acquire()
+            except asyncio.CancelledError:
+                stat.cancelled += 1
+                raise
+            finally:
+                stat.queued -= 1
+
+            stat.running += 1
+            start = time.monotonic()
+
+            def release(future: Future) -> None:
+                # 在执行任务的线程中调用, 交回事件循环释放名额
+                loop.call_soon_threadsafe(finish, None if future.cancelled() else time.monotonic() - start)
+
+            def finish(elapsed: float | None) -> None:
+                stat.running -= 1
+                if elapsed is not None:
+                    stat.executed += 1
+                    stat.busy += elapsed
+                semaphore.release()
+
+            try:
+                future = self._dispatch(fn, args, kwargs)
+            except BaseException:
+                finish(None)
+                raise
+            future.add_done_callback(release)
+            try:
+                result = await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                # wrap_future 已尝试取消: 还没开始执行的任务不会再运行
+                stat.cancelled += 1
+                raise
+            except Exception:
+                stat.failed += 1
+                raise
+            stat.done += 1
+            return result
+        finally:
+            self._tasks[kind].discard(task)
+
+    def submit(self, kind: str, fn: Callable, *args, **kwargs) -> asyncio.Task:
+        """在事件循环中提交任务, 返回的 Task 完成时得到 fn 的返回值"""
+        if self._loop is not asyncio.get_running_loop():
+            self.start()
+        return asyncio.create_task(self._run(kind, fn, args, kwargs), name=f"worker-{kind}")
+
+    async def run(self, kind: str, fn: Callable, *args, **kwargs) -> Any:
+        return await self.submit(kind, fn, *args, **kwargs)
+
+    def call(self, kind: str, fn: Callable, *args, **kwargs) -> Any:
+        """
+        在工作线程中同步执行任务, 阻塞到任务完成。
+
+        没有运行中的事件循环 (例如单独运行更新脚本) 或在事件循环线程中调用时直接在当前线程执行。
+        """
+        loop = self._loop
+        try:
+            in_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            in_loop = False
+        if loop is None or loop.is_closed() or not loop.is_running() or in_loop:
+            return fn(*args, **kwargs)
+        return asyncio.run_coroutine_threadsafe(self._run(kind, fn, args, kwargs), loop).result()
+
+    def cancel(self, kind: str | None = None) -> int:
+        """取消某类 (为 None 时所有类型) 排队与运行中的任务, 返回取消的数量"""
+        kinds = list(self._tasks) if kind is None else [kind]
+        count = 0
+        for name in kinds:
+            for task in list(self._tasks.get(name, ())):
+                count += task.cancel()
+        return count
+
+    def shutdown(self) -> None:
+        """丢弃还没开始的任务并关闭进程池, 不等待运行中的任务"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def status(self) -> str:
+        mode = f"{self.processes} 个工作进程" if self.processes > 0 else "线程模式 (WORKER_PROCESSES=0)"
+        lines = [mode + ("" if self._executor is not None else ", 尚未启动")]
+        for kind, stat in sorted(self.stats.items()):
+            average = f", 平均 {stat.busy / stat.executed:.2f} 秒" if stat.executed else ""
+            lines.append(
+                f"  {kind}: 运行 {stat.running}/{self.limit(kind)}, 排队 {stat.queued}, "
+                f"完成 {stat.done}, 失败 {stat.failed}, 取消 {stat.cancelled}{average}"
+            )
+        if not self.stats:
+            lines.append("  还没有提交过任务。")
+        return "\n".join(lines)
+
+
+workers = WorkerPool()